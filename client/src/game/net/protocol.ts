@@ -16,7 +16,11 @@ export type Msg<T = unknown> = {
   payload?: T;
 };
 
-export type HelloPayload = { tick_hz: number; server_time_ms: number };
+export type HelloPayload = {
+  tick_hz: number;
+  server_time_ms: number;
+  pos_quantum?: number | null;
+};
 export type MovePayload = { dx: number; dy: number };
 export type ChatPayload = { channel: string; msg: string };
 export type EventPayload = {
@@ -29,4 +33,10 @@ export type EventPayload = {
 export type StatePayload = {
   you: { x: number; y: number; hp: number; mp: number };
   entities: Array<{ id: string; x: number; y: number; kind: string }>;
+  // frames de resync (server/game/wire.py): STATE_RESYNC | STATE_KEYFRAME
+  flags?: number;
 };
+export type ResyncPayload = { last_seq: number };
+
+export const STATE_RESYNC = 1;
+export const STATE_KEYFRAME = 2;
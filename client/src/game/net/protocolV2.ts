@@ -0,0 +1,103 @@
+// zerion.v2: arrays msgpack posicionais com op numérico (ver server/game/wire.py)
+import type { Entity } from "@/game/state";
+import { STATE_KEYFRAME } from "./protocol";
+
+export const OP = {
+  hello: 0,
+  ping: 1,
+  move: 2,
+  chat: 3,
+  state: 4,
+  event: 5,
+  warn: 6,
+  resync: 7,
+} as const;
+
+// bits de campo em updated (server/game/state.py F_*) + posição como dx/dy
+const F_X = 1;
+const F_Y = 2;
+const F_HP = 4;
+const F_META = 8;
+const F_KIND = 16;
+const F_DELTA = 32;
+
+export const encodeMove = (seq: number, dx: number, dy: number) => [
+  OP.move,
+  seq,
+  dx,
+  dy,
+];
+export const encodePing = (ts: number) => [OP.ping, ts];
+export const encodeChat = (seq: number, channel: string, msg: string) => [
+  OP.chat,
+  seq,
+  channel,
+  msg,
+];
+export const encodeResync = (seq: number, lastSeq: number) => [
+  OP.resync,
+  seq,
+  lastSeq,
+];
+
+/**
+ * Converte frames v2 para o formato de Msg do v1 usado pelo resto do cliente.
+ * Mantém a tabela de kinds da sessão; ids de entidade viram String(handle).
+ */
+export class V2Decoder {
+  private kinds: string[] = [];
+
+  decode(frame: any[]): { op: string; seq?: number; ack?: number; ts: number; payload?: any } {
+    const op = frame[0] as number;
+    if (op !== OP.state) {
+      const name = (Object.keys(OP) as Array<keyof typeof OP>).find(
+        (k) => OP[k] === op
+      );
+      return { op: name ?? "unknown", ts: frame[1], payload: frame[2] };
+    }
+    const [, seq, ack, ts, you, newKinds, removed, added, updated, flags = 0] =
+      frame;
+    // keyframe: o servidor recomeçou a tabela de kinds da sessão
+    if (flags & STATE_KEYFRAME) this.kinds = [];
+    for (const [idx, kind] of newKinds as Array<[number, string]>)
+      this.kinds[idx] = kind;
+    const added_: Entity[] = (added as any[]).map(
+      ([h, k, x, y, hp, meta]) => ({
+        id: String(h),
+        kind: this.kinds[k],
+        x,
+        y,
+        hp,
+        meta: meta ?? {},
+      })
+    );
+    const updated_ = (updated as any[]).map(([h, mask, ...vals]) => {
+      const patch: any = {};
+      let i = 0;
+      if (mask & F_DELTA) {
+        patch.dx = vals[i++];
+        patch.dy = vals[i++];
+      }
+      if (mask & F_X) patch.x = vals[i++];
+      if (mask & F_Y) patch.y = vals[i++];
+      if (mask & F_HP) patch.hp = vals[i++];
+      if (mask & F_META) patch.meta = vals[i++];
+      if (mask & F_KIND) patch.kind = this.kinds[vals[i++]];
+      return { id: String(h), patch };
+    });
+    return {
+      op: "state",
+      seq,
+      ack,
+      ts,
+      payload: {
+        you: { x: you[0], y: you[1], hp: you[2], mp: you[3] },
+        // handles podem ser reciclados: removed deve ser aplicado antes de added
+        removed: (removed as number[]).map(String),
+        added: added_,
+        updated: updated_,
+        flags,
+      },
+    };
+  }
+}
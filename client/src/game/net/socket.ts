@@ -1,5 +1,19 @@
 import { encode, decode } from "@msgpack/msgpack";
-import type { Msg, MovePayload, StatePayload, EventPayload } from "./protocol";
+import type {
+  Msg,
+  MovePayload,
+  StatePayload,
+  EventPayload,
+  ResyncPayload,
+} from "./protocol";
+import { STATE_KEYFRAME } from "./protocol";
+import {
+  V2Decoder,
+  encodeChat,
+  encodeMove,
+  encodePing,
+  encodeResync,
+} from "./protocolV2";
 import { ClientWorldState } from "@/game/state";
 import { gameEvents } from "@/game/events";
 
@@ -18,7 +32,12 @@ export class ZerionSocket {
     { dx: number; dy: number; ts: number }
   >();
   private lastAck = 0;
+  // último state_seq aplicado por inteiro; congela após perda até chegar o frame de resync
+  private lastStateSeq = 0;
+  private resyncPending = false;
   private world = new ClientWorldState();
+  // protocolo negociado: zerion.v2 quando o servidor aceita, senão zerion.v1
+  private v2: V2Decoder | null = null;
 
   addListener(cb: Listener) {
     this.listeners.add(cb);
@@ -28,13 +47,24 @@ export class ZerionSocket {
   async connect(token: string): Promise<void> {
     this.token = token;
     const base = process.env.NEXT_PUBLIC_WS_URL || "ws://localhost:8000/ws";
-    const protocols = ["zerion.v1", "auth." + (await getWSTicket(token))];
+    const protocols = [
+      "zerion.v2",
+      "zerion.v1",
+      "auth." + (await getWSTicket(token)),
+    ];
     this.ws = new WebSocket(base, protocols);
     this.shouldReconnect = true;
     await new Promise<void>((resolve, reject) => {
       if (!this.ws) return reject(new Error("ws null"));
       this.ws.binaryType = "arraybuffer";
-      this.ws.onopen = () => resolve();
+      this.ws.onopen = () => {
+        this.v2 = this.ws?.protocol === "zerion.v2" ? new V2Decoder() : null;
+        // sessão nova: o servidor manda a visão inteira de novo
+        this.world.clear();
+        this.lastStateSeq = 0;
+        this.resyncPending = false;
+        resolve();
+      };
       this.ws.onerror = (ev) => reject(ev as any);
       this.ws.onmessage = (ev: MessageEvent<ArrayBuffer | string>) =>
         this.onMessage(ev);
@@ -45,30 +75,41 @@ export class ZerionSocket {
   }
 
   private onMessage(ev: MessageEvent<ArrayBuffer | string>) {
+    let stateFrame = false;
     try {
       const buf =
         typeof ev.data === "string"
           ? new TextEncoder().encode(ev.data)
           : new Uint8Array(ev.data as ArrayBuffer);
-      const msg = decode(buf) as Msg<any>;
+      const raw = decode(buf) as any;
+      const msg = (this.v2 ? this.v2.decode(raw) : raw) as Msg<any>;
       if (msg.op === "hello") {
-        gameEvents.emitHello(msg.payload || {});
+        const hello = (msg.payload || {}) as any;
+        this.world.posQuantum = hello.pos_quantum || 1;
+        gameEvents.emitHello(hello);
         return;
       }
       if (msg.op === "state") {
+        stateFrame = true;
         if (msg.ack && msg.ack > this.lastAck) this.lastAck = msg.ack;
         for (const k of Array.from(this.pendingInputs.keys()))
           if (k <= (msg.ack ?? 0)) this.pendingInputs.delete(k);
         const state = msg.payload as StatePayload;
+        const flags = state.flags ?? 0;
+        if (flags) this.resyncPending = false;
+        if (flags & STATE_KEYFRAME) this.world.clear();
         let x = state.you.x;
         let y = state.you.y;
         // AoI diffs
         const p: any = state as any;
         if (p.added || p.updated || p.removed) {
-          if (p.added) this.world.applyAdded(p.added);
-          if (p.updated) this.world.applyUpdated(p.updated);
+          // removed primeiro: no v2 um handle removido pode ser reusado no mesmo estado
           if (p.removed) this.world.applyRemoved(p.removed);
+          if (p.added) this.world.applyAdded(p.added);
+          // patch de entidade que não conhecemos: não dá para saber desde quando, pede keyframe
+          if (p.updated && this.world.applyUpdated(p.updated) > 0) this.resync(0);
         }
+        if (!this.resyncPending && msg.seq) this.lastStateSeq = msg.seq;
         for (const [seq, input] of Array.from(
           this.pendingInputs.entries()
         ).sort((a, b) => a[0] - b[0])) {
@@ -81,6 +122,12 @@ export class ZerionSocket {
         } as any);
         return;
       }
+      if (msg.op === "warn") {
+        // pedido recusado pelo rate-limit: o próximo desvio pede de novo
+        if ((msg.payload as EventPayload)?.code === "rate_resync")
+          this.resyncPending = false;
+        return;
+      }
       if (msg.op === "event") {
         const e = msg.payload as EventPayload;
         if (e && (e as any).channel)
@@ -93,7 +140,8 @@ export class ZerionSocket {
         return;
       }
     } catch {
-      // ignore
+      // estado que não deu para aplicar: catch-up a partir do último aplicado
+      if (stateFrame) this.resync();
     }
   }
 
@@ -102,6 +150,10 @@ export class ZerionSocket {
     const seq = ++this.seqCounter;
     const ts = Date.now();
     this.pendingInputs.set(seq, { dx, dy, ts });
+    if (this.v2) {
+      this.ws.send(encode(encodeMove(seq, dx, dy)));
+      return;
+    }
     const msg: Msg<MovePayload> = {
       v: 1,
       op: "move",
@@ -114,12 +166,20 @@ export class ZerionSocket {
 
   sendPing() {
     if (!this.ws || this.ws.readyState !== WebSocket.OPEN) return;
+    if (this.v2) {
+      this.ws.send(encode(encodePing(Date.now())));
+      return;
+    }
     const msg: Msg = { v: 1, op: "ping", ts: Date.now() };
     this.ws.send(encode(msg));
   }
 
   sendChat(channel: string, text: string) {
     if (!this.ws || this.ws.readyState !== WebSocket.OPEN) return;
+    if (this.v2) {
+      this.ws.send(encode(encodeChat(++this.seqCounter, channel, text)));
+      return;
+    }
     const msg: Msg<{ channel: string; msg: string }> = {
       v: 1,
       op: "chat",
@@ -129,6 +189,26 @@ export class ZerionSocket {
     this.ws.send(encode(msg));
   }
 
+  /** Pede ao servidor o estado perdido desde ``lastSeq`` (0 = keyframe), sem reconectar. */
+  resync(lastSeq = this.lastStateSeq) {
+    if (!this.ws || this.ws.readyState !== WebSocket.OPEN) return;
+    if (this.resyncPending) return;
+    this.resyncPending = true;
+    const seq = ++this.seqCounter;
+    if (this.v2) {
+      this.ws.send(encode(encodeResync(seq, lastSeq)));
+      return;
+    }
+    const msg: Msg<ResyncPayload> = {
+      v: 1,
+      op: "resync",
+      seq,
+      ts: Date.now(),
+      payload: { last_seq: lastSeq },
+    };
+    this.ws.send(encode(msg));
+  }
+
   close() {
     this.shouldReconnect = false;
     this.ws?.close();
@@ -7,23 +7,40 @@ export type Entity = {
   meta?: Record<string, any>;
 };
 
+export type EntityPatch = Partial<Entity> & { dx?: number; dy?: number };
+
 export class ClientWorldState {
   entities = new Map<string, Entity>();
+  // patches de posição podem vir como dx/dy em unidades de posQuantum (hello.pos_quantum)
+  posQuantum = 1;
 
   applyAdded(list: Entity[]) {
     for (const e of list) this.entities.set(e.id, e);
   }
 
-  applyUpdated(list: Array<{ id: string; patch: Partial<Entity> }>) {
+  // retorna quantos patches eram de entidades desconhecidas (estado dessincronizado)
+  applyUpdated(list: Array<{ id: string; patch: EntityPatch }>): number {
+    let unknown = 0;
     for (const u of list) {
       const cur = this.entities.get(u.id);
-      if (!cur) continue;
-      Object.assign(cur, u.patch);
+      if (!cur) {
+        unknown++;
+        continue;
+      }
+      const { dx, dy, ...rest } = u.patch;
+      if (dx !== undefined) cur.x += dx * this.posQuantum;
+      if (dy !== undefined) cur.y += dy * this.posQuantum;
+      Object.assign(cur, rest);
     }
+    return unknown;
   }
 
   applyRemoved(ids: string[]) {
     for (const id of ids) this.entities.delete(id);
   }
+
+  clear() {
+    this.entities.clear();
+  }
 }
 
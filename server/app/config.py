@@ -22,12 +22,69 @@ class Settings(BaseModel):
     ticket_ttl_seconds: int = int(os.getenv("TICKET_TTL_SECONDS", "60"))
     rate_login_max: int = int(os.getenv("RATE_LOGIN_MAX", "10"))
     rate_chat_max: int = int(os.getenv("RATE_CHAT_MAX", "20"))
+    rate_move_max: int = int(os.getenv("RATE_MOVE_MAX", "20"))
+    rate_resync_max: int = int(os.getenv("RATE_RESYNC_MAX", "2"))
+    # bcrypt fora do event loop: threads, pedidos em espera antes do 503 e custo
+    # (hashes com custo diferente são regravados no login)
+    password_workers: int = int(os.getenv("PASSWORD_WORKERS", "2"))
+    password_max_queue: int = int(os.getenv("PASSWORD_MAX_QUEUE", "64"))
+    password_bcrypt_rounds: int = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
     database_url: str = Field(default_factory=lambda: os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL))
     db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
     db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
     db_pool_timeout: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
     db_pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    # flush periódico de personagens (UPDATE em lotes)
+    persist_interval_seconds: float = float(os.getenv("PERSIST_INTERVAL_SECONDS", "5"))
+    persist_batch_size: int = int(os.getenv("PERSIST_BATCH_SIZE", "500"))
+    # journal write-behind reaplicado no start: file | redis | off
+    persist_journal: str = os.getenv("PERSIST_JOURNAL", "file")
+    persist_journal_path: str = os.getenv("PERSIST_JOURNAL_PATH", "var/persist.journal")
+    persist_journal_flush_ms: int = int(os.getenv("PERSIST_JOURNAL_FLUSH_MS", "200"))
+    # processos do uvicorn (mesma variável que ``--workers`` lê); o journal em arquivo exige 1
+    web_concurrency: int = int(os.getenv("WEB_CONCURRENCY", "1"))
     dev_login_fallback: bool = os.getenv("DEV_LOGIN_FALLBACK", "false").lower() == "true"
+    tick_hz: int = int(os.getenv("TICK_HZ", "10"))
+    # mapas (assets/maps/<id>.json): padrão para Character.map sem asset, tempo até
+    # descarregar um mapa vazio e máximo de mapas residentes no modo local
+    map_default: str = os.getenv("MAP_DEFAULT", "zerion_start")
+    map_idle_seconds: float = float(os.getenv("MAP_IDLE_SECONDS", "300"))
+    map_max_loaded: int = int(os.getenv("MAP_MAX_LOADED", "16"))
+    # simulação: local (no processo do FastAPI) | process (workers por mapa via Unix socket)
+    shard_mode: str = os.getenv("SHARD_MODE", "local")
+    shard_maps: list[str] = [m for m in os.getenv("SHARD_MAPS", "zerion_start").split(",") if m]
+    shard_socket_dir: str = os.getenv("SHARD_SOCKET_DIR", "/tmp")
+    shard_spawn: bool = os.getenv("SHARD_SPAWN", "true").lower() == "true"
+    # regiões por mapa (faixas de SHARD_REGION_CHUNKS chunks em x, um worker cada)
+    # e margem de ghosts em chunks perto das fronteiras
+    shard_regions: int = int(os.getenv("SHARD_REGIONS", "1"))
+    shard_region_chunks: int = int(os.getenv("SHARD_REGION_CHUNKS", "64"))
+    shard_ghost_chunks: int = int(os.getenv("SHARD_GHOST_CHUNKS", "2"))
+    # scheduler de passo fixo: degradação sob carga
+    tick_overload_shedding: bool = os.getenv("TICK_OVERLOAD_SHEDDING", "true").lower() == "true"
+    # chunks simulados além dos assinados por players (o resto fica dormente)
+    sim_wake_margin: int = int(os.getenv("SIM_WAKE_MARGIN", "1"))
+    # pathfinding de NPCs: cache LRU de caminhos, orçamento do lote por tick (ms),
+    # expansões A* por agente por tick / por busca e agentes por destino para usar flow field
+    path_cache_size: int = int(os.getenv("PATH_CACHE_SIZE", "4096"))
+    path_tick_budget_ms: float = float(os.getenv("PATH_TICK_BUDGET_MS", "4"))
+    path_agent_budget: int = int(os.getenv("PATH_AGENT_BUDGET", "512"))
+    path_agent_max_expansions: int = int(os.getenv("PATH_AGENT_MAX_EXPANSIONS", "20000"))
+    path_flow_min_agents: int = int(os.getenv("PATH_FLOW_MIN_AGENTS", "8"))
+    # patches de estado: posição como dx/dy quantizado relativo ao baseline do viewer
+    state_pos_delta: bool = os.getenv("STATE_POS_DELTA", "false").lower() == "true"
+    state_pos_quantum: int = int(os.getenv("STATE_POS_QUANTUM", "1"))
+    # op resync: janela (ticks) em que o catch-up é delta; seq mais antigo recebe keyframe
+    state_resync_ticks: int = int(os.getenv("STATE_RESYNC_TICKS", "100"))
+    # instrumentação do tick (GET /metrics/tick); sampler = profiler por amostragem após estouro
+    tick_profile: bool = os.getenv("TICK_PROFILE", "true").lower() == "true"
+    tick_profile_sampler: bool = os.getenv("TICK_PROFILE_SAMPLER", "false").lower() == "true"
+    tick_profile_sample_ticks: int = int(os.getenv("TICK_PROFILE_SAMPLE_TICKS", "20"))
+    # gravação dos inputs aceitos por mapa (replay: python -m game.replay <arquivo>)
+    # e digest do mundo a cada N ticks para checar determinismo (0 = sem digest)
+    record_inputs: bool = os.getenv("RECORD_INPUTS", "false").lower() == "true"
+    record_dir: str = os.getenv("RECORD_DIR", "var/recordings")
+    record_check_every: int = int(os.getenv("RECORD_CHECK_EVERY", "100"))
 
 
 def _apply_driver_fallback() -> None:
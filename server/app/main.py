@@ -7,46 +7,53 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import get_settings
-import os
-from game.map_loader import load_tiled_json
-from game import map_loader as map_module
 from routes.health import router as health_router
+from routes.metrics import router as metrics_router
 from routes.auth import router as auth_router
 from ws.endpoints import router as ws_router
-from game.loop import GameServer
+from game.shards import world
 from game.state import Player
 from services.redis import redis_manager
 from services.persistence import persistence_manager
+from services.chat import chat_hub
+from services.passwords import password_hasher
 
 
 settings = get_settings()
-game_server = GameServer(tick_hz=10)
+
+
+def _persist_player(player: Player) -> None:
+    # marca dirty para flush periódico
+    if player.char_id is not None:
+        persistence_manager.mark_dirty(player.char_id, x=player.x, y=player.y, hp=player.hp, mp=player.mp)
+
+
+world.on_player_moved = _persist_player
+chat_hub.on_sent = world.profiler.count_bytes
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    # Carrega mapa Tiled
-    try:
-        base = os.path.dirname(__file__)
-        map_path = os.path.normpath(os.path.join(base, "../assets/maps/zerion_start.json"))
-        map_module.MAP = load_tiled_json(map_path, "zerion_start")
-    except Exception:
-        map_module.MAP = None
-    game_server.start()
+    # registro de mapas (carregados no primeiro player) ou workers por mapa (SHARD_MODE)
+    await world.start()
     await persistence_manager.start()
     # Inicializa Redis cedo
     try:
         await redis_manager.get_client()
     except Exception:
         pass
+    # assinante único de chat do processo
+    await chat_hub.start()
     try:
         yield
     finally:
         # Shutdown
-        await game_server.stop()
+        await chat_hub.stop()
+        await world.stop()
         await persistence_manager.stop()
         await redis_manager.close()
+        password_hasher.shutdown()
 
 
 app = FastAPI(lifespan=lifespan, title="Zerion API", version="0.1.0")
@@ -60,6 +67,7 @@ app.add_middleware(
 )
 
 app.include_router(health_router)
+app.include_router(metrics_router)
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(ws_router)
 
@@ -0,0 +1,218 @@
+"""Atividade por chunk: só os chunks perto de players são simulados.
+
+Um chunk é *ativo* quando algum observer o assina (``GridAoI.chunk_watchers``)
+ou está a até ``margin`` chunks de um assinado, para que NPCs logo fora da
+vista continuem andando. Os demais ficam *dormentes*: nenhum sistema os visita
+e, quando um observer volta, o tempo parado é aplicado de uma vez:
+
+- regen: o HP é função do tempo (``base + rate * (agora - t0)``, limitado ao
+  máximo), então tanto o passo ativo quanto o despertar usam a mesma fórmula;
+- respawn: o que vence num chunk dormente espera o despertar e nasce já com o
+  tempo desde o vencimento aplicado;
+- ``fast_forward[kind](world, ent, elapsed)``: gancho por tipo de entidade
+  (ex.: NPC volta ao ponto de origem) chamado no despertar.
+
+O relógio é o tempo simulado (soma dos ``dt`` do tick), não o de parede: o
+replay de inputs reproduz o mesmo resultado.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from .aoi import ChunkCoord, Entity, GridAoI
+from .state import WorldState
+
+
+# gancho de despertar por kind: (world, entidade, segundos dormidos)
+FastForward = Callable[[WorldState, Entity, float], None]
+# cria a entidade do respawn (posicionada; o HP inicial vem dela)
+SpawnFn = Callable[[], Entity]
+# regen do corpo novo: (hp/s, hp máximo)
+RegenSpec = Optional[Tuple[float, int]]
+
+# folga do relógio acumulado (50 x 0.1 s = 4.999...)
+_EPS = 1e-6
+
+
+class Regen:
+    __slots__ = ("rate", "max_hp", "base_hp", "t0")
+
+    def __init__(self, rate: float, max_hp: int, base_hp: int, t0: float) -> None:
+        self.rate = rate
+        self.max_hp = max_hp
+        self.base_hp = base_hp
+        self.t0 = t0
+
+    def hp_at(self, now: float) -> int:
+        return min(self.max_hp, self.base_hp + int(self.rate * (now - self.t0) + _EPS))
+
+
+class ChunkActivity:
+    def __init__(self, aoi: GridAoI, world: WorldState, margin: int = 1) -> None:
+        self.aoi = aoi
+        self.world = world
+        self.margin = max(0, margin)
+        self.now = 0.0
+        self.active: Set[ChunkCoord] = set()
+        # chunk -> instante em que adormeceu (ausente = dormente desde o início)
+        self.dormant_since: Dict[ChunkCoord, float] = {}
+        self._epoch = -1
+        self.fast_forward: Dict[str, FastForward] = {}
+        self.regen: Dict[str, Regen] = {}
+        # respawns agendados: (vence em, seq, chunk, spawn, regen) e os vencidos em chunk dormente
+        self._respawns: List[Tuple[float, int, ChunkCoord, SpawnFn, RegenSpec]] = []
+        self._due: Dict[ChunkCoord, List[Tuple[float, SpawnFn, RegenSpec]]] = {}
+        self._seq = itertools.count()
+        self.wakes = 0
+        self.sleeps = 0
+        self.fast_forwarded = 0
+        self.respawned = 0
+
+    # --- API dos sistemas -----------------------------------------------------
+
+    def is_active(self, chunk: ChunkCoord) -> bool:
+        return chunk in self.active
+
+    def is_entity_active(self, entity_id: str) -> bool:
+        return self.aoi.entity_to_chunk.get(entity_id) in self.active
+
+    def active_entity_ids(self) -> Iterator[str]:
+        """Entidades em chunks ativos (o que um sistema de NPC/combate deve visitar)."""
+        c2e = self.aoi.chunk_to_entities
+        for chunk in self.active:
+            ids = c2e.get(chunk)
+            if ids:
+                yield from ids
+
+    def set_regen(self, entity_id: str, rate_per_s: float, max_hp: int) -> None:
+        ent = self.world.entities.get(entity_id)
+        if ent is not None:
+            self.regen[entity_id] = Regen(rate_per_s, max_hp, ent.hp, self.now)
+            self.aoi.mark(entity_id)
+
+    def note_hp(self, entity_id: str, hp: int) -> None:
+        """HP mudou por fora (dano, cura): a regen recomeça deste valor."""
+        spec = self.regen.get(entity_id)
+        if spec is not None:
+            spec.base_hp = hp
+            spec.t0 = self.now
+
+    def schedule_respawn(self, delay_s: float, x: int, y: int, spawn: SpawnFn, regen: RegenSpec = None) -> None:
+        """Agenda ``spawn()`` em (x, y); em chunk dormente, nasce só no despertar."""
+        heapq.heappush(self._respawns, (self.now + delay_s, next(self._seq), self.aoi.pos_to_cell(x, y), spawn, regen))
+
+    def forget(self, entity_id: str) -> None:
+        if self.regen.pop(entity_id, None) is not None:
+            self.aoi.unmark(entity_id)
+
+    # --- tick -----------------------------------------------------------------
+
+    def update(self, dt: float) -> None:
+        """Avança o relógio, acorda/adormece chunks e aplica regen/respawn só nos ativos."""
+        self.now += dt
+        if self.aoi.watch_epoch != self._epoch:
+            self._epoch = self.aoi.watch_epoch
+            self._refresh()
+        self._run_respawns()
+        if self.regen:
+            self._regen_active()
+
+    def _refresh(self) -> None:
+        active: Set[ChunkCoord] = set()
+        m = self.margin
+        for cx, cy in self.aoi.chunk_watchers:
+            if m == 0:
+                active.add((cx, cy))
+                continue
+            for dx in range(-m, m + 1):
+                for dy in range(-m, m + 1):
+                    active.add((cx + dx, cy + dy))
+        woke = active - self.active
+        slept = self.active - active
+        self.active = active
+        for chunk in slept:
+            self.dormant_since[chunk] = self.now
+        self.sleeps += len(slept)
+        for chunk in woke:
+            self._wake(chunk)
+
+    def _wake(self, chunk: ChunkCoord) -> None:
+        # chunk nunca visto: dormente desde o início da simulação
+        since = self.dormant_since.pop(chunk, 0.0)
+        self.wakes += 1
+        if chunk in self.aoi.chunk_to_entities:
+            elapsed = self.now - since
+            entities = self.world.entities
+            for eid in list(self.aoi.chunk_to_entities.get(chunk, ())):
+                ent = entities.get(eid)
+                if ent is None:
+                    continue
+                hook = self.fast_forward.get(ent.kind)
+                if hook is not None:
+                    hook(self.world, ent, elapsed)
+                    self.fast_forwarded += 1
+                self._apply_regen(eid, ent)
+        for due, spawn, regen in self._due.pop(chunk, ()):
+            self._spawn(spawn, due, regen)
+
+    def _run_respawns(self) -> None:
+        heap = self._respawns
+        while heap and heap[0][0] <= self.now:
+            due, _seq, chunk, spawn, regen = heapq.heappop(heap)
+            if chunk in self.active:
+                self._spawn(spawn, due, regen)
+            else:
+                self._due.setdefault(chunk, []).append((due, spawn, regen))
+
+    def _spawn(self, spawn: SpawnFn, due: float, regen: RegenSpec) -> None:
+        ent = spawn()
+        self.world.upsert_entity(ent)
+        self.aoi.add_or_move(ent)
+        self.respawned += 1
+        elapsed = self.now - due
+        hook = self.fast_forward.get(ent.kind)
+        if hook is not None and elapsed > 0:
+            hook(self.world, ent, elapsed)
+            self.fast_forwarded += 1
+        if regen is not None:
+            # a regen do corpo novo conta desde o vencimento, não desde o despertar
+            self.regen[ent.id] = Regen(regen[0], regen[1], ent.hp, due)
+            self.aoi.mark(ent.id)
+            self._apply_regen(ent.id, ent)
+
+    def _regen_active(self) -> None:
+        # só quem regenera nos chunks ativos (índice por chunk mantido pelo GridAoI)
+        entities = self.world.entities
+        by_chunk = self.aoi.marked_by_chunk
+        for chunk in self.active:
+            ids = by_chunk.get(chunk)
+            if not ids:
+                continue
+            for eid in ids:
+                ent = entities.get(eid)
+                if ent is not None:
+                    self._apply_regen(eid, ent)
+
+    def _apply_regen(self, eid: str, ent: Entity) -> None:
+        spec = self.regen.get(eid)
+        if spec is None:
+            return
+        hp = spec.hp_at(self.now)
+        if hp > ent.hp:
+            self.world.set_fields(eid, hp=hp)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active_chunks": len(self.active),
+            "dormant_chunks": len(self.dormant_since),
+            "wakes": self.wakes,
+            "sleeps": self.sleeps,
+            "fast_forwarded": self.fast_forwarded,
+            "regen_entities": len(self.regen),
+            "respawns_scheduled": len(self._respawns),
+            "respawns_waiting": sum(len(v) for v in self._due.values()),
+            "respawned": self.respawned,
+        }
@@ -7,8 +7,10 @@ from typing import Dict, List, Set, Tuple, Any, Optional, Iterable
 ChunkCoord = Tuple[int, int]
 CELL_SIZE = 16
 
+_EMPTY: Set[str] = frozenset()  # type: ignore[assignment]
 
-@dataclass
+
+@dataclass(slots=True)
 class Entity:
   id: str
   kind: str
@@ -16,6 +18,12 @@ class Entity:
   y: int
   hp: int = 100
   meta: Optional[Dict[str, Any]] = None
+  # bits de campo alterados no tick corrente (ver game.state.F_*)
+  dirty: int = 0
+  # handle inteiro denso atribuído pelo WorldState (-1 = fora do mundo)
+  handle: int = -1
+  # relógio da última mudança (qualquer campo)
+  version: int = 0
 
 
 class GridAoI:
@@ -23,12 +31,30 @@ class GridAoI:
 
   - cell_size: tamanho do chunk em tiles/pixels
   - mantém mapeamento bidirecional: entidade -> chunk e chunk -> set de entidades
+  - observers (players) assinam os chunks ao redor; travessias de chunk de
+    entidades ou observers geram deltas de enter/leave por observer, e um
+    observer que fica no mesmo chunk não paga nada de pertinência
   """
 
   def __init__(self, cell_size: int = 16):
     self.cell_size = cell_size
     self.chunk_to_entities: Dict[ChunkCoord, Set[str]] = {}
     self.entity_to_chunk: Dict[str, ChunkCoord] = {}
+    # observers: chunk central, raio e chunks assinados -> observers
+    self.observer_chunk: Dict[str, ChunkCoord] = {}
+    self.observer_radius: Dict[str, int] = {}
+    self.chunk_watchers: Dict[ChunkCoord, Set[str]] = {}
+    # conjunto visível mantido incrementalmente e deltas pendentes por observer
+    self.visible: Dict[str, Set[str]] = {}
+    self.entered: Dict[str, Set[str]] = {}
+    self.left: Dict[str, Set[str]] = {}
+    self.updated: Dict[str, Set[str]] = {}
+    # muda sempre que um chunk ganha o primeiro ou perde o último observer
+    self.watch_epoch = 0
+    # subconjunto de entidades indexado também por chunk (ex.: quem regenera na
+    # ChunkActivity), mantido nos mesmos caminhos de move/remove
+    self.marked: Set[str] = set()
+    self.marked_by_chunk: Dict[ChunkCoord, Set[str]] = {}
 
   def _to_chunk(self, x: int, y: int) -> ChunkCoord:
     return (x // self.cell_size, y // self.cell_size)
@@ -37,18 +63,7 @@ class GridAoI:
     return self._to_chunk(x, y)
 
   def add_or_move(self, ent: Entity) -> None:
-    new_chunk = self._to_chunk(ent.x, ent.y)
-    old_chunk = self.entity_to_chunk.get(ent.id)
-    if old_chunk == new_chunk:
-      return
-    if old_chunk:
-      s = self.chunk_to_entities.get(old_chunk)
-      if s:
-        s.discard(ent.id)
-        if not s:
-          self.chunk_to_entities.pop(old_chunk, None)
-    self.entity_to_chunk[ent.id] = new_chunk
-    self.chunk_to_entities.setdefault(new_chunk, set()).add(ent.id)
+    self.set_entity_cell(ent.id, ent.x, ent.y)
 
   def set_entity_cell(self, entity_id: str, x: int, y: int) -> None:
     new_chunk = self._to_chunk(x, y)
@@ -63,6 +78,19 @@ class GridAoI:
           self.chunk_to_entities.pop(old_chunk, None)
     self.entity_to_chunk[entity_id] = new_chunk
     self.chunk_to_entities.setdefault(new_chunk, set()).add(entity_id)
+    if entity_id in self.marked:
+      if old_chunk:
+        self._unindex_marked(entity_id, old_chunk)
+      self.marked_by_chunk.setdefault(new_chunk, set()).add(entity_id)
+    # somente quem assina um chunk e não o outro vê a travessia
+    old_w = self.chunk_watchers.get(old_chunk, _EMPTY) if old_chunk else _EMPTY
+    new_w = self.chunk_watchers.get(new_chunk, _EMPTY)
+    for oid in old_w:
+      if oid not in new_w:
+        self._emit_leave(oid, entity_id)
+    for oid in new_w:
+      if oid not in old_w:
+        self._emit_enter(oid, entity_id)
 
   def remove(self, entity_id: str) -> None:
     chunk = self.entity_to_chunk.pop(entity_id, None)
@@ -73,6 +101,154 @@ class GridAoI:
       s.discard(entity_id)
       if not s:
         self.chunk_to_entities.pop(chunk, None)
+    if entity_id in self.marked:
+      # continua marcada: volta ao índice se for readicionada
+      self._unindex_marked(entity_id, chunk)
+    for oid in self.chunk_watchers.get(chunk, _EMPTY):
+      self._emit_leave(oid, entity_id)
+
+  def mark(self, entity_id: str) -> None:
+    """Inclui a entidade no índice ``marked_by_chunk``."""
+    if entity_id in self.marked:
+      return
+    self.marked.add(entity_id)
+    chunk = self.entity_to_chunk.get(entity_id)
+    if chunk:
+      self.marked_by_chunk.setdefault(chunk, set()).add(entity_id)
+
+  def unmark(self, entity_id: str) -> None:
+    if entity_id not in self.marked:
+      return
+    self.marked.discard(entity_id)
+    chunk = self.entity_to_chunk.get(entity_id)
+    if chunk:
+      self._unindex_marked(entity_id, chunk)
+
+  def _unindex_marked(self, entity_id: str, chunk: ChunkCoord) -> None:
+    s = self.marked_by_chunk.get(chunk)
+    if s:
+      s.discard(entity_id)
+      if not s:
+        self.marked_by_chunk.pop(chunk, None)
+
+  def touch(self, entity_id: str) -> None:
+    """Marca a entidade como alterada para todos os observers que a enxergam."""
+    chunk = self.entity_to_chunk.get(entity_id)
+    if chunk is None:
+      return
+    for oid in self.chunk_watchers.get(chunk, _EMPTY):
+      if oid != entity_id:
+        self.updated[oid].add(entity_id)
+
+  # --- observers -------------------------------------------------------------
+
+  def add_observer(self, observer_id: str, x: int, y: int, radius: int = 1) -> None:
+    if observer_id in self.observer_chunk:
+      self.remove_observer(observer_id)
+    chunk = self._to_chunk(x, y)
+    self.observer_chunk[observer_id] = chunk
+    self.observer_radius[observer_id] = radius
+    self.visible[observer_id] = set()
+    self.entered[observer_id] = set()
+    self.left[observer_id] = set()
+    self.updated[observer_id] = set()
+    for cell in self.neighbors_of_cell(chunk[0], chunk[1], radius):
+      self._watch(observer_id, cell)
+
+  def move_observer(self, observer_id: str, x: int, y: int) -> None:
+    old_chunk = self.observer_chunk.get(observer_id)
+    new_chunk = self._to_chunk(x, y)
+    if old_chunk is None or old_chunk == new_chunk:
+      return
+    radius = self.observer_radius[observer_id]
+    old_cells = set(self.neighbors_of_cell(old_chunk[0], old_chunk[1], radius))
+    new_cells = set(self.neighbors_of_cell(new_chunk[0], new_chunk[1], radius))
+    self.observer_chunk[observer_id] = new_chunk
+    for cell in old_cells - new_cells:
+      self._unwatch(observer_id, cell)
+    for cell in new_cells - old_cells:
+      self._watch(observer_id, cell)
+
+  def remove_observer(self, observer_id: str) -> None:
+    chunk = self.observer_chunk.pop(observer_id, None)
+    if chunk is None:
+      return
+    radius = self.observer_radius.pop(observer_id, 1)
+    for cell in self.neighbors_of_cell(chunk[0], chunk[1], radius):
+      w = self.chunk_watchers.get(cell)
+      if w:
+        w.discard(observer_id)
+        if not w:
+          self.chunk_watchers.pop(cell, None)
+          self.watch_epoch += 1
+    self.visible.pop(observer_id, None)
+    self.entered.pop(observer_id, None)
+    self.left.pop(observer_id, None)
+    self.updated.pop(observer_id, None)
+
+  def pop_deltas(self, observer_id: str) -> Tuple[Set[str], Set[str], Set[str]]:
+    """Consome os deltas pendentes do observer: (entered, left, updated)."""
+    entered = self.entered[observer_id]
+    left = self.left[observer_id]
+    updated = self.updated[observer_id]
+    self.entered[observer_id] = set()
+    self.left[observer_id] = set()
+    self.updated[observer_id] = set()
+    if updated and entered:
+      updated -= entered
+    return entered, left, updated
+
+  def defer(self, observer_id: str, entity_ids: Iterable[str]) -> None:
+    """Devolve updates não enviados ao observer para o próximo ``pop_deltas``."""
+    visible = self.visible.get(observer_id)
+    if visible is None:
+      return
+    updated = self.updated[observer_id]
+    for eid in entity_ids:
+      if eid in visible:
+        updated.add(eid)
+
+  def _watch(self, observer_id: str, cell: ChunkCoord) -> None:
+    w = self.chunk_watchers.get(cell)
+    if w is None:
+      w = self.chunk_watchers[cell] = set()
+      self.watch_epoch += 1
+    w.add(observer_id)
+    for eid in self.chunk_to_entities.get(cell, _EMPTY):
+      self._emit_enter(observer_id, eid)
+
+  def _unwatch(self, observer_id: str, cell: ChunkCoord) -> None:
+    w = self.chunk_watchers.get(cell)
+    if w:
+      w.discard(observer_id)
+      if not w:
+        self.chunk_watchers.pop(cell, None)
+        self.watch_epoch += 1
+    for eid in self.chunk_to_entities.get(cell, _EMPTY):
+      self._emit_leave(observer_id, eid)
+
+  def _emit_enter(self, observer_id: str, entity_id: str) -> None:
+    if entity_id == observer_id:
+      return
+    self.visible[observer_id].add(entity_id)
+    left = self.left[observer_id]
+    if entity_id in left:
+      # saiu e voltou antes do próximo snapshot: o cliente ainda a tem
+      left.discard(entity_id)
+      self.updated[observer_id].add(entity_id)
+    else:
+      self.entered[observer_id].add(entity_id)
+
+  def _emit_leave(self, observer_id: str, entity_id: str) -> None:
+    if entity_id == observer_id:
+      return
+    self.visible[observer_id].discard(entity_id)
+    entered = self.entered[observer_id]
+    if entity_id in entered:
+      entered.discard(entity_id)
+    else:
+      self.left[observer_id].add(entity_id)
+    self.updated[observer_id].discard(entity_id)
 
   def neighbors(self, x: int, y: int, radius_chunks: int = 1) -> Set[str]:
     cx, cy = self._to_chunk(x, y)
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import struct
+from typing import Any, Callable, Dict, Hashable, List
+
+import umsgpack
+
+
+def pack_array_header(n: int) -> bytes:
+    if n < 16:
+        return bytes((0x90 | n,))
+    if n < 0x10000:
+        return b"\xdc" + struct.pack(">H", n)
+    return b"\xdd" + struct.pack(">I", n)
+
+
+def pack_map_header(n: int) -> bytes:
+    if n < 16:
+        return bytes((0x80 | n,))
+    if n < 0x10000:
+        return b"\xde" + struct.pack(">H", n)
+    return b"\xdf" + struct.pack(">I", n)
+
+
+def pack_array_raw(items: List[bytes]) -> bytes:
+    """Array msgpack cujos itens já estão codificados (emenda os bytes)."""
+    return pack_array_header(len(items)) + b"".join(items)
+
+
+# prefixo constante de toda mensagem de estado (mesma ordem de chaves de build_msg)
+_STATE_PREFIX = pack_map_header(6) + umsgpack.packb("v") + umsgpack.packb(1) + umsgpack.packb("op") + umsgpack.packb("state")
+_K_TS = umsgpack.packb("ts")
+_K_SEQ = umsgpack.packb("seq")
+_K_ACK = umsgpack.packb("ack")
+_K_PAYLOAD = umsgpack.packb("payload")
+_PAYLOAD_HEADER = pack_map_header(4)
+_PAYLOAD_HEADER_FLAGS = pack_map_header(5)
+_K_YOU = umsgpack.packb("you")
+_K_ADDED = umsgpack.packb("added")
+_K_UPDATED = umsgpack.packb("updated")
+_K_REMOVED = umsgpack.packb("removed")
+_K_FLAGS = umsgpack.packb("flags")
+
+
+def pack_state(
+    *,
+    seq: int,
+    ack: int,
+    ts: int,
+    you: Dict[str, Any],
+    added: List[bytes],
+    updated: List[bytes],
+    removed: List[str],
+    flags: int = 0,
+) -> bytes:
+    """Equivalente a ``umsgpack.packb(build_msg("state", ...))`` com registros pré-codificados.
+
+    ``added``/``updated`` recebem cada registro já em msgpack, para que o mesmo
+    registro visto por vários players seja codificado uma única vez por tick.
+    ``flags`` (resync/keyframe, ver game.wire) só entra no payload quando não é 0.
+    """
+    if flags:
+        return b"".join((
+            _STATE_PREFIX,
+            _K_TS, umsgpack.packb(int(ts)),
+            _K_SEQ, umsgpack.packb(int(seq)),
+            _K_ACK, umsgpack.packb(int(ack)),
+            _K_PAYLOAD, _PAYLOAD_HEADER_FLAGS,
+            _K_YOU, umsgpack.packb(you),
+            _K_ADDED, pack_array_raw(added),
+            _K_UPDATED, pack_array_raw(updated),
+            _K_REMOVED, umsgpack.packb(removed),
+            _K_FLAGS, umsgpack.packb(int(flags)),
+        ))
+    return b"".join((
+        _STATE_PREFIX,
+        _K_TS, umsgpack.packb(int(ts)),
+        _K_SEQ, umsgpack.packb(int(seq)),
+        _K_ACK, umsgpack.packb(int(ack)),
+        _K_PAYLOAD, _PAYLOAD_HEADER,
+        _K_YOU, umsgpack.packb(you),
+        _K_ADDED, pack_array_raw(added),
+        _K_UPDATED, pack_array_raw(updated),
+        _K_REMOVED, umsgpack.packb(removed),
+    ))
+
+
+class EncodeCache:
+    """Cache de registros codificados válido durante um único tick.
+
+    ``build`` gera o dict do registro a partir da chave (id da entidade ou, para
+    patches, id + máscara de campos); o resultado em msgpack é reaproveitado por
+    todos os viewers que recebem o mesmo registro no tick.
+    """
+
+    def __init__(self, build: Callable[[Any], Any]) -> None:
+        self._build = build
+        self._cache: Dict[Hashable, bytes] = {}
+        self.hits = 0
+
+    def get(self, key: Hashable) -> bytes:
+        data = self._cache.get(key)
+        if data is None:
+            data = umsgpack.packb(self._build(key))
+            self._cache[key] = data
+        else:
+            self.hits += 1
+        return data
+
+
+class TickEncoder:
+    """Caches de codificação de um tick, compartilhados entre sessões do mesmo protocolo."""
+
+    def __init__(self) -> None:
+        self._caches: Dict[str, EncodeCache] = {}
+
+    def cache(self, name: str, build: Callable[[Any], Any]) -> EncodeCache:
+        c = self._caches.get(name)
+        if c is None:
+            c = EncodeCache(build)
+            self._caches[name] = c
+        return c
@@ -0,0 +1,55 @@
+"""Framing do IPC local entre gateway WS e workers de simulação (Unix socket).
+
+Cada frame é ``u32 big-endian (tamanho) + array msgpack``; o primeiro item é
+o tipo da mensagem.
+
+Gateway -> worker::
+
+    ["join", sid, player_id, [x, y, hp, mp, char_id|nil], subprotocol]
+    ["input", sid, player_id, msg]
+    ["leave", req, sid, player_id]
+    ["credit", sid, n]            frames de estado já enviados ao socket
+    ["stats", req]
+    ["reset_stats", req]          zera o profiler do worker (responde True)
+    ["adopt", sid, player_id, estado]       handoff vindo da região vizinha
+    ["ghosts", região_origem, [registro, ...]]
+
+Worker -> gateway::
+
+    ["out", sid, bytes]           frame já codificado no protocolo da sessão
+    ["persist", [[char_id, x, y, hp, mp], ...]]
+    ["reply", req, valor]
+    ["handoff", sid, região_destino, estado]
+    ["ghosts", região_destino, região_origem, [registro, ...]]
+    ["bounce", sid, player_id, msg]   input que chegou depois do handoff
+"""
+
+from __future__ import annotations
+
+import asyncio
+import struct
+from typing import Any, List
+
+import umsgpack
+
+
+_LEN = struct.Struct(">I")
+# teto de frame: snapshots grandes cabem com folga
+MAX_FRAME = 16 * 1024 * 1024
+
+
+def pack_frame(msg: List[Any]) -> bytes:
+    body = umsgpack.packb(msg)
+    return _LEN.pack(len(body)) + body
+
+
+async def read_frame(reader: asyncio.StreamReader) -> List[Any]:
+    """Lê um frame; ``asyncio.IncompleteReadError`` quando a conexão fecha."""
+    header = await reader.readexactly(_LEN.size)
+    (n,) = _LEN.unpack(header)
+    if n > MAX_FRAME:
+        raise ValueError(f"frame IPC grande demais: {n}")
+    msg = umsgpack.unpackb(await reader.readexactly(n))
+    if not isinstance(msg, list) or not msg:
+        raise ValueError("frame IPC inválido")
+    return msg
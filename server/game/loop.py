@@ -1,139 +1,730 @@
 import asyncio
 import time
-from typing import Optional, Dict, Deque
+from typing import Any, Optional, Dict, Deque, Callable, List, Protocol, Set, Tuple
 from collections import deque
+
+import numpy as np
+
+from .activity import ChunkActivity
 from .aoi import GridAoI, Entity
-from .types import build_msg
-from .state import WorldState, Player
-from game import map_loader as map_module
+from .map_loader import MapData
+from .codec import TickEncoder
+from .movement import resolve_moves
+from .pathfinding import PathService
+from .profiler import TickProfiler
+from .recorder import InputRecorder, recording_path
+from .regions import GhostRecord, RegionMap
+from .resync import ResyncLog, TickClocks
+from .types import now_ms
+from .state import WorldState, Player, Baseline, PatchKey, F_POS
+from .wire import V1Codec, V2Codec, STATE_KEYFRAME, STATE_RESYNC
+from app.config import get_settings
+
+
+class Sink(Protocol):
+    """Saída não bloqueante de um player (ex.: ws.outbound.Outbox)."""
+
+    def push(self, data: bytes) -> bool: ...
+
+    def full(self) -> bool: ...
+
+
+# limite de inputs pendentes por player (o rate-limit no WS já corta antes disso)
+MAX_PENDING_INPUTS = 64
+
+# níveis de sobrecarga do scheduler (custo médio do tick / orçamento)
+OVERLOAD_NONE = 0
+OVERLOAD_FAR_SNAPSHOTS = 1  # entidades distantes com snapshot a cada FAR_EVERY[nível] ticks
+OVERLOAD_SHED_SYSTEMS = 2  # idem + sistemas não críticos pulados
+OVERLOAD_ENTER = (0.7, 0.9)  # limiar de entrada nos níveis 1 e 2
+OVERLOAD_EXIT = 0.5  # abaixo disso volta ao normal
+FAR_EVERY = (1, 2, 4)
+
+System = Callable[[float], None]
 
 
 class GameServer:
-    """Loop autoritativo simples (tick rate configurável)."""
+    """Loop autoritativo simples (tick rate configurável).
+
+    Um único mundo compartilhado: todos os sockets se registram via ``join`` e
+    o ``_tick`` drena as filas de input de todos os players, aplica movimento,
+    roda os sistemas registrados, atualiza AoI e, no estágio de broadcast,
+    monta e enfileira o estado de cada player uma vez por tick.
+
+    Passo fixo: os ticks seguem deadlines monotônicos (``dt`` constante). Ticks
+    vencidos durante um atraso são descartados (``dropped_ticks``): o tick
+    seguinte já aplica todos os inputs pendentes, e recuperá-los só adiantaria
+    os sistemas com o orçamento que faltou. Com o custo médio acima do
+    orçamento, o nível de sobrecarga reduz a taxa de snapshot de entidades
+    distantes e, no nível 2, pula sistemas não críticos.
 
-    def __init__(self, tick_hz: int = 10) -> None:
+    Cliente que perdeu estados pede ``resync`` com o último ``state_seq`` que
+    recebeu e leva, no próximo broadcast, um delta de catch-up (ou um keyframe
+    se o seq saiu da janela de ``resync_window`` ticks); um estado recusado
+    pelo sink vira resync automático a partir do último entregue.
+    """
+
+    def __init__(
+        self,
+        tick_hz: int = 10,
+        pos_delta: bool = False,
+        pos_quantum: int = 1,
+        profiler: Optional[TickProfiler] = None,
+        overload_shedding: bool = True,
+        map_data: Optional[MapData] = None,
+        wake_margin: int = 1,
+        resync_window: int = 100,
+    ) -> None:
         self.tick_hz = tick_hz
+        # mapa simulado por este servidor (None = sem colisão)
+        self.map = map_data
         self._task: Optional[asyncio.Task] = None
         self._running = asyncio.Event()
-        self._last_tick_ts: float | None = None
+        # scheduler de passo fixo
+        self.overload_shedding = overload_shedding
+        self.overload_level = OVERLOAD_NONE
+        self._cost_ema = 0.0
+        self.lag_s = 0.0
+        self.max_lag_s = 0.0
+        self.dropped_ticks = 0
+        self.skipped_systems = 0
+        self.deferred_updates = 0
+        # sistemas do tick (combate, regen, ...): (nome, fn(dt), crítico)
+        self.systems: List[Tuple[str, System, bool]] = []
+        # posse por região (workers com SHARD_REGIONS > 1): ghosts recebidos por região de origem
+        self.regions: Optional[RegionMap] = None
+        self.region = 0
+        self.ghosts: Dict[str, int] = {}
+        # chamado quando um player atravessa para outra região: (player_id, região destino)
+        self.on_handoff: Optional[Callable[[str, int], None]] = None
+        self.handoffs_out = 0
+        self.handoffs_in = 0
         self.aoi = GridAoI(cell_size=16)
-        self.entities: Dict[str, Entity] = {}
         self.state_seq: int = 0
+        # players conectados e saída de cada um
+        self.players: Dict[str, Player] = {}
+        self.sinks: Dict[str, Sink] = {}
+        # codec negociado de cada sessão (zerion.v1 / zerion.v2)
+        self.codecs: Dict[str, V1Codec | V2Codec] = {}
         # inputs por player: fila ordenada por seq e último seq aplicado
         self.player_inputs: Dict[str, Deque[dict]] = {}
         self.last_input_seq_applied: Dict[str, int] = {}
-        self.world = WorldState()
-        # rastreio de versão enviada por player
-        self.sent_version_by_player: Dict[str, Dict[str, int]] = {}
-        # células assinadas por player
-        # self.subscriptions_by_player poderia ser usada se assinarmos células explicitamente
+        # último ack efetivamente enviado para cada player
+        self.last_ack_sent: Dict[str, int] = {}
+        self.world = WorldState(pos_delta=pos_delta, pos_quantum=pos_quantum)
+        # baseline (versão/posição enviada) por player e entidade
+        self.baselines_by_player: Dict[str, Dict[str, Baseline]] = {}
+        # callback opcional chamado quando um player muda de posição (ex.: persistência)
+        self.on_player_moved: Optional[Callable[[Player], None]] = None
+        # histogramas de tick/fase, bytes por op e backlog (GET /metrics/tick)
+        self.profiler = profiler or TickProfiler()
+        # pathfinding de NPCs em lote (registrado como sistema não crítico)
+        self.paths: Optional[PathService] = None
+        # chunks sem observers ficam dormentes; sistemas visitam activity.active_entity_ids()
+        self.activity = ChunkActivity(self.aoi, self.world, margin=wake_margin)
+        # log binário dos inputs aceitos (RECORD_INPUTS; reproduzido por game.replay)
+        self.recorder: Optional[InputRecorder] = None
+        # resync sem reconectar: relógio do mundo por tick, frames enviados por
+        # player e seq a partir do qual o próximo estado do player é um catch-up
+        self.resync_window = resync_window
+        self.tick_clocks = TickClocks(resync_window, max(FAR_EVERY) - 1)
+        self.resync_logs: Dict[str, ResyncLog] = {}
+        self.pending_resync: Dict[str, int] = {}
+        self.resyncs_delta = 0
+        self.resyncs_keyframe = 0
 
     def start(self) -> None:
+        # antes do early-return: retoma um loop pausado que ainda não saiu do sleep
+        self._running.set()
         if self._task and not self._task.done():
             return
-        self._running.set()
         self._task = asyncio.create_task(self._run_loop(), name="game_loop")
 
+    def pause(self) -> None:
+        """Para de tickar sem esperar o tick corrente (mapa sem players); ``start`` retoma."""
+        self._running.clear()
+        if self.recorder is not None:
+            self.recorder.flush()
+
     async def stop(self) -> None:
         self._running.clear()
         if self._task:
             await self._task
+        if self.recorder is not None:
+            self.recorder.close()
 
     async def _run_loop(self) -> None:
         tick_interval = 1.0 / float(self.tick_hz)
-        self._last_tick_ts = time.perf_counter()
+        deadline = time.monotonic()
         try:
             while self._running.is_set():
-                now = time.perf_counter()
-                dt = now - (self._last_tick_ts or now)
-                self._last_tick_ts = now
+                now = time.monotonic()
+                if now < deadline:
+                    await asyncio.sleep(deadline - now)
+                else:
+                    # atrasado: ainda cede o loop para os sockets
+                    await asyncio.sleep(0)
+                lag = max(0.0, time.monotonic() - deadline)
+                self._record_lag(lag)
 
-                # TODO: sistemas de jogo (movimento, colisão, combate, regen, etc.)
-                await self._tick(dt)
+                # ticks vencidos além do corrente são descartados: o deadline volta a acompanhar o relógio
+                behind = int(lag // tick_interval)
+                if behind:
+                    self.dropped_ticks += behind
+                    deadline += behind * tick_interval
 
-                # espera até o próximo tick, compensando drift simples
-                elapsed = time.perf_counter() - now
-                sleep_for = max(0.0, tick_interval - elapsed)
-                await asyncio.sleep(sleep_for)
+                await self._timed_tick(tick_interval, broadcast=True)
+                deadline += tick_interval
         except asyncio.CancelledError:
             pass
 
-    async def _tick(self, dt: float) -> None:
+    async def _timed_tick(self, dt: float, broadcast: bool) -> None:
+        t0 = time.perf_counter()
+        await self._tick(dt, broadcast=broadcast)
+        elapsed = time.perf_counter() - t0
+        self.profiler.end_tick(elapsed, dt)
+        self._update_overload(elapsed / dt)
+        if self.recorder is not None:
+            self.recorder.after_tick(self)
+
+    def _record_lag(self, lag: float) -> None:
+        self.lag_s = lag
+        if lag > self.max_lag_s:
+            self.max_lag_s = lag
+        self.profiler.observe_lag(lag)
+
+    def _update_overload(self, cost: float) -> None:
+        """Nível de sobrecarga pela média móvel do custo do tick (com histerese)."""
+        self._cost_ema = 0.8 * self._cost_ema + 0.2 * cost
+        if not self.overload_shedding:
+            return
+        ema = self._cost_ema
+        target = OVERLOAD_NONE
+        if ema >= OVERLOAD_ENTER[1]:
+            target = OVERLOAD_SHED_SYSTEMS
+        elif ema >= OVERLOAD_ENTER[0]:
+            target = OVERLOAD_FAR_SNAPSHOTS
+        if target < self.overload_level and ema > OVERLOAD_EXIT:
+            # só desce de nível quando o custo cai bem abaixo do orçamento
+            target = self.overload_level
+        self.overload_level = target
+
+    async def _tick(self, dt: float, broadcast: bool = True) -> None:
         # incrementa seq global de estado a cada tick
         self.state_seq += 1
-        _ = dt
+        prof = self.profiler
+        prof.begin_tick()
+        prof.observe_backlog(len(q) for q in self.player_inputs.values())
+        moved = self._drain_inputs()
+        t0 = time.perf_counter()
+        for player_id in moved:
+            self._sync_player_entity(self.players[player_id])
+        if moved and self.on_handoff is not None and self.regions is not None:
+            self._check_handoffs(moved)
+        t1 = time.perf_counter()
+        self.activity.update(dt)
+        self._run_systems(dt)
+        t2 = time.perf_counter()
+        # propaga as entidades alteradas no tick para quem as enxerga
+        for eid in self.world.pop_dirty():
+            self.aoi.touch(eid)
+        prof.phase("systems", t2 - t1)
+        prof.phase("aoi", (t1 - t0) + (time.perf_counter() - t2))
+        # sob sobrecarga, updates distantes podem sair até FAR_EVERY - 1 ticks depois
+        self.tick_clocks.record(self.world.clock, FAR_EVERY[self.overload_level] - 1)
+        if broadcast:
+            self._broadcast()
+
+    # --- sistemas registrados --------------------------------------------------
+
+    def add_system(self, name: str, fn: System, critical: bool = True) -> None:
+        """Registra um sistema chamado a cada tick com ``dt`` fixo.
+
+        Sistemas não críticos são pulados no nível de sobrecarga 2.
+        """
+        self.systems.append((name, fn, critical))
+
+    def _run_systems(self, dt: float) -> None:
+        shed = self.overload_level >= OVERLOAD_SHED_SYSTEMS
+        for _name, fn, critical in self.systems:
+            if shed and not critical:
+                self.skipped_systems += 1
+                continue
+            fn(dt)
+
+    # --- sessão ---------------------------------------------------------------
+
+    def join(self, player: Player, sink: Sink, codec: V1Codec | V2Codec | None = None) -> None:
+        """Registra o player no mundo compartilhado (substitui sessão anterior do mesmo id)."""
+        self.players[player.id] = player
+        self.sinks[player.id] = sink
+        self.codecs[player.id] = codec or V1Codec()
+        self.player_inputs[player.id] = deque(maxlen=MAX_PENDING_INPUTS)
+        self.last_input_seq_applied[player.id] = 0
+        self.last_ack_sent[player.id] = 0
+        self.baselines_by_player[player.id] = {}
+        self.resync_logs[player.id] = ResyncLog(self.resync_window)
+        self.pending_resync.pop(player.id, None)
+        ent = Entity(id=player.id, kind="player", x=player.x, y=player.y, hp=player.hp)
+        self.world.upsert_entity(ent)
+        self.aoi.add_or_move(ent)
+        self.aoi.add_observer(player.id, player.x, player.y, radius=1)
+        if self.recorder is not None:
+            self.recorder.join(self.state_seq, player.id, player.x, player.y, player.hp, player.mp, self.codecs[player.id].subprotocol)
+
+    def leave(self, player_id: str, sink: Sink | None = None) -> Optional[Player]:
+        """Remove o player do mundo. Se ``sink`` for dado, só remove se ainda for a sessão ativa."""
+        if sink is not None and self.sinks.get(player_id) is not sink:
+            return None
+        player = self._drop_session(player_id)
+        self.world.remove_entity(player_id)
+        self.aoi.remove(player_id)
+        self.activity.forget(player_id)
+        if self.recorder is not None:
+            self.recorder.leave(self.state_seq, player_id)
+        return player
+
+    def _drop_session(self, player_id: str) -> Optional[Player]:
+        player = self.players.pop(player_id, None)
+        self.sinks.pop(player_id, None)
+        self.codecs.pop(player_id, None)
+        self.player_inputs.pop(player_id, None)
+        self.last_input_seq_applied.pop(player_id, None)
+        self.last_ack_sent.pop(player_id, None)
+        self.baselines_by_player.pop(player_id, None)
+        self.resync_logs.pop(player_id, None)
+        self.pending_resync.pop(player_id, None)
+        self.aoi.remove_observer(player_id)
+        return player
+
+    # --- regiões: ghosts e handoff ---------------------------------------------
+
+    def set_region(self, regions: RegionMap, region: int) -> None:
+        self.regions = regions
+        self.region = region
+
+    def _check_handoffs(self, moved: List[str]) -> None:
+        assert self.regions is not None and self.on_handoff is not None
+        for player_id in moved:
+            p = self.players.get(player_id)
+            if p is None:
+                continue
+            target = self.regions.region_of(p.x, p.y)
+            if target != self.region:
+                self.on_handoff(player_id, target)
+
+    def handoff_state(self, player_id: str, target: int) -> Optional[Dict[str, Any]]:
+        """Entrega a autoridade do player à região ``target``.
+
+        Retorna o estado da sessão (player, seqs, inputs pendentes, o que o
+        cliente já conhece e o estado do codec); a entidade fica aqui como
+        ghost da região destino, sem remove/add para os observers locais.
+        """
+        player = self.players.get(player_id)
+        if player is None:
+            return None
+        codec = self.codecs[player_id]
+        state = {
+            "player": [player.x, player.y, player.hp, player.mp, player.char_id],
+            "seq": self.last_input_seq_applied.get(player_id, 0),
+            "ack": self.last_ack_sent.get(player_id, 0),
+            # seqs de estado daqui não valem para resync no worker vizinho
+            "state_seq": self.state_seq,
+            "inputs": list(self.player_inputs.get(player_id, ())),
+            # posição que o cliente reconstrói de cada entidade já enviada
+            "known": {eid: [b[1], b[2]] for eid, b in self.baselines_by_player.get(player_id, {}).items()},
+            "subprotocol": codec.subprotocol,
+            "codec": codec.session_state(),
+        }
+        self._drop_session(player_id)
+        self.ghosts[player_id] = target
+        self.handoffs_out += 1
+        return state
+
+    def adopt(self, player: Player, sink: Sink, codec: V1Codec | V2Codec, state: Dict[str, Any]) -> None:
+        """Recebe a autoridade de um player vindo da região vizinha (mesmo WebSocket).
+
+        O cliente mantém o que já tinha: entidades conhecidas e visíveis aqui
+        viram patch completo (baseline com versão 0); as que não são visíveis
+        saem em ``removed``. No v2, se o handle local diferir do que o cliente
+        conhece, a entidade sai e volta no mesmo frame com o handle novo.
+        """
+        codec.restore_session_state(state.get("codec"))
+        self.ghosts.pop(player.id, None)
+        self.join(player, sink, codec)
+        pid = player.id
+        self.last_input_seq_applied[pid] = int(state.get("seq", 0))
+        self.last_ack_sent[pid] = int(state.get("ack", 0))
+        self.resync_logs[pid].floor = max(self.state_seq, int(state.get("state_seq", 0)))
+        self.player_inputs[pid].extend(state.get("inputs") or ())
+        entered = self.aoi.entered[pid]
+        left = self.aoi.left[pid]
+        updated = self.aoi.updated[pid]
+        baselines = self.baselines_by_player[pid]
+        handles = getattr(codec, "handles", None)
+        for eid, (bx, by) in (state.get("known") or {}).items():
+            baselines[eid] = [0, bx, by]
+            ent = self.world.entities.get(eid)
+            if eid in entered and ent is not None and (handles is None or handles.get(eid) == ent.handle):
+                entered.discard(eid)
+                updated.add(eid)
+            else:
+                left.add(eid)
+        self.handoffs_in += 1
+
+    def apply_ghosts(self, src: int, records: List[GhostRecord]) -> None:
+        """Espelha as entidades de fronteira da região ``src`` (somente leitura).
+
+        Cada lote é o conjunto completo daquela região: ghosts dela que não
+        vieram no lote saem do mundo. Entidades com autoridade local são ignoradas.
+        """
+        seen: Set[str] = set()
+        for eid, kind, x, y, hp, meta in records:
+            if eid in self.world.entities and eid not in self.ghosts:
+                continue
+            seen.add(eid)
+            ent = self.world.entities.get(eid)
+            if ent is None:
+                ent = Entity(id=eid, kind=kind, x=x, y=y, hp=hp, meta=meta)
+                self.world.upsert_entity(ent)
+            else:
+                self.world.set_fields(eid, x=x, y=y, hp=hp, meta=meta, kind=kind)
+            self.ghosts[eid] = src
+            self.aoi.add_or_move(ent)
+        for eid, origin in list(self.ghosts.items()):
+            if origin == src and eid not in seen:
+                self.ghosts.pop(eid, None)
+                self.world.remove_entity(eid)
+                self.aoi.remove(eid)
+
+    def is_ghost(self, entity_id: str) -> bool:
+        return entity_id in self.ghosts
 
     # API para WS: enfileirar input de movimento; retorna warn_code ou None
     def enqueue_move(self, player_id: str, msg: dict) -> str | None:
-        # rate-limit simples por timestamp nos últimos 1s (feito no WS idealmente)
-        # aqui apenas enfileira para processamento ordenado
-        q = self.player_inputs.setdefault(player_id, deque())
+        # apenas enfileira; o processamento ordenado acontece no tick
+        q = self.player_inputs.get(player_id)
+        if q is None:
+            return "not_in_world"
         q.append(msg)
+        if self.recorder is not None:
+            self.recorder.move(self.state_seq, player_id, msg)
+        return None
+
+    def request_resync(self, player_id: str, last_seq: int) -> str | None:
+        """Cliente pede catch-up a partir do ``state_seq`` que recebeu (0 = keyframe).
+
+        O frame sai no próximo broadcast; pedidos repetidos antes dele ficam com o menor seq.
+        """
+        if player_id not in self.resync_logs:
+            return "not_in_world"
+        last_seq = max(0, int(last_seq))
+        pending = self.pending_resync.get(player_id)
+        self.pending_resync[player_id] = last_seq if pending is None else min(pending, last_seq)
         return None
 
-    # API para WS: aplicar inputs em ordem e retornar snapshot mínimo + ack
-    def apply_inputs_and_build_state(self, player_id: str, you: Entity) -> dict:
-        q = self.player_inputs.setdefault(player_id, deque())
+    # --- sistemas -------------------------------------------------------------
+
+    def _drain_inputs(self) -> List[str]:
+        """Drena os inputs pendentes de todos os players e resolve o movimento em lote.
+
+        Retorna os ids dos players que mudaram de posição.
+        """
+        t0 = time.perf_counter()
+        ids: List[str] = []
+        steps: List[List[Tuple[int, int]]] = []
+        for player_id, q in self.player_inputs.items():
+            if not q:
+                continue
+            last_applied = self.last_input_seq_applied.get(player_id, 0)
+            moves: List[Tuple[int, int]] = []
+            while q:
+                m = q.popleft()
+                seq = int(m.get("seq", 0))
+                if seq <= last_applied:
+                    continue
+                payload = m.get("payload") or {}
+                dx = int(payload.get("dx", 0))
+                dy = int(payload.get("dy", 0))
+                last_applied = seq
+                if dx < -1 or dx > 1 or dy < -1 or dy > 1:
+                    continue
+                moves.append((dx, dy))
+            self.last_input_seq_applied[player_id] = last_applied
+            if moves:
+                ids.append(player_id)
+                steps.append(moves)
+        t1 = time.perf_counter()
+        self.profiler.phase("input", t1 - t0)
+        if not ids:
+            return []
+
+        n = len(ids)
+        k = max(len(m) for m in steps)
+        dxs = np.zeros((k, n), dtype=np.int64)
+        dys = np.zeros((k, n), dtype=np.int64)
+        mask = np.zeros((k, n), dtype=bool)
+        for j, moves in enumerate(steps):
+            arr = np.asarray(moves, dtype=np.int64)
+            dxs[: len(moves), j] = arr[:, 0]
+            dys[: len(moves), j] = arr[:, 1]
+            mask[: len(moves), j] = True
+        players = [self.players[pid] for pid in ids]
+        xs = np.fromiter((p.x for p in players), dtype=np.int64, count=n)
+        ys = np.fromiter((p.y for p in players), dtype=np.int64, count=n)
+        nxs, nys = resolve_moves(self.map, xs, ys, dxs, dys, mask)
+
+        moved: List[str] = []
+        for j in np.flatnonzero((nxs != xs) | (nys != ys)).tolist():
+            p = players[j]
+            p.x = int(nxs[j])
+            p.y = int(nys[j])
+            moved.append(p.id)
+        self.profiler.phase("movement", time.perf_counter() - t1)
+        return moved
+
+    def _sync_player_entity(self, player: Player) -> None:
+        ent = self.world.entities.get(player.id)
+        if ent is None:
+            return
+        self.world.set_fields(player.id, x=player.x, y=player.y, hp=player.hp)
+        self.aoi.add_or_move(ent)
+        self.aoi.move_observer(player.id, player.x, player.y)
+        if self.on_player_moved:
+            self.on_player_moved(player)
+
+    def build_state(self, player_id: str, tick: TickEncoder) -> Optional[bytes]:
+        """Estado do player já codificado no protocolo da sessão (None se nada mudou).
+
+        Snapshot mínimo com seq global, ack do último input aplicado e diffs de
+        AoI; os registros de entidades vêm dos caches do tick. Com resync
+        pendente o frame leva o catch-up inteiro (ver ``_catch_up``).
+        """
+        t0 = time.perf_counter()
+        you = self.players[player_id]
         last_applied = self.last_input_seq_applied.get(player_id, 0)
-        while q:
-            m = q[0]
-            seq = int(m.get("seq", 0))
-            if seq <= last_applied:
-                q.popleft()
+        entered, left, changed = self.aoi.pop_deltas(player_id)
+        if changed and self.overload_level:
+            changed = self._defer_far_updates(player_id, changed)
+        baselines = self.baselines_by_player.setdefault(player_id, {})
+        added, updated, removed = self.world.diff_ids(entered, left, changed, baselines)
+        codec = self.codecs[player_id]
+        flags = 0
+        extra_removed: List[Any] = []
+        log = self.resync_logs.get(player_id)
+        if log is not None:
+            log.record(self.state_seq, added, codec.wire_ids(removed) if removed else [])
+            since = self.pending_resync.pop(player_id, None)
+            if since is not None:
+                flags, added, updated, extra_removed = self._catch_up(since, log, baselines)
+                if flags & STATE_KEYFRAME:
+                    removed = []
+        t1 = time.perf_counter()
+        self.profiler.phase("diff", t1 - t0)
+        ack_changed = last_applied != self.last_ack_sent.get(player_id)
+        if not ack_changed and not flags and not (added or updated or removed):
+            return None
+        self.last_ack_sent[player_id] = last_applied
+        data = codec.encode_state(
+            tick,
+            self.world,
+            seq=self.state_seq,
+            ack=last_applied,
+            ts=now_ms(),
+            you={"x": you.x, "y": you.y, "hp": you.hp, "mp": you.mp},
+            added=added,
+            updated=updated,
+            removed=removed,
+            flags=flags,
+            extra_removed=extra_removed,
+        )
+        if codec.rehandled and log is not None:
+            # catch-up a partir de antes deste frame também precisa trocar o handle
+            log.record(self.state_seq, [eid for eid, _ in codec.rehandled], [h for _, h in codec.rehandled if h is not None])
+        self.profiler.phase("encode", time.perf_counter() - t1)
+        return data
+
+    def _catch_up(
+        self, since: int, log: ResyncLog, baselines: Dict[str, Baseline]
+    ) -> Tuple[int, List[str], List[PatchKey], List[Any]]:
+        """Frame de resync para quem tem o estado até o seq ``since``: (flags, added, updated, removidos extra).
+
+        Delta: registro completo do que entrou na visão depois de ``since``,
+        patch absoluto dos campos alterados desde o relógio daquele tick e os
+        ids de rede que saíram. Fora da janela: keyframe com a visão inteira.
+        Os baselines passam a ser o que o frame entrega.
+        """
+        world = self.world
+        entities = world.entities
+        added: List[str] = []
+        updated: List[PatchKey] = []
+        delta = log.since(since, self.state_seq)
+        clock = self.tick_clocks.clock_at(since, self.state_seq) if delta is not None else None
+        if delta is None or clock is None:
+            for eid in list(baselines):
+                ent = entities.get(eid)
+                if ent is None:
+                    del baselines[eid]
+                    continue
+                baselines[eid] = [ent.version, ent.x, ent.y]
+                added.append(eid)
+            self.resyncs_keyframe += 1
+            return STATE_RESYNC | STATE_KEYFRAME, added, updated, []
+        entered, removed = delta
+        for eid, base in baselines.items():
+            ent = entities.get(eid)
+            if ent is None:
                 continue
-            # ordem crescente: aplica o próximo
-            q.popleft()
-            dx = int(m.get("payload", {}).get("dx", 0))
-            dy = int(m.get("payload", {}).get("dy", 0))
-            if dx < -1 or dx > 1 or dy < -1 or dy > 1:
+            base[0] = ent.version
+            if eid in entered:
+                added.append(eid)
+                base[1], base[2] = ent.x, ent.y
                 continue
-            # colisão autoritativa (slide por eixos)
-            speed = 4
-            nx = you.x + dx * speed
-            ny = you.y
-            mp = map_module.MAP
-            if mp:
-                # eixo X
-                if not _is_aabb_blocked(mp, nx, ny):
-                    you.x = nx
-                # eixo Y
-                nny = you.y + dy * speed
-                if not _is_aabb_blocked(mp, you.x, nny):
-                    you.y = nny
-                # clamp bordas
-                you.x = max(0, min(you.x, mp.width * mp.tile_w - 1))
-                you.y = max(0, min(you.y, mp.height * mp.tile_h - 1))
+            mask = world.changed_mask(ent, clock)
+            if mask & F_POS:
+                # posição absoluta: o cliente pode ter perdido dx/dy
+                mask |= F_POS
+                base[1], base[2] = ent.x, ent.y
+            if mask:
+                updated.append((eid, mask, 0, 0))
+        self.resyncs_delta += 1
+        return STATE_RESYNC, added, updated, removed
+
+    def _defer_far_updates(self, player_id: str, changed: Set[str]) -> Set[str]:
+        """Sobrecarga: updates de entidades distantes só a cada FAR_EVERY[nível] ticks.
+
+        Os adiados voltam para o AoI do viewer; como o diff é por versão, o
+        snapshot seguinte leva o estado mais recente. A fase por viewer (handle)
+        espalha os snapshots distantes entre ticks. Distante é o que está além
+        do raio garantido da visão (raio do observer em chunks vezes o tamanho
+        do chunk, Chebyshev), visível só pela granularidade dos chunks.
+        """
+        every = FAR_EVERY[self.overload_level]
+        ent = self.world.entities.get(player_id)
+        if ent is None or (self.state_seq + ent.handle) % every == 0:
+            return changed
+        reach = self.aoi.observer_radius.get(player_id, 1) * self.aoi.cell_size
+        vx, vy = ent.x, ent.y
+        entities = self.world.entities
+        near: Set[str] = set()
+        far: List[str] = []
+        for eid in changed:
+            e = entities.get(eid)
+            if e is not None and max(abs(e.x - vx), abs(e.y - vy)) > reach:
+                far.append(eid)
             else:
-                you.x = nx
-                you.y = you.y + dy * speed
-            last_applied = seq
-        self.last_input_seq_applied[player_id] = last_applied
-        # snapshot mínimo com seq global e ack do último input aplicado
-        # calcular AoI e diffs
-        # manter index de célula do próprio player (para AoI)
-        self.aoi.set_entity_cell(you.id, you.x, you.y)
-        visible_ids = list(self.aoi.visible_ids(you.x, you.y, radius=1))
-        sent_version = self.sent_version_by_player.setdefault(player_id, {})
-        payload = self.world.build_diffs(
-            you=Player(id=you.id, x=you.x, y=you.y, hp=100, mp=50),
-            visible_ids=visible_ids,
-            sent_version=sent_version,
-        )
-        return build_msg(op="state", seq=self.state_seq, ack=last_applied, payload=payload)
-
-
-def _is_aabb_blocked(mp, px: int, py: int) -> bool:
-    # AABB do player: 20x20 px com ponto central (px,py)
-    half = 10
-    points = [
-        (px - half, py - half),
-        (px + half, py - half),
-        (px - half, py + half),
-        (px + half, py + half),
-    ]
-    for (x, y) in points:
-        if not mp.in_bounds_px(x, y) or mp.is_solid_px(x, y):
-            return True
-    return False
+                near.add(eid)
+        if far:
+            self.aoi.defer(player_id, far)
+            self.deferred_updates += len(far)
+        return near
+
+    def scheduler_stats(self) -> Dict[str, float]:
+        """Atraso e decisões do scheduler de passo fixo (GET /metrics/tick)."""
+        return {
+            "lag_ms": round(self.lag_s * 1000.0, 3),
+            "max_lag_ms": round(self.max_lag_s * 1000.0, 3),
+            "cost_ratio_ema": round(self._cost_ema, 3),
+            "overload_level": self.overload_level,
+            "dropped_ticks": self.dropped_ticks,
+            "skipped_systems": self.skipped_systems,
+            "deferred_updates": self.deferred_updates,
+            "resyncs_delta": self.resyncs_delta,
+            "resyncs_keyframe": self.resyncs_keyframe,
+        }
+
+    def _broadcast(self) -> None:
+        """Estágio final do tick: monta o estado de cada player e enfileira sem esperar o envio."""
+        tick = TickEncoder()
+        prof = self.profiler
+        sent_bytes = sent_msgs = 0
+        for player_id, sink in self.sinks.items():
+            # cliente lento: pula o tick sem avançar o baseline; o próximo diff cobre o atraso
+            if sink.full():
+                prof.skipped_sinks += 1
+                continue
+            data = self.build_state(player_id, tick)
+            if data is not None:
+                t0 = time.perf_counter()
+                log = self.resync_logs.get(player_id)
+                if sink.push(data):
+                    sent_bytes += len(data)
+                    sent_msgs += 1
+                    if log is not None:
+                        log.delivered(self.state_seq)
+                elif log is not None:
+                    # o baseline já avançou: o próximo estado é um catch-up do último entregue
+                    self.pending_resync.setdefault(player_id, log.last_delivered())
+                prof.phase("send", time.perf_counter() - t0)
+        if sent_msgs:
+            prof.count_bytes("state", sent_bytes, sent_msgs)
+
+    def stats(self) -> Dict[str, Any]:
+        """Visão de métricas do mundo (GET /metrics/tick; via IPC no modo com workers)."""
+        return {
+            "tick_hz": self.tick_hz,
+            "state_seq": self.state_seq,
+            "players": len(self.players),
+            "entities": len(self.world.entities),
+            "scheduler": self.scheduler_stats(),
+            "profiler": self.profiler.snapshot(self.input_depths()),
+            "outbox_dropped": sum(getattr(s, "dropped", 0) for s in self.sinks.values()),
+            "region": {
+                "region": self.region,
+                "ghosts": len(self.ghosts),
+                "handoffs_out": self.handoffs_out,
+                "handoffs_in": self.handoffs_in,
+            },
+            "pathfinding": self.paths.stats() if self.paths is not None else None,
+            "activity": self.activity.stats(),
+        }
+
+    def input_depths(self) -> Dict[str, int]:
+        """Inputs pendentes por player (backlog atual da fila de cada sessão)."""
+        return {pid: len(q) for pid, q in self.player_inputs.items()}
+
+
+def new_profiler() -> TickProfiler:
+    settings = get_settings()
+    return TickProfiler(
+        enabled=settings.tick_profile,
+        sampler=settings.tick_profile_sampler,
+        sample_ticks=settings.tick_profile_sample_ticks,
+    )
+
+
+def install_systems(server: GameServer) -> None:
+    """Sistemas do tick de um mapa (também usados pelo replay headless)."""
+    settings = get_settings()
+    paths = PathService(
+        lambda: server.map,
+        cache_size=settings.path_cache_size,
+        tick_budget_ms=settings.path_tick_budget_ms,
+        agent_budget=settings.path_agent_budget,
+        agent_max_expansions=settings.path_agent_max_expansions,
+        flow_min_agents=settings.path_flow_min_agents,
+    )
+    server.paths = paths
+    # IA de mobs: sob sobrecarga (nível 2) os caminhos esperam o próximo tick
+    server.add_system("pathfinding", paths.run, critical=False)
+
 
+def new_game_server(map_data: Optional[MapData] = None, profiler: Optional[TickProfiler] = None) -> GameServer:
+    """GameServer de um mapa configurado pelo Settings, com pathfinding próprio."""
+    settings = get_settings()
+    server = GameServer(
+        tick_hz=settings.tick_hz,
+        pos_delta=settings.state_pos_delta,
+        pos_quantum=settings.state_pos_quantum,
+        profiler=profiler or new_profiler(),
+        overload_shedding=settings.tick_overload_shedding,
+        map_data=map_data,
+        wake_margin=settings.sim_wake_margin,
+        resync_window=settings.state_resync_ticks,
+    )
+    install_systems(server)
+    if settings.record_inputs:
+        path = recording_path(settings.record_dir, map_data.id if map_data else None, time.strftime("%Y%m%d-%H%M%S"))
+        server.recorder = InputRecorder.open(path, server, check_every=settings.record_check_every)
+    return server
 
@@ -2,8 +2,30 @@ from __future__ import annotations
 
 import json
 import hashlib
+import contextlib
+import mmap
 import os
-from typing import List, Tuple
+import re
+import struct
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from . import nav
+
+
+@dataclass(frozen=True, slots=True)
+class MapInfo:
+    """Metadados de um mapa (hello e roteamento no gateway), sem grade nem navegação."""
+
+    id: str
+    version: str
+    width: int
+    height: int
+    tile_w: int
+    tile_h: int
 
 
 class MapData:
@@ -15,7 +37,7 @@ class MapData:
         height: int,
         tile_w: int,
         tile_h: int,
-        solids: List[List[bool]],
+        solids: np.ndarray,
         spawn: Tuple[int, int] = (0, 0),
     ) -> None:
         self.id = id
@@ -24,29 +46,114 @@ class MapData:
         self.height = height
         self.tile_w = tile_w
         self.tile_h = tile_h
-        self.solids = solids  # [y][x] bool
+        self.solids = solids  # grade de ocupação [y, x] uint8 (1 = sólido)
         self.spawn = spawn
+        self.width_px = width * tile_w
+        self.height_px = height * tile_h
+        # visão plana sem cópia (compartilha as páginas do mmap do mapa compilado):
+        # consulta escalar sem passar pelo indexador do numpy
+        self._cells = memoryview(np.ascontiguousarray(solids, dtype=np.uint8)).cast("B")
+
+    def info(self) -> MapInfo:
+        return MapInfo(self.id, self.version, self.width, self.height, self.tile_w, self.tile_h)
 
     def in_bounds_px(self, px: int, py: int) -> bool:
-        return 0 <= px < self.width * self.tile_w and 0 <= py < self.height * self.tile_h
+        return 0 <= px < self.width_px and 0 <= py < self.height_px
 
     def is_solid_tile(self, tx: int, ty: int) -> bool:
         if tx < 0 or ty < 0 or tx >= self.width or ty >= self.height:
             return True
-        return self.solids[ty][tx]
+        return self._cells[ty * self.width + tx] != 0
 
     def is_solid_px(self, px: int, py: int) -> bool:
         return self.is_solid_tile(px // self.tile_w, py // self.tile_h)
 
+    # --- estruturas de navegação (calculadas uma vez por mapa, ver game.nav) ---
+
+    @cached_property
+    def distance_field(self) -> np.ndarray:
+        """[y, x] uint8: distância Chebyshev em tiles até o sólido/borda mais próximo."""
+        return nav.distance_field(self.solids)
+
+    @cached_property
+    def solid_rects(self) -> np.ndarray:
+        """(n, 4) int32 de retângulos sólidos (tx, ty, w, h) em tiles."""
+        return nav.merge_solid_rects(self.solids)
+
+    @cached_property
+    def _regions(self) -> Tuple[np.ndarray, int]:
+        return nav.label_regions(self.solids)
+
+    @property
+    def region_labels(self) -> np.ndarray:
+        """[y, x] int32: componente conexa de cada tile livre (0 = sólido)."""
+        return self._regions[0]
+
+    @property
+    def region_count(self) -> int:
+        return self._regions[1]
+
+    @cached_property
+    def hpa(self) -> nav.HpaGraph:
+        return nav.build_hpa(self.solids)
+
+    def attach_nav(
+        self, distance_field: np.ndarray, solid_rects: np.ndarray, regions: Tuple[np.ndarray, int], hpa: nav.HpaGraph
+    ) -> "MapData":
+        """Usa estruturas já calculadas (mapa compilado) no lugar do cálculo preguiçoso."""
+        self.__dict__.update(distance_field=distance_field, solid_rects=solid_rects, _regions=regions, hpa=hpa)
+        return self
+
+    def precompute(self) -> "MapData":
+        """Força o cálculo de todas as estruturas (boot), fora do caminho do tick."""
+        self.distance_field
+        self.solid_rects
+        self._regions
+        self.hpa
+        return self
+
+    def clearance_px(self, px: int, py: int) -> int:
+        """Tiles livres garantidos em volta do ponto (0 se sólido ou fora do mapa)."""
+        if not self.in_bounds_px(px, py):
+            return 0
+        return int(self.distance_field[py // self.tile_h, px // self.tile_w])
+
+    def region_at_px(self, px: int, py: int) -> int:
+        if not self.in_bounds_px(px, py):
+            return 0
+        return int(self.region_labels[py // self.tile_h, px // self.tile_w])
+
+    def connected_px(self, ax: int, ay: int, bx: int, by: int) -> bool:
+        """True se existe caminho (4-conexo) entre os dois pontos; O(1)."""
+        ra = self.region_at_px(ax, ay)
+        return ra != 0 and ra == self.region_at_px(bx, by)
+
+    def rects_in_box_px(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        """Retângulos sólidos (em px: x, y, w, h) que tocam a caixa [x0, x1) x [y0, y1)."""
+        r = self.solid_rects
+        tw, th = self.tile_w, self.tile_h
+        rx0, ry0 = r[:, 0] * tw, r[:, 1] * th
+        rx1, ry1 = rx0 + r[:, 2] * tw, ry0 + r[:, 3] * th
+        hit = (rx0 < x1) & (rx1 > x0) & (ry0 < y1) & (ry1 > y0)
+        return np.stack([rx0[hit], ry0[hit], (rx1 - rx0)[hit], (ry1 - ry0)[hit]], axis=1)
+
+
+def map_version(raw: str) -> str:
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:8]
+
 
 def load_tiled_json(path: str, map_id: str) -> MapData:
     with open(path, "r", encoding="utf-8") as f:
         raw = f.read()
+    return parse_tiled_json(raw, map_id)
+
+
+def parse_tiled_json(raw: str, map_id: str) -> MapData:
     data = json.loads(raw)
-    version = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:8]
+    version = map_version(raw)
     w, h = int(data["width"]), int(data["height"])
     tw, th = int(data["tilewidth"]), int(data["tileheight"])
-    solids: List[List[bool]] = [[False for _ in range(w)] for _ in range(h)]
+    solids = np.zeros((h, w), dtype=np.uint8)
 
     # layer com property collision: true
     layers = data.get("layers", [])
@@ -69,20 +176,13 @@ def load_tiled_json(path: str, map_id: str) -> MapData:
 
     if coll_layers:
         for ly in coll_layers:
-            gid = ly["data"]
-            for i, g in enumerate(gid):
-                if g and g != 0:
-                    x = i % w
-                    y = i // w
-                    solids[y][x] = True
+            gid = _layer_gids(ly, w, h)
+            solids |= (gid != 0).astype(np.uint8)
     elif gid_solid:
+        solid_gids = np.fromiter(gid_solid, dtype=np.uint32)
         for ly in [ly for ly in layers if ly.get("type") == "tilelayer"]:
-            gid = ly["data"]
-            for i, g in enumerate(gid):
-                if g in gid_solid:
-                    x = i % w
-                    y = i // w
-                    solids[y][x] = True
+            gid = _layer_gids(ly, w, h)
+            solids |= np.isin(gid, solid_gids).astype(np.uint8)
 
     spawn = (0, 0)
     for ly in layers:
@@ -94,8 +194,151 @@ def load_tiled_json(path: str, map_id: str) -> MapData:
     return MapData(map_id, version, w, h, tw, th, solids, spawn)
 
 
-# Global opcional (preenchido no boot)
-MAP: MapData | None = None
+def _layer_gids(layer: dict, w: int, h: int) -> np.ndarray:
+    return np.asarray(layer["data"], dtype=np.uint32).reshape(h, w)
+
+
+# diretório dos mapas Tiled (server/assets/maps/<map_id>.json)
+MAPS_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "../assets/maps"))
+# o id vem de Character.map e vira nome de arquivo (leitura do JSON, escrita do .zmap)
+MAP_ID_RE = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def map_path(map_id: str, ext: str) -> str | None:
+    """``<MAPS_DIR>/<map_id><ext>``; None se o id não for um nome simples."""
+    if not MAP_ID_RE.fullmatch(map_id):
+        return None
+    path = os.path.normpath(os.path.join(MAPS_DIR, map_id + ext))
+    if os.path.dirname(path) != MAPS_DIR:
+        return None
+    return path
+
+# --- mapa compilado (<map_id>.zmap ao lado do JSON) ----------------------------
+#
+# header | tabela de seções | seções alinhadas em 8 bytes. As grades saem do
+# arquivo via mmap somente-leitura, então workers do mesmo host dividem as
+# páginas; o JSON só é reprocessado quando ``version`` (sha1 do JSON) muda.
+
+COMPILED_EXT = ".zmap"
+COMPILED_MAGIC = b"ZMAP"
+COMPILED_FORMAT = 1
+# magic, formato, version, width, height, tile_w, tile_h, spawn, region_count, cluster HPA*, nº de seções
+_HEADER = struct.Struct("<4sH8sIIIIiiIII")
+# nome, dtype numpy, colunas (0 = grade [height, width], 1 = vetor)
+_SECTION = struct.Struct("<8s2sHQQ")
+
+
+def _sections(mp: MapData) -> Dict[str, Tuple[np.ndarray, int]]:
+    nodes, offsets, targets, costs = nav.hpa_to_arrays(mp.hpa)
+    return {
+        "solids": (mp.solids.astype(np.uint8, copy=False), 0),
+        "dist": (mp.distance_field, 0),
+        "labels": (mp.region_labels, 0),
+        "rects": (mp.solid_rects, 4),
+        "hnodes": (nodes, 2),
+        "hoffs": (offsets, 1),
+        "htgts": (targets, 1),
+        "hcosts": (costs, 1),
+    }
+
+
+def write_compiled(mp: MapData, path: str) -> None:
+    """Grava o mapa com as estruturas de navegação (tmp + rename: leitores nunca veem arquivo parcial)."""
+    sections = _sections(mp)
+    header = _HEADER.pack(
+        COMPILED_MAGIC, COMPILED_FORMAT, mp.version.encode("ascii")[:8], mp.width, mp.height,
+        mp.tile_w, mp.tile_h, int(mp.spawn[0]), int(mp.spawn[1]), mp.region_count, mp.hpa.cluster, len(sections),
+    )
+    offset = _align(len(header) + _SECTION.size * len(sections))
+    table = []
+    blobs = []
+    for name, (arr, cols) in sections.items():
+        data = np.ascontiguousarray(arr)
+        dtype = {np.dtype(np.uint8): b"u1", np.dtype(np.int32): b"i4"}[data.dtype]
+        table.append(_SECTION.pack(name.encode("ascii"), dtype, cols, offset, data.nbytes))
+        blobs.append((offset, data.tobytes()))
+        offset = _align(offset + data.nbytes)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(b"".join(table))
+        for off, blob in blobs:
+            f.seek(off)
+            f.write(blob)
+        # seções vazias no fim (ex.: HPA sem arestas) apontam para o último offset alinhado
+        f.truncate(offset)
+    os.replace(tmp, path)
+
+
+def read_compiled(path: str, map_id: str, version: str) -> Optional[MapData]:
+    """Abre ``path`` via mmap; None se não existir, estiver corrompido ou for de outra versão."""
+    try:
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        magic, fmt, ver, w, h, tw, th, sx, sy, region_count, cluster, count = _HEADER.unpack_from(buf, 0)
+        if magic != COMPILED_MAGIC or fmt != COMPILED_FORMAT or ver.decode("ascii") != version:
+            buf.close()
+            return None
+        arrays: Dict[str, np.ndarray] = {}
+        for i in range(count):
+            name, dtype, cols, offset, nbytes = _SECTION.unpack_from(buf, _HEADER.size + i * _SECTION.size)
+            dt = np.dtype(dtype.decode("ascii"))
+            if nbytes == 0:
+                arr = np.empty(0, dtype=dt)
+            else:
+                arr = np.frombuffer(buf, dtype=dt, count=nbytes // dt.itemsize, offset=offset)
+            if cols == 0:
+                arr = arr.reshape(h, w)
+            elif cols > 1:
+                arr = arr.reshape(-1, cols)
+            arrays[name.rstrip(b"\0").decode("ascii")] = arr
+        mp = MapData(map_id, version, w, h, tw, th, arrays["solids"], (sx, sy))
+        hpa = nav.hpa_from_arrays(cluster, arrays["hnodes"], arrays["hoffs"], arrays["htgts"], arrays["hcosts"])
+        return mp.attach_nav(arrays["dist"], arrays["rects"], (arrays["labels"], region_count), hpa)
+    except (struct.error, KeyError, ValueError, UnicodeDecodeError):
+        # views do numpy ainda apontam para o mmap: solta antes de fechar
+        arrays = arr = None  # noqa: F841
+        with contextlib.suppress(BufferError):
+            buf.close()
+        return None
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
 
 
+def load_map(map_id: str, compiled: bool = True) -> MapData | None:
+    """Carrega ``<MAPS_DIR>/<map_id>.json`` com as estruturas de navegação já calculadas.
 
+    Com ``compiled``, usa ``<map_id>.zmap`` quando a versão bate e o regrava
+    quando o JSON muda. None se o id não for um nome simples ou o
+    arquivo não existir ou for inválido.
+    """
+    src = map_path(map_id, ".json")
+    dst = map_path(map_id, COMPILED_EXT)
+    if src is None or dst is None:
+        return None
+    try:
+        with open(src, "r", encoding="utf-8") as f:
+            raw = f.read()
+    except OSError:
+        return None
+    version = map_version(raw)
+    if compiled:
+        mp = read_compiled(dst, map_id, version)
+        if mp is not None:
+            return mp
+    try:
+        mp = parse_tiled_json(raw, map_id).precompute()
+    except Exception:
+        return None
+    if compiled:
+        # diretório somente-leitura: segue com o mapa em memória
+        try:
+            write_compiled(mp, dst)
+        except OSError:
+            pass
+    return mp
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .map_loader import MapData
+
+
+# deslocamento por input (px) e meia-largura do AABB do player (20x20 px, centro em x,y)
+MOVE_SPEED = 4
+PLAYER_HALF = 10
+
+_CORNERS = ((-PLAYER_HALF, -PLAYER_HALF), (PLAYER_HALF, -PLAYER_HALF), (-PLAYER_HALF, PLAYER_HALF), (PLAYER_HALF, PLAYER_HALF))
+
+
+def aabb_blocked(mp: MapData, px: int, py: int) -> bool:
+    """Versão escalar: True se algum canto do AABB está fora do mapa ou em tile sólido."""
+    # atalho pelo campo de distância: longe de parede/borda, nenhum canto pode bater
+    reach = max(-(-PLAYER_HALF // mp.tile_w), -(-PLAYER_HALF // mp.tile_h))
+    if mp.clearance_px(px, py) > reach:
+        return False
+    for ox, oy in _CORNERS:
+        x, y = px + ox, py + oy
+        if not mp.in_bounds_px(x, y) or mp.is_solid_px(x, y):
+            return True
+    return False
+
+
+def aabb_blocked_many(mp: MapData, px: np.ndarray, py: np.ndarray) -> np.ndarray:
+    """Versão vetorizada de ``aabb_blocked`` para arrays de posições."""
+    w_px = mp.width * mp.tile_w
+    h_px = mp.height * mp.tile_h
+    blocked = np.zeros(px.shape, dtype=bool)
+    for ox, oy in _CORNERS:
+        x = px + ox
+        y = py + oy
+        out = (x < 0) | (y < 0) | (x >= w_px) | (y >= h_px)
+        tx = np.clip(x // mp.tile_w, 0, mp.width - 1)
+        ty = np.clip(y // mp.tile_h, 0, mp.height - 1)
+        blocked |= out | (mp.solids[ty, tx] != 0)
+    return blocked
+
+
+def resolve_moves(
+    mp: Optional[MapData],
+    xs: np.ndarray,
+    ys: np.ndarray,
+    dxs: np.ndarray,
+    dys: np.ndarray,
+    mask: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Resolve os inputs pendentes de todos os players num passe vetorizado.
+
+    ``xs``/``ys`` têm shape (n,); ``dxs``/``dys``/``mask`` têm shape (k, n), onde a
+    linha i é o i-ésimo input de cada player e ``mask`` marca os inputs existentes
+    (players com menos inputs são completados com False). Cada passo aplica o
+    slide por eixos (X depois Y) e o clamp nas bordas, como no movimento escalar.
+    """
+    xs = xs.astype(np.int64, copy=True)
+    ys = ys.astype(np.int64, copy=True)
+    if mp is None:
+        xs += (dxs * mask).sum(axis=0) * MOVE_SPEED
+        ys += (dys * mask).sum(axis=0) * MOVE_SPEED
+        return xs, ys
+    max_x = mp.width * mp.tile_w - 1
+    max_y = mp.height * mp.tile_h - 1
+    for i in range(mask.shape[0]):
+        m = mask[i]
+        # eixo X
+        nx = xs + dxs[i] * MOVE_SPEED
+        ok = m & ~aabb_blocked_many(mp, nx, ys)
+        xs = np.where(ok, nx, xs)
+        # eixo Y
+        ny = ys + dys[i] * MOVE_SPEED
+        ok = m & ~aabb_blocked_many(mp, xs, ny)
+        ys = np.where(ok, ny, ys)
+        # clamp bordas
+        xs = np.where(m, np.clip(xs, 0, max_x), xs)
+        ys = np.where(m, np.clip(ys, 0, max_y), ys)
+    return xs, ys
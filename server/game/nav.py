@@ -0,0 +1,235 @@
+"""Estruturas de navegação/colisão pré-computadas a partir da grade de sólidos.
+
+Tudo trabalha em coordenadas de tile sobre ``MapData.solids`` (uint8 [y, x],
+1 = sólido); a borda do mapa conta como parede. MapData guarda os resultados
+(ver ``MapData.precompute``), então nada aqui roda por consulta:
+
+- ``distance_field``: distância Chebyshev (em tiles) até o sólido mais próximo
+- ``merge_solid_rects``: sólidos fundidos em retângulos para testes de varredura
+- ``label_regions``: componentes 4-conexas de tiles livres
+- ``build_hpa``: grafo abstrato HPA* (entradas entre clusters + custos internos)
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+# teto do campo de distância (cabe em uint8)
+MAX_DISTANCE = 255
+# tamanho padrão do cluster HPA* (tiles) e maior segmento de borda com uma só entrada
+HPA_CLUSTER = 16
+HPA_MAX_SINGLE_ENTRANCE = 6
+
+_NEIGHBORS_4 = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+def distance_field(solids: np.ndarray, cap: int = MAX_DISTANCE) -> np.ndarray:
+    """Distância Chebyshev até o sólido (ou borda) mais próximo: 0 nos sólidos.
+
+    BFS multi-fonte por dilatação vetorizada (uma iteração por anel de distância).
+    """
+    h, w = solids.shape
+    # anel de sólidos em volta: a borda do mapa também é parede
+    wall = np.ones((h + 2, w + 2), dtype=bool)
+    wall[1:-1, 1:-1] = solids != 0
+    dist = np.full(wall.shape, cap, dtype=np.uint8)
+    dist[wall] = 0
+    reached = wall
+    d = 0
+    while d < cap - 1:
+        d += 1
+        # dilatação 3x3 = um anel de distância Chebyshev
+        grown = reached.copy()
+        grown[1:, :] |= reached[:-1, :]
+        grown[:-1, :] |= reached[1:, :]
+        grown[:, 1:] |= grown[:, :-1].copy()
+        grown[:, :-1] |= grown[:, 1:].copy()
+        ring = grown & ~reached
+        if not ring.any():
+            break
+        dist[ring] = d
+        reached = grown
+    return dist[1:-1, 1:-1].copy()
+
+
+def merge_solid_rects(solids: np.ndarray) -> np.ndarray:
+    """Sólidos como retângulos (tx, ty, w, h): runs por linha fundidos verticalmente."""
+    h, _w = solids.shape
+    rects: List[List[int]] = []
+    # run aberto por (x0, x1) -> índice em rects
+    open_runs: Dict[Tuple[int, int], int] = {}
+    for ty in range(h):
+        row = np.concatenate(([0], (solids[ty] != 0).astype(np.int8), [0]))
+        edges = np.flatnonzero(np.diff(row))
+        runs = list(zip(edges[0::2].tolist(), edges[1::2].tolist()))
+        next_open: Dict[Tuple[int, int], int] = {}
+        for run in runs:
+            idx = open_runs.get(run)
+            if idx is not None:
+                rects[idx][3] += 1
+            else:
+                idx = len(rects)
+                rects.append([run[0], ty, run[1] - run[0], 1])
+            next_open[run] = idx
+        open_runs = next_open
+    return np.asarray(rects, dtype=np.int32).reshape(-1, 4)
+
+
+def label_regions(solids: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Componentes 4-conexas dos tiles livres: rótulos 1..n (0 = sólido)."""
+    h, _w = solids.shape
+    labels = np.zeros(solids.shape, dtype=np.int32)
+    parent: List[int] = [0]
+
+    def find(a: int) -> int:
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    prev_runs: List[Tuple[int, int, int]] = []
+    for ty in range(h):
+        row = np.concatenate(([0], (solids[ty] == 0).astype(np.int8), [0]))
+        edges = np.flatnonzero(np.diff(row))
+        runs: List[Tuple[int, int, int]] = []
+        j = 0
+        for x0, x1 in zip(edges[0::2].tolist(), edges[1::2].tolist()):
+            lab = len(parent)
+            parent.append(lab)
+            # une com os runs da linha de cima que se sobrepõem em x
+            while j < len(prev_runs) and prev_runs[j][1] <= x0:
+                j += 1
+            k = j
+            while k < len(prev_runs) and prev_runs[k][0] < x1:
+                ra, rb = find(lab), find(prev_runs[k][2])
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+                k += 1
+            runs.append((x0, x1, lab))
+            labels[ty, x0:x1] = lab
+        prev_runs = runs
+    # compacta os rótulos para 1..n
+    roots = np.fromiter((find(i) for i in range(len(parent))), dtype=np.int32, count=len(parent))
+    uniq, compact = np.unique(roots, return_inverse=True)
+    remap = compact.astype(np.int32)  # raiz 0 (sólido) vira 0
+    return remap[labels], int(len(uniq) - 1)
+
+
+@dataclass
+class HpaGraph:
+    """Grafo abstrato HPA*: nós são tiles de entrada nas bordas dos clusters."""
+
+    cluster: int
+    nodes: List[Tuple[int, int]] = field(default_factory=list)
+    node_at: Dict[Tuple[int, int], int] = field(default_factory=dict)
+    # vizinhos por nó: (nó, custo em passos 4-conexos)
+    edges: List[List[Tuple[int, int]]] = field(default_factory=list)
+    # nós de cada cluster (cx, cy)
+    cluster_nodes: Dict[Tuple[int, int], List[int]] = field(default_factory=dict)
+
+    def cluster_of(self, tx: int, ty: int) -> Tuple[int, int]:
+        return (tx // self.cluster, ty // self.cluster)
+
+    def _node(self, t: Tuple[int, int]) -> int:
+        idx = self.node_at.get(t)
+        if idx is None:
+            idx = len(self.nodes)
+            self.nodes.append(t)
+            self.node_at[t] = idx
+            self.edges.append([])
+            self.cluster_nodes.setdefault(self.cluster_of(*t), []).append(idx)
+        return idx
+
+    def _link(self, a: int, b: int, cost: int) -> None:
+        if all(n != b for n, _ in self.edges[a]):
+            self.edges[a].append((b, cost))
+            self.edges[b].append((a, cost))
+
+
+def cluster_distances(free: np.ndarray, cluster: int, cx: int, cy: int, start: Tuple[int, int]) -> Dict[Tuple[int, int], int]:
+    """BFS 4-conexo a partir de ``start`` restrito ao cluster (cx, cy)."""
+    h, w = free.shape
+    x0, y0 = cx * cluster, cy * cluster
+    x1, y1 = min(x0 + cluster, w), min(y0 + cluster, h)
+    dist = {start: 0}
+    q = deque([start])
+    while q:
+        x, y = q.popleft()
+        d = dist[(x, y)] + 1
+        for ox, oy in _NEIGHBORS_4:
+            nx, ny = x + ox, y + oy
+            if x0 <= nx < x1 and y0 <= ny < y1 and free[ny, nx] and (nx, ny) not in dist:
+                dist[(nx, ny)] = d
+                q.append((nx, ny))
+    return dist
+
+
+def build_hpa(solids: np.ndarray, cluster: int = HPA_CLUSTER) -> HpaGraph:
+    """Entradas entre clusters vizinhos e custos internos entre entradas do mesmo cluster."""
+    free = solids == 0
+    h, w = free.shape
+    g = HpaGraph(cluster=cluster)
+
+    def add_border(pairs: List[Tuple[Tuple[int, int], Tuple[int, int]]]) -> None:
+        # pairs: tiles adjacentes (lado A, lado B) ao longo de uma borda, em ordem
+        seg: List[Tuple[Tuple[int, int], Tuple[int, int]]] = []
+        for i, (a, b) in enumerate(pairs):
+            open_ = free[a[1], a[0]] and free[b[1], b[0]]
+            if open_:
+                seg.append((a, b))
+            if seg and (not open_ or i == len(pairs) - 1):
+                if len(seg) <= HPA_MAX_SINGLE_ENTRANCE:
+                    picks = [seg[len(seg) // 2]]
+                else:
+                    picks = [seg[0], seg[-1]]
+                for pa, pb in picks:
+                    g._link(g._node(pa), g._node(pb), 1)
+                seg = []
+
+    for cy in range(0, h, cluster):
+        for cx in range(0, w, cluster):
+            ys = range(cy, min(cy + cluster, h))
+            xs = range(cx, min(cx + cluster, w))
+            # borda direita
+            bx = cx + cluster - 1
+            if bx + 1 < w:
+                add_border([((bx, y), (bx + 1, y)) for y in ys])
+            # borda de baixo
+            by = cy + cluster - 1
+            if by + 1 < h:
+                add_border([((x, by), (x, by + 1)) for x in xs])
+
+    # custos internos: BFS por entrada dentro do próprio cluster
+    for (ccx, ccy), ids in g.cluster_nodes.items():
+        for i, a in enumerate(ids):
+            dist = cluster_distances(free, cluster, ccx, ccy, g.nodes[a])
+            for b in ids[i + 1:]:
+                d = dist.get(g.nodes[b])
+                if d is not None:
+                    g._link(a, b, d)
+    return g
+
+
+def hpa_to_arrays(g: HpaGraph) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Grafo HPA* em arrays (nós, offsets CSR, destinos, custos) para o mapa compilado."""
+    nodes = np.asarray(g.nodes, dtype=np.int32).reshape(-1, 2)
+    offsets = np.zeros(len(g.nodes) + 1, dtype=np.int32)
+    offsets[1:] = np.cumsum([len(e) for e in g.edges], dtype=np.int64)
+    flat = [pair for e in g.edges for pair in e]
+    targets = np.asarray([n for n, _ in flat], dtype=np.int32)
+    costs = np.asarray([c for _, c in flat], dtype=np.int32)
+    return nodes, offsets, targets, costs
+
+
+def hpa_from_arrays(cluster: int, nodes: np.ndarray, offsets: np.ndarray, targets: np.ndarray, costs: np.ndarray) -> HpaGraph:
+    g = HpaGraph(cluster=cluster)
+    for t in map(tuple, nodes.tolist()):
+        g._node(t)
+    tl, cl, ol = targets.tolist(), costs.tolist(), offsets.tolist()
+    g.edges = [list(zip(tl[ol[i]:ol[i + 1]], cl[ol[i]:ol[i + 1]])) for i in range(len(g.nodes))]
+    return g
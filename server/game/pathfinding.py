@@ -0,0 +1,499 @@
+"""Pathfinding de NPCs em lote sobre ``MapData`` (sistema do tick).
+
+Os pedidos de um tick são resolvidos juntos em ``PathService.run``:
+
+1. cache LRU de caminhos recentes (chave: tile de origem e destino), zerado
+   quando a versão do mapa muda;
+2. destinos em regiões conexas diferentes falham em O(1) (``region_labels``);
+3. pedidos com o mesmo destino (``flow_min_agents`` ou mais) compartilham um
+   flow field calculado uma vez, em numpy, na janela que cobre os agentes;
+4. o resto vira busca A* retomável: trajetos longos planejam primeiro no grafo
+   HPA* (``MapData.hpa``) e refinam trecho a trecho no grid. Cada agente recebe
+   ``agent_budget`` expansões por tick e o lote para no ``tick_budget_ms``; o
+   que sobrar continua no tick seguinte, e uma busca que passe de
+   ``agent_max_expansions`` termina como ``timeout``.
+
+Tudo é 4-conexo, em tiles; os caminhos entregues são centros de tile em px.
+"""
+
+from __future__ import annotations
+
+import heapq
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .map_loader import MapData
+from .nav import cluster_distances
+
+
+Tile = Tuple[int, int]
+PathCallback = Callable[[str, "PathResult"], None]
+
+PATH_OK = "ok"
+PATH_UNREACHABLE = "unreachable"
+PATH_TIMEOUT = "timeout"
+
+# margem (tiles) da janela do flow field em volta dos agentes e do destino
+FLOW_MARGIN = 16
+# flow fields guardados (um por destino)
+FLOW_CACHE_SIZE = 32
+
+_NEIGHBORS_4 = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+class PathResult:
+    __slots__ = ("status", "path", "cached")
+
+    def __init__(self, status: str, path: List[Tuple[int, int]], cached: bool = False) -> None:
+        self.status = status
+        # waypoints em px (centro do tile), do tile de origem ao de destino
+        self.path = path
+        self.cached = cached
+
+
+class FlowField:
+    """Distância 4-conexa até ``goal`` numa janela do mapa (-1 = sem caminho)."""
+
+    __slots__ = ("goal", "x0", "y0", "dist")
+
+    def __init__(self, goal: Tile, x0: int, y0: int, dist: np.ndarray) -> None:
+        self.goal = goal
+        self.x0 = x0
+        self.y0 = y0
+        self.dist = dist
+
+    def covers(self, t: Tile) -> bool:
+        h, w = self.dist.shape
+        return 0 <= t[0] - self.x0 < w and 0 <= t[1] - self.y0 < h
+
+    def distance(self, t: Tile) -> int:
+        if not self.covers(t):
+            return -1
+        return int(self.dist[t[1] - self.y0, t[0] - self.x0])
+
+    def next_tile(self, t: Tile) -> Optional[Tile]:
+        """Vizinho um passo mais perto do destino (None no destino ou fora do campo)."""
+        d = self.distance(t)
+        if d <= 0:
+            return None
+        for ox, oy in _NEIGHBORS_4:
+            n = (t[0] + ox, t[1] + oy)
+            if self.distance(n) == d - 1:
+                return n
+        return None
+
+    def path_from(self, t: Tile) -> Optional[List[Tile]]:
+        if self.distance(t) < 0:
+            return None
+        out = [t]
+        while True:
+            n = self.next_tile(out[-1])
+            if n is None:
+                return out
+            out.append(n)
+
+
+def build_flow_field(free: np.ndarray, goal: Tile, x0: int, y0: int, x1: int, y1: int) -> FlowField:
+    """Frente de onda vetorizada a partir de ``goal`` restrita à janela [x0, x1) x [y0, y1)."""
+    window = free[y0:y1, x0:x1]
+    dist = np.full(window.shape, -1, dtype=np.int32)
+    gx, gy = goal[0] - x0, goal[1] - y0
+    reached = np.zeros(window.shape, dtype=bool)
+    reached[gy, gx] = True
+    dist[gy, gx] = 0
+    front = reached.copy()
+    d = 0
+    while True:
+        d += 1
+        grown = np.zeros_like(front)
+        grown[1:, :] |= front[:-1, :]
+        grown[:-1, :] |= front[1:, :]
+        grown[:, 1:] |= front[:, :-1]
+        grown[:, :-1] |= front[:, 1:]
+        front = grown & window & ~reached
+        if not front.any():
+            break
+        dist[front] = d
+        reached |= front
+    return FlowField(goal, x0, y0, dist)
+
+
+class _Search:
+    """A* retomável por trechos (waypoints do HPA* ou só origem -> destino)."""
+
+    __slots__ = ("agent_id", "start", "goal", "on_done", "legs", "leg", "done_tiles", "open", "g", "came", "expanded")
+
+    def __init__(self, agent_id: str, start: Tile, goal: Tile, on_done: Optional[PathCallback]) -> None:
+        self.agent_id = agent_id
+        self.start = start
+        self.goal = goal
+        self.on_done = on_done
+        self.legs: List[Tile] = [start, goal]
+        self.leg = 0
+        self.done_tiles: List[Tile] = [start]
+        self.open: List[Tuple[int, int, Tile]] = []
+        self.g: Dict[Tile, int] = {}
+        self.came: Dict[Tile, Tile] = {}
+        self.expanded = 0
+        self._open_leg()
+
+    def _open_leg(self) -> None:
+        a, b = self.legs[self.leg], self.legs[self.leg + 1]
+        self.open = [(_h(a, b), 0, a)]
+        self.g = {a: 0}
+        self.came = {}
+
+    def step(self, free: List[List[bool]], budget: int) -> Optional[bool]:
+        """Expande até ``budget`` nós: True = caminho completo, False = sem caminho, None = continua."""
+        w, h = len(free[0]), len(free)
+        while budget > 0:
+            target = self.legs[self.leg + 1]
+            if not self.open:
+                return False
+            _f, gc, cur = heapq.heappop(self.open)
+            if gc != self.g.get(cur):
+                continue
+            if cur == target:
+                self._close_leg(cur)
+                if self.leg + 1 >= len(self.legs):
+                    return True
+                continue
+            budget -= 1
+            self.expanded += 1
+            ng = gc + 1
+            x, y = cur
+            for ox, oy in _NEIGHBORS_4:
+                nx, ny = x + ox, y + oy
+                if 0 <= nx < w and 0 <= ny < h and free[ny][nx]:
+                    n = (nx, ny)
+                    if ng < self.g.get(n, 1 << 30):
+                        self.g[n] = ng
+                        self.came[n] = cur
+                        heapq.heappush(self.open, (ng + _h(n, target), ng, n))
+        return None
+
+    def _close_leg(self, end: Tile) -> None:
+        leg: List[Tile] = []
+        t = end
+        while t in self.came:
+            leg.append(t)
+            t = self.came[t]
+        leg.reverse()
+        self.done_tiles.extend(leg)
+        self.leg += 1
+        if self.leg + 1 < len(self.legs):
+            self._open_leg()
+
+
+def _h(a: Tile, b: Tile) -> int:
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+class PathService:
+    """Fila de pedidos de caminho resolvida em lote a cada tick (ver docstring do módulo)."""
+
+    def __init__(
+        self,
+        map_getter: Callable[[], Optional[MapData]],
+        cache_size: int = 4096,
+        tick_budget_ms: float = 4.0,
+        agent_budget: int = 512,
+        agent_max_expansions: int = 20000,
+        flow_min_agents: int = 8,
+    ) -> None:
+        self.map_getter = map_getter
+        self.cache_size = cache_size
+        self.tick_budget_ms = tick_budget_ms
+        self.agent_budget = agent_budget
+        self.agent_max_expansions = agent_max_expansions
+        self.flow_min_agents = flow_min_agents
+        self._map: Optional[MapData] = None
+        self._version: Optional[str] = None
+        self._free: List[List[bool]] = []
+        self._free_np: Optional[np.ndarray] = None
+        self._cache: "OrderedDict[Tuple[Tile, Tile], Tuple[Tile, ...]]" = OrderedDict()
+        self._flows: "OrderedDict[Tile, FlowField]" = OrderedDict()
+        # pedidos novos (último por agente) e buscas em andamento (round-robin)
+        self._pending: Dict[str, Tuple[Tile, Tile, Optional[PathCallback]]] = {}
+        self._searches: Deque[_Search] = deque()
+        self._active: Dict[str, _Search] = {}
+        self.results: Dict[str, PathResult] = {}
+        self.requests = 0
+        self.cache_hits = 0
+        self.flow_fields = 0
+        self.flow_served = 0
+        self.hpa_searches = 0
+        self.completed = 0
+        self.unreachable = 0
+        self.timeouts = 0
+        self.expansions = 0
+        self.carried_over = 0
+        self.invalidations = 0
+
+    # --- API ------------------------------------------------------------------
+
+    def request(self, agent_id: str, sx: int, sy: int, gx: int, gy: int, on_done: Optional[PathCallback] = None) -> None:
+        """Pede um caminho (px -> px); substitui pedido anterior do mesmo agente.
+
+        O resultado sai no ``run`` de um tick seguinte: via ``on_done(agent_id, result)``
+        ou, sem callback, em ``take(agent_id)``.
+        """
+        mp = self.map_getter()
+        if mp is None:
+            return
+        self.requests += 1
+        self.cancel(agent_id)
+        self._pending[agent_id] = ((sx // mp.tile_w, sy // mp.tile_h), (gx // mp.tile_w, gy // mp.tile_h), on_done)
+
+    def cancel(self, agent_id: str) -> None:
+        self._pending.pop(agent_id, None)
+        self.results.pop(agent_id, None)
+        search = self._active.pop(agent_id, None)
+        if search is not None:
+            self._searches.remove(search)
+
+    def take(self, agent_id: str) -> Optional[PathResult]:
+        return self.results.pop(agent_id, None)
+
+    def flow_field(self, gx: int, gy: int, x0: int, y0: int, x1: int, y1: int) -> Optional[FlowField]:
+        """Flow field (cacheado) até o ponto ``(gx, gy)`` cobrindo a caixa em px dada."""
+        mp = self._sync_map()
+        if mp is None:
+            return None
+        tw, th = mp.tile_w, mp.tile_h
+        return self._flow((gx // tw, gy // th), [(x0 // tw, y0 // th), (x1 // tw, y1 // th)])
+
+    # --- sistema do tick ------------------------------------------------------
+
+    def run(self, dt: float) -> None:
+        if not self._pending and not self._searches:
+            return
+        mp = self._sync_map()
+        if mp is None:
+            return
+        deadline = time.perf_counter() + self.tick_budget_ms / 1000.0
+        pending, self._pending = self._pending, {}
+        by_goal: Dict[Tile, List[str]] = {}
+        for agent_id, (start, goal, on_done) in pending.items():
+            if not self._resolve_fast(mp, agent_id, start, goal, on_done):
+                by_goal.setdefault(goal, []).append(agent_id)
+
+        for goal, agents in by_goal.items():
+            if len(agents) >= self.flow_min_agents:
+                agents = self._serve_flow(goal, agents, pending)
+            for agent_id in agents:
+                start, _goal, on_done = pending[agent_id]
+                self._start_search(mp, agent_id, start, goal, on_done)
+
+        self._step_searches(deadline)
+
+    def _resolve_fast(self, mp: MapData, agent_id: str, start: Tile, goal: Tile, on_done: Optional[PathCallback]) -> bool:
+        """Cache e regiões conexas; True se o pedido já foi respondido."""
+        cached = self._cache.get((start, goal))
+        if cached is not None:
+            self._cache.move_to_end((start, goal))
+            self.cache_hits += 1
+            self._finish(agent_id, PathResult(PATH_OK, self._to_px(cached), cached=True), on_done)
+            return True
+        labels = mp.region_labels
+        inside = 0 <= start[0] < mp.width and 0 <= start[1] < mp.height and 0 <= goal[0] < mp.width and 0 <= goal[1] < mp.height
+        if not inside or labels[start[1], start[0]] == 0 or labels[start[1], start[0]] != labels[goal[1], goal[0]]:
+            self.unreachable += 1
+            self._finish(agent_id, PathResult(PATH_UNREACHABLE, []), on_done)
+            return True
+        return False
+
+    def _serve_flow(self, goal: Tile, agents: List[str], pending: Dict[str, Tuple[Tile, Tile, Optional[PathCallback]]]) -> List[str]:
+        """Responde o grupo por um flow field; devolve os agentes fora da janela."""
+        field = self._flow(goal, [pending[a][0] for a in agents])
+        rest: List[str] = []
+        for agent_id in agents:
+            start, _goal, on_done = pending[agent_id]
+            tiles = field.path_from(start)
+            if tiles is None:
+                rest.append(agent_id)
+                continue
+            self.flow_served += 1
+            self._remember(start, goal, tiles)
+            self._finish(agent_id, PathResult(PATH_OK, self._to_px(tiles)), on_done)
+        return rest
+
+    def _flow(self, goal: Tile, points: List[Tile]) -> FlowField:
+        cached = self._flows.get(goal)
+        if cached is not None and all(cached.covers(p) for p in points):
+            self._flows.move_to_end(goal)
+            return cached
+        assert self._free_np is not None
+        h, w = self._free_np.shape
+        xs = [p[0] for p in points] + [goal[0]]
+        ys = [p[1] for p in points] + [goal[1]]
+        x0, y0 = max(min(xs) - FLOW_MARGIN, 0), max(min(ys) - FLOW_MARGIN, 0)
+        x1, y1 = min(max(xs) + FLOW_MARGIN + 1, w), min(max(ys) + FLOW_MARGIN + 1, h)
+        field = build_flow_field(self._free_np, goal, x0, y0, x1, y1)
+        self.flow_fields += 1
+        self._flows[goal] = field
+        self._flows.move_to_end(goal)
+        while len(self._flows) > FLOW_CACHE_SIZE:
+            self._flows.popitem(last=False)
+        return field
+
+    def _start_search(self, mp: MapData, agent_id: str, start: Tile, goal: Tile, on_done: Optional[PathCallback]) -> None:
+        search = _Search(agent_id, start, goal, on_done)
+        if _h(start, goal) > 2 * mp.hpa.cluster:
+            waypoints = self._hpa_waypoints(mp, start, goal)
+            if waypoints is not None:
+                self.hpa_searches += 1
+                search.legs = waypoints
+                search._open_leg()
+        self._active[agent_id] = search
+        self._searches.append(search)
+
+    def _step_searches(self, deadline: float) -> None:
+        free = self._free
+        served = 0
+        n = len(self._searches)
+        while self._searches and served < n:
+            if time.perf_counter() >= deadline:
+                break
+            search = self._searches.popleft()
+            served += 1
+            before = search.expanded
+            done = search.step(free, self.agent_budget)
+            self.expansions += search.expanded - before
+            if done is None and search.expanded < self.agent_max_expansions:
+                self._searches.append(search)
+                continue
+            self._active.pop(search.agent_id, None)
+            if done:
+                self._remember(search.start, search.goal, search.done_tiles)
+                self._finish(search.agent_id, PathResult(PATH_OK, self._to_px(search.done_tiles)), search.on_done)
+            elif done is False:
+                self.unreachable += 1
+                self._finish(search.agent_id, PathResult(PATH_UNREACHABLE, []), search.on_done)
+            else:
+                self.timeouts += 1
+                self._finish(search.agent_id, PathResult(PATH_TIMEOUT, []), search.on_done)
+        self.carried_over += len(self._searches)
+
+    # --- HPA* -----------------------------------------------------------------
+
+    def _hpa_waypoints(self, mp: MapData, start: Tile, goal: Tile) -> Optional[List[Tile]]:
+        """Rota abstrata origem -> entradas -> destino no grafo HPA*; None sem rota."""
+        g = mp.hpa
+        assert self._free_np is not None
+        sc, gc = g.cluster_of(*start), g.cluster_of(*goal)
+        start_links = self._cluster_links(mp, sc, start)
+        goal_links = dict(self._cluster_links(mp, gc, goal))
+        if not start_links or not goal_links:
+            return None
+        # A* sobre os nós do grafo; -1 = origem virtual
+        open_: List[Tuple[int, int, int]] = []
+        best: Dict[int, int] = {}
+        came: Dict[int, int] = {}
+        for node, cost in start_links:
+            best[node] = cost
+            came[node] = -1
+            heapq.heappush(open_, (cost + _h(g.nodes[node], goal), cost, node))
+        end: Optional[int] = None
+        end_cost = 1 << 30
+        while open_:
+            f, cost, node = heapq.heappop(open_)
+            if f >= end_cost:
+                break
+            if cost != best.get(node):
+                continue
+            tail = goal_links.get(node)
+            if tail is not None and cost + tail < end_cost:
+                end, end_cost = node, cost + tail
+            for nb, w in g.edges[node]:
+                nc = cost + w
+                if nc < best.get(nb, 1 << 30):
+                    best[nb] = nc
+                    came[nb] = node
+                    heapq.heappush(open_, (nc + _h(g.nodes[nb], goal), nc, nb))
+        if end is None:
+            return None
+        route: List[Tile] = []
+        node = end
+        while node != -1:
+            route.append(g.nodes[node])
+            node = came[node]
+        route.reverse()
+        out = [start]
+        for t in route:
+            if t != out[-1]:
+                out.append(t)
+        if goal != out[-1]:
+            out.append(goal)
+        return out
+
+    def _cluster_links(self, mp: MapData, cluster: Tile, tile: Tile) -> List[Tuple[int, int]]:
+        g = mp.hpa
+        assert self._free_np is not None
+        dist = cluster_distances(self._free_np, g.cluster, cluster[0], cluster[1], tile)
+        return [(node, dist[g.nodes[node]]) for node in g.cluster_nodes.get(cluster, ()) if g.nodes[node] in dist]
+
+    # --- cache / mapa ---------------------------------------------------------
+
+    def _sync_map(self) -> Optional[MapData]:
+        """Acompanha o mapa atual; versão nova invalida caches e reinicia buscas."""
+        mp = self.map_getter()
+        if mp is None:
+            return None
+        if mp is not self._map or mp.version != self._version:
+            if self._map is not None:
+                self.invalidations += 1
+            self._map, self._version = mp, mp.version
+            self._free_np = mp.solids == 0
+            self._free = self._free_np.tolist()
+            self._cache.clear()
+            self._flows.clear()
+            # buscas em andamento voltam a ser pedidos no mapa novo
+            for search in self._searches:
+                self._pending.setdefault(search.agent_id, (search.start, search.goal, search.on_done))
+            self._searches.clear()
+            self._active.clear()
+        return mp
+
+    def _remember(self, start: Tile, goal: Tile, tiles: List[Tile]) -> None:
+        key = (start, goal)
+        self._cache[key] = tuple(tiles)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _to_px(self, tiles: "List[Tile] | Tuple[Tile, ...]") -> List[Tuple[int, int]]:
+        mp = self._map
+        assert mp is not None
+        hw, hh = mp.tile_w // 2, mp.tile_h // 2
+        return [(tx * mp.tile_w + hw, ty * mp.tile_h + hh) for tx, ty in tiles]
+
+    def _finish(self, agent_id: str, result: PathResult, on_done: Optional[PathCallback]) -> None:
+        if result.status == PATH_OK:
+            self.completed += 1
+        if on_done is not None:
+            on_done(agent_id, result)
+        else:
+            self.results[agent_id] = result
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "pending": len(self._pending),
+            "searching": len(self._searches),
+            "cache_size": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "flow_fields": self.flow_fields,
+            "flow_served": self.flow_served,
+            "hpa_searches": self.hpa_searches,
+            "completed": self.completed,
+            "unreachable": self.unreachable,
+            "timeouts": self.timeouts,
+            "expansions": self.expansions,
+            "carried_over": self.carried_over,
+            "invalidations": self.invalidations,
+        }
+
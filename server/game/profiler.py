@@ -0,0 +1,253 @@
+"""Instrumentação do tick: histogramas, custo por fase, bytes por op e backlog de input.
+
+O GameServer chama ``begin_tick``/``phase``/``end_tick`` no caminho quente
+(só ``perf_counter`` e somas); ``snapshot`` monta a visão exposta em
+``GET /metrics/tick``. Com ``sampler`` ligado, um estouro de tick arma um
+profiler por amostragem (pilhas da thread do loop, formato "collapsed" de
+flamegraph) pelos próximos ticks.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# fases do tick, na ordem em que rodam
+PHASES: Tuple[str, ...] = ("input", "movement", "systems", "aoi", "diff", "encode", "send")
+
+# limites (ms) dos baldes de duração de tick/fase
+DURATION_BUCKETS_MS: Tuple[float, ...] = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+# limites dos baldes de backlog de input (mensagens pendentes no maior player)
+BACKLOG_BUCKETS: Tuple[float, ...] = (0, 1, 2, 4, 8, 16, 32, 64)
+
+
+class Histogram:
+    """Histograma de baldes fixos (contagem por limite superior, último = +inf)."""
+
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        i = 0
+        for b in self.bounds:
+            if value <= b:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def reset(self) -> None:
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def quantile(self, q: float) -> float:
+        """Aproximação pelo limite superior do balde (o máximo observado no último)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target:
+                return float(self.bounds[i]) if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [str(b) for b in self.bounds] + ["+inf"]
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "avg": round(self.total / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+            "p50": self.quantile(0.50),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class StackSampler:
+    """Profiler por amostragem da thread do event loop (só stdlib).
+
+    Uma thread daemon lê ``sys._current_frames()`` a cada ``interval`` s
+    enquanto armada e acumula pilhas no formato ``a;b;c`` (collapsed).
+    """
+
+    def __init__(self, interval: float = 0.002, max_depth: int = 48) -> None:
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._target: Optional[int] = None
+        self._armed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def arm(self) -> None:
+        if self._target is None:
+            self._target = threading.get_ident()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="tick_sampler", daemon=True)
+            self._thread.start()
+        self._armed.set()
+
+    def disarm(self) -> None:
+        self._armed.clear()
+
+    @property
+    def armed(self) -> bool:
+        return self._armed.is_set()
+
+    def _run(self) -> None:
+        while True:
+            self._armed.wait()
+            frame = sys._current_frames().get(self._target or 0)
+            if frame is not None:
+                parts: List[str] = []
+                while frame is not None and len(parts) < self.max_depth:
+                    code = frame.f_code
+                    parts.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                with self._lock:
+                    self.stacks[";".join(reversed(parts))] += 1
+                    self.samples += 1
+            time.sleep(self.interval)
+
+    def top(self, n: int = 30) -> List[Tuple[str, int]]:
+        with self._lock:
+            return self.stacks.most_common(n)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stacks.clear()
+            self.samples = 0
+
+
+class TickProfiler:
+    """Métricas acumuladas do loop do GameServer."""
+
+    def __init__(self, enabled: bool = True, sampler: bool = False, sample_ticks: int = 20) -> None:
+        self.enabled = enabled
+        self.tick_ms = Histogram(DURATION_BUCKETS_MS)
+        self.phase_ms: Dict[str, Histogram] = {p: Histogram(DURATION_BUCKETS_MS) for p in PHASES}
+        self.backlog = Histogram(BACKLOG_BUCKETS)
+        # atraso do início do tick em relação ao deadline do scheduler
+        self.lag_ms = Histogram(DURATION_BUCKETS_MS)
+        self.bytes_by_op: Counter[str] = Counter()
+        self.msgs_by_op: Counter[str] = Counter()
+        self.ticks = 0
+        self.overruns = 0
+        self.last_overrun_ms = 0.0
+        self.skipped_sinks = 0
+        # tempo acumulado por fase no tick corrente (segundos)
+        self._acc: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        # hook opcional de estouro: (duração ms, orçamento ms)
+        self.on_overrun: Optional[Callable[[float, float], None]] = None
+        self.sampler: Optional[StackSampler] = StackSampler() if sampler else None
+        self.sample_ticks = sample_ticks
+        self._sample_left = 0
+
+    # --- caminho quente ------------------------------------------------------
+
+    def begin_tick(self) -> None:
+        acc = self._acc
+        for p in PHASES:
+            acc[p] = 0.0
+
+    def phase(self, name: str, seconds: float) -> None:
+        self._acc[name] += seconds
+
+    def observe_backlog(self, depths: Iterable[int]) -> None:
+        if self.enabled:
+            self.backlog.observe(max(depths, default=0))
+
+    def observe_lag(self, seconds: float) -> None:
+        if self.enabled:
+            self.lag_ms.observe(seconds * 1000.0)
+
+    def count_bytes(self, op: str, n: int, msgs: int = 1) -> None:
+        self.bytes_by_op[op] += n
+        self.msgs_by_op[op] += msgs
+
+    def end_tick(self, seconds: float, budget: float) -> None:
+        if not self.enabled:
+            return
+        self.ticks += 1
+        ms = seconds * 1000.0
+        self.tick_ms.observe(ms)
+        for p, s in self._acc.items():
+            self.phase_ms[p].observe(s * 1000.0)
+        if self._sample_left:
+            self._sample_left -= 1
+            if not self._sample_left and self.sampler is not None:
+                self.sampler.disarm()
+        if seconds > budget:
+            self.overruns += 1
+            self.last_overrun_ms = ms
+            if self.sampler is not None:
+                # o estouro já passou: amostra os próximos ticks
+                self.sampler.arm()
+                self._sample_left = self.sample_ticks
+            if self.on_overrun is not None:
+                self.on_overrun(ms, budget * 1000.0)
+
+    # --- leitura ------------------------------------------------------------------
+
+    def snapshot(self, input_depths: Optional[Dict[str, int]] = None, top: int = 10) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "enabled": self.enabled,
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "last_overrun_ms": round(self.last_overrun_ms, 3),
+            "skipped_sinks": self.skipped_sinks,
+            "tick_ms": self.tick_ms.to_dict(),
+            "lag_ms": self.lag_ms.to_dict(),
+            "phase_ms": {p: h.to_dict() for p, h in self.phase_ms.items()},
+            "bytes_by_op": dict(self.bytes_by_op),
+            "msgs_by_op": dict(self.msgs_by_op),
+            "input_backlog_max_per_tick": self.backlog.to_dict(),
+        }
+        if input_depths is not None:
+            busiest = sorted(input_depths.items(), key=lambda kv: kv[1], reverse=True)[:top]
+            out["input_backlog"] = {
+                "players": len(input_depths),
+                "total": sum(input_depths.values()),
+                "top": [[pid, n] for pid, n in busiest if n],
+            }
+        if self.sampler is not None:
+            out["sampler"] = {
+                "armed": self.sampler.armed,
+                "samples": self.sampler.samples,
+                "top": [[stack, n] for stack, n in self.sampler.top()],
+            }
+        return out
+
+    def reset(self) -> None:
+        """Zera contadores e histogramas (config, hook e janela de amostragem ficam)."""
+        self.tick_ms.reset()
+        for h in self.phase_ms.values():
+            h.reset()
+        self.backlog.reset()
+        self.lag_ms.reset()
+        self.bytes_by_op.clear()
+        self.msgs_by_op.clear()
+        self.ticks = 0
+        self.overruns = 0
+        self.last_overrun_ms = 0.0
+        self.skipped_sinks = 0
+        if self.sampler is not None:
+            self.sampler.reset()
@@ -0,0 +1,238 @@
+"""Gravação dos inputs aceitos por um GameServer (log binário para replay).
+
+O que entra na simulação vindo de fora do tick fica no log com o número do
+tick (``state_seq``) em que chegou: ``join``/``leave`` com a posição lida do
+DB, cada ``move`` aceito por ``enqueue_move`` e as mudanças do nível de
+sobrecarga (que decide se sistemas não críticos rodam). Um evento com tick
+``k`` é aplicado antes do tick ``k + 1``; ``game.replay`` reconstrói a
+sessão sem sockets, Redis ou DB.
+
+A cada ``check_every`` ticks vai também um digest do mundo (entidades e
+players): o replay compara e aponta o primeiro tick em que a simulação
+divergiu do que rodou ao vivo.
+
+Não cobre o modo com regiões (ghosts e handoffs vêm de outro worker).
+
+Formato: header (``ZREC``, versão, parâmetros do tick, mapa) e registros de
+tamanho fixo com tipo no primeiro byte; ids de player viram índices no JOIN.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple
+
+from .wire import SUBPROTOCOL_V2
+
+
+REC_MAGIC = b"ZREC"
+REC_FORMAT = 1
+REC_EXT = ".zrec"
+
+# magic, formato, tick_hz, pos_delta, pos_quantum, wake_margin, tamanho do map_id | map_id | versão do mapa
+_HEADER = struct.Struct("<4sHHBHHH")
+_MAP_VERSION = struct.Struct("<8s")
+
+R_JOIN = 1
+R_LEAVE = 2
+R_MOVE = 3
+R_LEVEL = 4
+R_CHECK = 5
+
+# tipo, tick, índice do player, x, y, hp, mp, codec (2 = zerion.v2), tamanho do id | id
+_JOIN = struct.Struct("<BIIiiiiBH")
+# tipo, tick, índice do player
+_LEAVE = struct.Struct("<BII")
+# tipo, tick, índice do player, seq, dx, dy
+_MOVE = struct.Struct("<BIIqbb")
+# tipo, tick, nível de sobrecarga
+_LEVEL = struct.Struct("<BIB")
+# tipo, tick, digest do mundo
+_CHECK = struct.Struct("<BI8s")
+
+_SIZES = {R_LEAVE: _LEAVE, R_MOVE: _MOVE, R_LEVEL: _LEVEL, R_CHECK: _CHECK}
+
+
+class RecordingError(Exception):
+    pass
+
+
+def world_digest(server: Any) -> bytes:
+    """8 bytes de blake2b sobre entidades e players (ordem por id)."""
+    h = hashlib.blake2b(digest_size=8)
+    for eid in sorted(server.world.entities):
+        e = server.world.entities[eid]
+        h.update(f"{eid}|{e.kind}|{e.x}|{e.y}|{e.hp}\n".encode())
+    applied = server.last_input_seq_applied
+    for pid in sorted(server.players):
+        p = server.players[pid]
+        h.update(f"@{pid}|{p.x}|{p.y}|{p.hp}|{p.mp}|{applied.get(pid, 0)}\n".encode())
+    return h.digest()
+
+
+def _i8(v: Any) -> int:
+    # fora de [-1, 1] o tick descarta o passo de qualquer forma; só precisa caber em int8
+    return max(-128, min(127, int(v)))
+
+
+class InputRecorder:
+    def __init__(
+        self,
+        fh: BinaryIO,
+        *,
+        tick_hz: int,
+        pos_delta: bool,
+        pos_quantum: int,
+        wake_margin: int,
+        map_id: str,
+        map_version: str,
+        check_every: int = 100,
+    ) -> None:
+        self._fh = fh
+        self.check_every = max(0, check_every)
+        self._index: Dict[str, int] = {}
+        self._level = 0
+        self.records = 0
+        mid = map_id.encode()
+        fh.write(_HEADER.pack(REC_MAGIC, REC_FORMAT, tick_hz, int(pos_delta), pos_quantum, wake_margin, len(mid)))
+        fh.write(mid)
+        fh.write(_MAP_VERSION.pack(map_version.encode()[:8]))
+
+    @classmethod
+    def open(cls, path: str, server: Any, check_every: int = 100) -> "InputRecorder":
+        """Cria o arquivo (e o diretório) com os parâmetros do ``server``."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        mp = server.map
+        return cls(
+            _create_unique(path),
+            tick_hz=server.tick_hz,
+            pos_delta=server.world.pos_delta,
+            pos_quantum=server.world.pos_quantum,
+            wake_margin=server.activity.margin,
+            map_id=mp.id if mp is not None else "",
+            map_version=mp.version if mp is not None else "",
+            check_every=check_every,
+        )
+
+    def join(self, tick: int, player_id: str, x: int, y: int, hp: int, mp: int, subprotocol: str) -> None:
+        idx = self._index.setdefault(player_id, len(self._index))
+        pid = player_id.encode()
+        v2 = 2 if subprotocol == SUBPROTOCOL_V2 else 1
+        self._fh.write(_JOIN.pack(R_JOIN, tick, idx, x, y, hp, mp, v2, len(pid)) + pid)
+        self.records += 1
+
+    def leave(self, tick: int, player_id: str) -> None:
+        idx = self._index.get(player_id)
+        if idx is not None:
+            self._fh.write(_LEAVE.pack(R_LEAVE, tick, idx))
+            self.records += 1
+
+    def move(self, tick: int, player_id: str, msg: dict) -> None:
+        idx = self._index.get(player_id)
+        if idx is None:
+            return
+        payload = msg.get("payload") or {}
+        try:
+            rec = _MOVE.pack(R_MOVE, tick, idx, int(msg.get("seq", 0)), _i8(payload.get("dx", 0)), _i8(payload.get("dy", 0)))
+        except (TypeError, ValueError, struct.error):
+            # o tick também não aplicaria este input
+            return
+        self._fh.write(rec)
+        self.records += 1
+
+    def after_tick(self, server: Any) -> None:
+        """Chamado após cada tick: nível de sobrecarga novo e digest periódico."""
+        tick = server.state_seq
+        if server.overload_level != self._level:
+            self._level = server.overload_level
+            self._fh.write(_LEVEL.pack(R_LEVEL, tick, self._level))
+        if self.check_every and tick % self.check_every == 0:
+            self._fh.write(_CHECK.pack(R_CHECK, tick, world_digest(server)))
+            self._fh.flush()
+
+    def flush(self) -> None:
+        self._fh.flush()
+
+    def close(self) -> None:
+        if not self._fh.closed:
+            self._fh.close()
+
+
+# --- leitura -----------------------------------------------------------------------------
+
+
+class Recording:
+    """Header de um log e iterador dos registros (tuplas ``(tipo, tick, ...)``)."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as fh:
+            head = fh.read(_HEADER.size)
+            if len(head) < _HEADER.size:
+                raise RecordingError(f"{path}: arquivo truncado")
+            magic, fmt, tick_hz, pos_delta, pos_quantum, wake_margin, mid_len = _HEADER.unpack(head)
+            if magic != REC_MAGIC or fmt != REC_FORMAT:
+                raise RecordingError(f"{path}: não é um log de inputs (formato {fmt})")
+            self.tick_hz = tick_hz
+            self.pos_delta = bool(pos_delta)
+            self.pos_quantum = pos_quantum
+            self.wake_margin = wake_margin
+            self.map_id = fh.read(mid_len).decode()
+            (raw_version,) = _MAP_VERSION.unpack(fh.read(_MAP_VERSION.size))
+            self.map_version = raw_version.rstrip(b"\0").decode()
+            self._offset = fh.tell()
+
+    def records(self) -> Iterator[Tuple[Any, ...]]:
+        """JOIN sai como ``(R_JOIN, tick, player_id, x, y, hp, mp, codec)``; LEAVE e MOVE já com o id do player."""
+        ids: Dict[int, str] = {}
+        with open(self.path, "rb", buffering=1 << 16) as buf:
+            buf.seek(self._offset)
+            while True:
+                kind_b = buf.peek(1)[:1]
+                if not kind_b:
+                    return
+                kind = kind_b[0]
+                if kind == R_JOIN:
+                    raw = buf.read(_JOIN.size)
+                    if len(raw) < _JOIN.size:
+                        return
+                    _, tick, idx, x, y, hp, mp, codec, n = _JOIN.unpack(raw)
+                    pid = buf.read(n).decode()
+                    ids[idx] = pid
+                    yield (R_JOIN, tick, pid, x, y, hp, mp, codec)
+                    continue
+                st = _SIZES.get(kind)
+                if st is None:
+                    raise RecordingError(f"{self.path}: registro desconhecido {kind}")
+                raw = buf.read(st.size)
+                if len(raw) < st.size:
+                    # gravação interrompida no meio do registro
+                    return
+                rec = st.unpack(raw)
+                if kind in (R_LEAVE, R_MOVE):
+                    yield (kind, rec[1], ids[rec[2]], *rec[3:])
+                else:
+                    yield rec
+
+
+def _create_unique(path: str) -> BinaryIO:
+    """Abre ``path`` só se não existir; senão tenta ``<nome>-1``, ``<nome>-2``...
+
+    O nome tem resolução de segundos: um mapa descarregado e recarregado no
+    mesmo segundo não pode truncar a gravação anterior.
+    """
+    root, ext = os.path.splitext(path)
+    candidate = path
+    n = 0
+    while True:
+        try:
+            return open(candidate, "xb", buffering=1 << 16)
+        except FileExistsError:
+            n += 1
+            candidate = f"{root}-{n}{ext}"
+
+
+def recording_path(directory: str, map_id: Optional[str], stamp: str) -> str:
+    return os.path.join(directory, f"{map_id or 'nomap'}-{stamp}-{os.getpid()}{REC_EXT}")
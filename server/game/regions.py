@@ -0,0 +1,93 @@
+"""Posse de regiões do mapa por chunk de AoI (faixas verticais de chunks).
+
+Um mapa grande pode ser dividido em ``count`` regiões, cada uma simulada por
+um worker (game.worker). A região dona de um ponto é decidida pelo chunk
+(``x // cell_size``): faixas de ``stripe_chunks`` chunks ao longo de x, a
+última absorvendo o resto do mapa.
+
+Entidades a até ``ghost_chunks`` chunks de uma fronteira são espelhadas na
+região vizinha como *ghosts* somente-leitura, para que observers do outro lado
+as enxerguem; quando um player atravessa a fronteira, a autoridade passa ao
+worker vizinho (handoff) sem reconectar o WebSocket.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Set
+
+from .aoi import CELL_SIZE, ChunkCoord, Entity
+
+
+# registro de ghost: [id, kind, x, y, hp, meta|nil]
+GhostRecord = List[Any]
+
+
+class RegionMap:
+    def __init__(self, count: int = 1, stripe_chunks: int = 64, ghost_chunks: int = 2, cell_size: int = CELL_SIZE) -> None:
+        self.count = max(1, count)
+        self.stripe_chunks = max(1, stripe_chunks)
+        self.ghost_chunks = max(0, ghost_chunks)
+        self.cell_size = cell_size
+
+    @property
+    def enabled(self) -> bool:
+        return self.count > 1
+
+    def region_of_chunk(self, cx: int) -> int:
+        return min(max(cx // self.stripe_chunks, 0), self.count - 1)
+
+    def region_of(self, x: int, y: int) -> int:
+        return self.region_of_chunk(x // self.cell_size)
+
+    def neighbors(self, region: int) -> List[int]:
+        return [r for r in (region - 1, region + 1) if 0 <= r < self.count]
+
+    def ghost_targets(self, cx: int, own: int) -> Set[int]:
+        """Regiões vizinhas que precisam de ghosts das entidades do chunk de coluna ``cx``."""
+        out: Set[int] = set()
+        for r in (self.region_of_chunk(cx - self.ghost_chunks), self.region_of_chunk(cx + self.ghost_chunks)):
+            if r != own:
+                out.add(r)
+        return out
+
+    def shard_key(self, map_id: str, region: int) -> str:
+        return map_id if not self.enabled else f"{map_id}#{region}"
+
+
+def ghost_record(ent: Entity) -> GhostRecord:
+    return [ent.id, ent.kind, ent.x, ent.y, ent.hp, ent.meta or None]
+
+
+def export_ghosts(
+    regions: RegionMap,
+    own: int,
+    chunk_to_entities: Dict[ChunkCoord, Set[str]],
+    entities: Dict[str, Entity],
+    skip: Dict[str, int],
+) -> Dict[int, List[GhostRecord]]:
+    """Entidades próprias perto da fronteira, agrupadas pela região vizinha que deve espelhá-las.
+
+    Percorre só os chunks ocupados (``GridAoI.chunk_to_entities``); ``skip``
+    são os ghosts recebidos, que nunca são reexportados.
+    """
+    out: Dict[int, List[GhostRecord]] = {r: [] for r in regions.neighbors(own)}
+    for (cx, _cy), ids in chunk_to_entities.items():
+        targets = regions.ghost_targets(cx, own)
+        if not targets:
+            continue
+        for eid in ids:
+            ent = entities.get(eid)
+            if ent is None or eid in skip:
+                continue
+            rec = ghost_record(ent)
+            for r in targets:
+                out.setdefault(r, []).append(rec)
+    return out
+
+
+def region_from_settings(settings: Any, region_count: Optional[int] = None) -> RegionMap:
+    return RegionMap(
+        count=region_count if region_count is not None else settings.shard_regions,
+        stripe_chunks=settings.shard_region_chunks,
+        ghost_chunks=settings.shard_ghost_chunks,
+    )
@@ -0,0 +1,166 @@
+"""Registro de mapas residentes no processo (modo local).
+
+Cada mapa tem seu próprio GameServer (GridAoI, WorldState, pathfinding e loop
+de tick). O mapa é carregado no primeiro ``acquire`` (em thread, para o parse
+do JSON não travar o event loop), deixa de tickar quando o último player sai e
+é descarregado depois de ``idle_seconds`` sem ninguém, ou antes, quando há mais
+de ``max_loaded`` mapas residentes (o ocioso há mais tempo sai primeiro).
+
+Ids sem asset caem no mapa padrão (ex.: ``Character.map = "start"``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .loop import GameServer
+from .map_loader import MapData, load_map
+from .state import Player
+
+
+# intervalo da varredura de mapas ociosos
+SWEEP_SECONDS = 5.0
+
+
+class MapInstance:
+    __slots__ = ("map_id", "server", "players", "idle_since")
+
+    def __init__(self, map_id: str, server: GameServer) -> None:
+        self.map_id = map_id
+        self.server = server
+        self.players = 0
+        # monotonic de quando ficou vazio (None = com players)
+        self.idle_since: Optional[float] = time.monotonic()
+
+    @property
+    def map(self) -> Optional[MapData]:
+        return self.server.map
+
+
+class MapRegistry:
+    def __init__(
+        self,
+        factory: Callable[[Optional[MapData]], GameServer],
+        default_map: str,
+        idle_seconds: float = 300.0,
+        max_loaded: int = 16,
+        loader: Callable[[str], Optional[MapData]] = load_map,
+    ) -> None:
+        self.factory = factory
+        self.default_map = default_map
+        self.idle_seconds = idle_seconds
+        self.max_loaded = max(1, max_loaded)
+        self.loader = loader
+        self.instances: Dict[str, MapInstance] = {}
+        # id pedido -> id carregado (ids sem asset apontam para o mapa padrão)
+        self._aliases: Dict[str, str] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+        self.on_player_moved: Optional[Callable[[Player], None]] = None
+        self.loads = 0
+        self.evictions = 0
+
+    async def acquire(self, map_id: Optional[str]) -> MapInstance:
+        """Instância do mapa (carrega se preciso) já contando o player que entra."""
+        inst = await self._get(map_id or self.default_map)
+        inst.players += 1
+        inst.idle_since = None
+        inst.server.start()
+        return inst
+
+    def release(self, inst: MapInstance) -> None:
+        inst.players = max(0, inst.players - 1)
+        if inst.players == 0:
+            inst.idle_since = time.monotonic()
+            inst.server.pause()
+
+    async def _get(self, map_id: str) -> MapInstance:
+        map_id = self._aliases.get(map_id, map_id)
+        inst = self.instances.get(map_id)
+        if inst is not None:
+            return inst
+        pending = self._loading.get(map_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._loading[map_id] = fut
+        try:
+            mp = await asyncio.to_thread(self.loader, map_id)
+            if mp is None and map_id != self.default_map:
+                self._aliases[map_id] = self.default_map
+                inst = await self._get(self.default_map)
+            else:
+                inst = self._install(map_id, mp)
+            fut.set_result(inst)
+            return inst
+        except BaseException:
+            fut.cancel()
+            raise
+        finally:
+            self._loading.pop(map_id, None)
+
+    def _install(self, map_id: str, mp: Optional[MapData]) -> MapInstance:
+        server = self.factory(mp)
+        server.on_player_moved = self.on_player_moved
+        inst = MapInstance(map_id, server)
+        self.instances[map_id] = inst
+        self.loads += 1
+        self._evict_over_capacity(keep=inst)
+        return inst
+
+    def _evict_over_capacity(self, keep: MapInstance) -> None:
+        idle = sorted(
+            (i for i in self.instances.values() if i.players == 0 and i is not keep),
+            key=lambda i: i.idle_since or 0.0,
+        )
+        excess = len(self.instances) - self.max_loaded
+        for inst in idle[: max(0, excess)]:
+            self._evict(inst)
+
+    def _evict(self, inst: MapInstance) -> None:
+        if self.instances.get(inst.map_id) is inst:
+            del self.instances[inst.map_id]
+            inst.server.pause()
+            if inst.server.recorder is not None:
+                inst.server.recorder.close()
+            self.evictions += 1
+
+    def sweep(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        for inst in list(self.instances.values()):
+            if inst.players == 0 and inst.idle_since is not None and now - inst.idle_since >= self.idle_seconds:
+                self._evict(inst)
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(SWEEP_SECONDS)
+            self.sweep()
+
+    async def start(self) -> None:
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_loop(), name="map_registry_sweep")
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._sweeper
+            self._sweeper = None
+        for inst in list(self.instances.values()):
+            await inst.server.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": len(self.instances),
+            "max_loaded": self.max_loaded,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "aliases": dict(self._aliases),
+            "maps": {
+                map_id: {"players": inst.players, "ticking": inst.players > 0, "version": inst.map.version if inst.map else None}
+                for map_id, inst in self.instances.items()
+            },
+        }
@@ -0,0 +1,162 @@
+"""Replay headless de um log de inputs (``RECORD_INPUTS=true``, ver game.recorder).
+
+Recria o GameServer com os parâmetros gravados e o mesmo mapa, aplica cada
+evento antes do tick seguinte ao que foi gravado e roda os ticks o mais rápido
+possível: sem sockets (os snapshots são codificados e descartados), Redis ou
+DB. Os digests gravados ao vivo são comparados com os do replay; qualquer
+diferença indica que a simulação deixou de reproduzir o que aconteceu, por
+exemplo depois de uma otimização. Sistemas com orçamento de tempo de parede
+(lote do pathfinding) podem distribuir o trabalho em ticks diferentes. Uso::
+
+    python -m game.replay var/recordings/zerion_start-20260101-120000-42.zrec
+    python -m game.replay <arquivo> --no-broadcast --cprofile var/replay.prof
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import cProfile
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from .loop import GameServer, install_systems
+from .map_loader import MapData, load_map, load_tiled_json
+from .profiler import TickProfiler
+from .recorder import R_CHECK, R_JOIN, R_LEAVE, R_LEVEL, R_MOVE, Recording, world_digest
+from .state import Player
+from .wire import V1Codec, V2Codec
+
+
+class NullSink:
+    """Sink que só conta: o encode do snapshot roda, o envio não."""
+
+    __slots__ = ("frames", "bytes")
+
+    def __init__(self) -> None:
+        self.frames = 0
+        self.bytes = 0
+
+    def full(self) -> bool:
+        return False
+
+    def push(self, data: bytes) -> bool:
+        self.frames += 1
+        self.bytes += len(data)
+        return True
+
+
+def new_replay_server(rec: Recording, map_data: Optional[MapData]) -> GameServer:
+    # sem shedding automático: o nível de sobrecarga vem do log
+    server = GameServer(
+        tick_hz=rec.tick_hz,
+        pos_delta=rec.pos_delta,
+        pos_quantum=rec.pos_quantum,
+        profiler=TickProfiler(),
+        overload_shedding=False,
+        map_data=map_data,
+        wake_margin=rec.wake_margin,
+    )
+    install_systems(server)
+    return server
+
+
+async def replay(
+    rec: Recording, map_data: Optional[MapData], broadcast: bool = True, until_tick: Optional[int] = None
+) -> Dict[str, Any]:
+    server = new_replay_server(rec, map_data)
+    dt = 1.0 / server.tick_hz
+    sink = NullSink()
+    records = 0
+    checks = 0
+    mismatches: List[Dict[str, Any]] = []
+    t0 = time.perf_counter()
+    for r in rec.records():
+        kind, tick = r[0], r[1]
+        if until_tick is not None and tick > until_tick:
+            break
+        while server.state_seq < tick:
+            await server._timed_tick(dt, broadcast=broadcast)
+        records += 1
+        if kind == R_MOVE:
+            _, _, pid, seq, dx, dy = r
+            server.enqueue_move(pid, {"v": 1, "op": "move", "seq": seq, "payload": {"dx": dx, "dy": dy}})
+        elif kind == R_JOIN:
+            _, _, pid, x, y, hp, mp, codec = r
+            server.join(Player(id=pid, x=x, y=y, hp=hp, mp=mp), sink, V2Codec() if codec == 2 else V1Codec())
+        elif kind == R_LEAVE:
+            server.leave(r[2])
+        elif kind == R_LEVEL:
+            server.overload_level = r[2]
+        elif kind == R_CHECK:
+            checks += 1
+            got = world_digest(server)
+            if got != r[2]:
+                mismatches.append({"tick": tick, "recorded": r[2].hex(), "replayed": got.hex()})
+    wall = time.perf_counter() - t0
+    ticks = server.state_seq
+    return {
+        "file": rec.path,
+        "map": {
+            "id": rec.map_id or None,
+            "recorded_version": rec.map_version or None,
+            "version": map_data.version if map_data else None,
+        },
+        "ticks": ticks,
+        "records": records,
+        "wall_s": round(wall, 3),
+        "ticks_per_s": round(ticks / wall, 1) if wall > 0 else None,
+        # quantas vezes mais rápido que o tempo real gravado
+        "realtime_x": round(ticks * dt / wall, 1) if wall > 0 else None,
+        "checks": {"total": checks, "mismatched": len(mismatches), "first": mismatches[:10]},
+        "snapshots": {"frames": sink.frames, "bytes": sink.bytes},
+        "profiler": server.profiler.snapshot(),
+    }
+
+
+def _load_map(rec: Recording, map_json: Optional[str]) -> Optional[MapData]:
+    if map_json:
+        return load_tiled_json(map_json, rec.map_id)
+    if not rec.map_id:
+        return None
+    mp = load_map(rec.map_id)
+    if mp is None:
+        raise SystemExit(f"mapa {rec.map_id!r} não encontrado (use --map-json)")
+    return mp
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay headless de inputs gravados")
+    parser.add_argument("path", help="arquivo .zrec")
+    parser.add_argument("--map-json", default=None, help="Tiled JSON no lugar de assets/maps/<map_id>.json")
+    parser.add_argument("--no-broadcast", action="store_true", help="não monta snapshots (só simulação)")
+    parser.add_argument("--until-tick", type=int, default=None)
+    parser.add_argument("--cprofile", default=None, help="grava pstats do replay neste arquivo")
+    parser.add_argument("--json", default=None, help="grava o relatório neste arquivo")
+    args = parser.parse_args()
+
+    rec = Recording(args.path)
+    map_data = _load_map(rec, args.map_json)
+    if map_data is not None and rec.map_version and map_data.version != rec.map_version:
+        print(f"aviso: mapa {rec.map_id} mudou desde a gravação ({rec.map_version} -> {map_data.version})", file=sys.stderr)
+    run = replay(rec, map_data, broadcast=not args.no_broadcast, until_tick=args.until_tick)
+    if args.cprofile:
+        prof = cProfile.Profile()
+        report = prof.runcall(asyncio.run, run)
+        prof.dump_stats(args.cprofile)
+    else:
+        report = asyncio.run(run)
+    text = json.dumps(report, indent=2)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            fh.write(text)
+    summary = {k: report[k] for k in ("ticks", "records", "wall_s", "ticks_per_s", "realtime_x", "checks", "snapshots")}
+    print(json.dumps(summary, indent=2))
+    if report["checks"]["mismatched"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Log dos frames de estado enviados a cada player (op ``resync``).
+
+O mundo já é versionado por campo (``WorldState.field_version``), então não
+é preciso guardar cópias do mundo por tick: para recuperar um cliente que
+perdeu estados basta saber, para o seq ``S`` que ele confirma ter recebido,
+o relógio do mundo naquele tick e quais entidades entraram/saíram da visão
+dele depois de ``S``. O GameServer guarda o relógio de cada tick
+(``TickClocks``) e cada sessão guarda os seqs enviados e as entradas/saídas
+(``ResyncLog``), tudo limitado a ``STATE_RESYNC_TICKS`` ticks.
+
+Com isso o catch-up é um delta: registro completo do que entrou depois de
+``S``, patch absoluto dos campos alterados desde ``S`` no resto e os ids que
+saíram. Se ``S`` não foi enviado por este servidor ou já saiu da janela, vai
+um keyframe com toda a visão atual.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, Deque, List, Optional, Set, Tuple
+
+
+class TickClocks:
+    """Relógio do mundo ao fim de cada tick (janela de ``window`` ticks).
+
+    Sob sobrecarga os updates distantes de um viewer podem atrasar até
+    ``FAR_EVERY[nível] - 1`` ticks, então ``clock_at`` recua o mesmo tanto:
+    mandar um campo a mais é inofensivo, deixar de mandar não.
+    """
+
+    __slots__ = ("_ticks", "_lag")
+
+    def __init__(self, window: int, max_lag: int) -> None:
+        # (relógio, atraso possível em ticks) do seq last_seq - i
+        self._ticks: Deque[Tuple[int, int]] = deque(maxlen=max(1, window) + max_lag)
+        self._lag = max_lag
+
+    def record(self, clock: int, lag: int) -> None:
+        self._ticks.append((clock, lag))
+
+    def clock_at(self, seq: int, last_seq: int) -> Optional[int]:
+        """Relógio a partir do qual o viewer pode não ter recebido mudanças no seq ``seq``."""
+        idx = len(self._ticks) - 1 - (last_seq - seq)
+        if idx < 0 or idx >= len(self._ticks):
+            return None
+        idx -= self._ticks[idx][1]
+        if idx < 0:
+            return None
+        return self._ticks[idx][0]
+
+
+class ResyncLog:
+    """Seqs enviados à sessão e entradas/saídas de visão por seq."""
+
+    __slots__ = ("window", "floor", "sent", "events")
+
+    def __init__(self, window: int) -> None:
+        self.window = max(1, window)
+        # seqs até aqui não identificam um estado deste servidor (sessão adotada de outra região)
+        self.floor = 0
+        self.sent: Deque[int] = deque(maxlen=self.window)
+        # (seq, ids que entraram, ids de rede que saíram); só frames com entradas/saídas
+        self.events: Deque[Tuple[int, Tuple[str, ...], Tuple[Any, ...]]] = deque()
+
+    def record(self, seq: int, added: List[str], removed_wire: List[Any]) -> None:
+        if added or removed_wire:
+            self.events.append((seq, tuple(added), tuple(removed_wire)))
+        events = self.events
+        oldest = seq - self.window
+        while events and events[0][0] <= oldest:
+            events.popleft()
+
+    def delivered(self, seq: int) -> None:
+        self.sent.append(seq)
+
+    def last_delivered(self) -> int:
+        return self.sent[-1] if self.sent else 0
+
+    def since(self, seq: int, now: int) -> Optional[Tuple[Set[str], List[Any]]]:
+        """Entradas e saídas depois de ``seq`` (None se ``seq`` não está na janela)."""
+        if seq <= self.floor or seq <= now - self.window or seq not in self.sent:
+            return None
+        added: Set[str] = set()
+        removed: List[Any] = []
+        for s, a, r in self.events:
+            if s > seq:
+                added.update(a)
+                removed.extend(r)
+        return added, removed
@@ -0,0 +1,533 @@
+"""Fachada do mundo usada pelo WS: GameServers locais (dev) ou gateway para workers.
+
+``SHARD_MODE=local`` (padrão): um GameServer por mapa no próprio processo do
+FastAPI, carregado sob demanda pelo registro de mapas (game.registry). ``SHARD_MODE=process``: cada mapa de ``SHARD_MAPS``
+pertence a um processo ``python -m game.worker``; o endpoint WS só
+encaminha inputs e repassa os frames de estado que chegam pelo Unix socket
+(ver game.ipc). Com ``SHARD_SPAWN=true`` o gateway sobe os workers.
+
+Com ``SHARD_REGIONS > 1`` cada mapa é dividido em faixas de chunks (ver
+game.regions), uma por worker: o gateway roteia pela posição do player,
+repassa os lotes de ghosts entre regiões vizinhas e, no handoff, move a
+sessão para o worker da região nova sem fechar o WebSocket.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import os
+import sys
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from app.config import get_settings
+from ws.outbound import Outbox
+
+from .ipc import pack_frame, read_frame
+from .loop import new_game_server, new_profiler
+from .map_loader import MapData, MapInfo, load_map
+from .profiler import TickProfiler
+from .registry import MapInstance, MapRegistry
+from .regions import RegionMap, region_from_settings
+from .state import Player
+from .types import build_msg
+from .wire import V1Codec, V2Codec
+
+
+# tempo máximo de espera por respostas do worker (leave/stats)
+REPLY_TIMEOUT = 2.0
+
+# chamado quando a sessão remota se perde (worker caiu ou perdeu sincronia)
+OnLost = Callable[[], Awaitable[None]]
+
+
+class LocalWorld:
+    """Modo de desenvolvimento: um GameServer por mapa no próprio processo (ver game.registry)."""
+
+    mode = "local"
+
+    def __init__(self, registry: MapRegistry, profiler: TickProfiler) -> None:
+        self.registry = registry
+        # compartilhado por todos os mapas: os ticks não se intercalam no event loop
+        self.profiler = profiler
+        self._instances: Dict[str, MapInstance] = {}
+        settings = get_settings()
+        self.tick_hz = settings.tick_hz
+        self.pos_quantum: Optional[int] = settings.state_pos_quantum if settings.state_pos_delta else None
+
+    @property
+    def on_player_moved(self) -> Optional[Callable[[Player], None]]:
+        return self.registry.on_player_moved
+
+    @on_player_moved.setter
+    def on_player_moved(self, fn: Optional[Callable[[Player], None]]) -> None:
+        self.registry.on_player_moved = fn
+        for inst in self.registry.instances.values():
+            inst.server.on_player_moved = fn
+
+    async def start(self) -> None:
+        await self.registry.start()
+
+    async def stop(self) -> None:
+        await self.registry.stop()
+
+    async def open_map(self, map_id: Optional[str]) -> Optional[MapData]:
+        """Mapa onde o player vai entrar (carrega se preciso); None se não houver asset."""
+        inst = await self.registry.acquire(map_id)
+        # só carrega: o join faz o próprio acquire, e até lá o mapa ocioso fica
+        # residente por MAP_IDLE_SECONDS (ou até passar de MAP_MAX_LOADED)
+        self.registry.release(inst)
+        return inst.map
+
+    async def join(
+        self,
+        player: Player,
+        sink: Outbox,
+        codec: V1Codec | V2Codec,
+        map_id: Optional[str] = None,
+        on_lost: Optional[OnLost] = None,
+    ) -> None:
+        inst = await self.registry.acquire(map_id)
+        prev = self._instances.get(player.id)
+        if prev is not None and prev is not inst:
+            # mesma conta reconectando em outro mapa: a sessão antiga sai do mapa anterior
+            prev.server.leave(player.id)
+            self.registry.release(prev)
+        elif prev is inst:
+            self.registry.release(inst)
+        self._instances[player.id] = inst
+        inst.server.join(player, sink, codec)
+
+    async def leave(self, player_id: str, sink: Outbox) -> Optional[Player]:
+        inst = self._instances.get(player_id)
+        if inst is None or inst.server.sinks.get(player_id) is not sink:
+            return None
+        del self._instances[player_id]
+        left = inst.server.leave(player_id, sink)
+        self.registry.release(inst)
+        return left
+
+    def enqueue_move(self, player_id: str, msg: dict) -> Optional[str]:
+        inst = self._instances.get(player_id)
+        if inst is None:
+            return "not_in_world"
+        return inst.server.enqueue_move(player_id, msg)
+
+    def request_resync(self, player_id: str, last_seq: int) -> Optional[str]:
+        inst = self._instances.get(player_id)
+        if inst is None:
+            return "not_in_world"
+        return inst.server.request_resync(player_id, last_seq)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "registry": self.registry.stats(),
+            "maps": {map_id: inst.server.stats() for map_id, inst in self.registry.instances.items()},
+        }
+
+    async def reset_stats(self) -> Dict[str, Any]:
+        # um profiler só, compartilhado pelos mapas do processo
+        self.profiler.reset()
+        return {}
+
+
+class _Session:
+    """Sessão WS hospedada num worker: fila de saída local e créditos pendentes."""
+
+    __slots__ = ("sid", "player_id", "outbox", "codec", "marks", "shard", "on_lost")
+
+    def __init__(
+        self,
+        sid: int,
+        player_id: str,
+        outbox: Outbox,
+        codec: V1Codec | V2Codec,
+        shard: "_ShardLink",
+        on_lost: Optional[OnLost],
+    ) -> None:
+        self.sid = sid
+        self.player_id = player_id
+        self.outbox = outbox
+        self.codec = codec
+        self.shard = shard
+        self.on_lost = on_lost
+        # posição (em outbox.enqueued) de cada frame de estado ainda não enviado
+        self.marks: Deque[int] = deque()
+
+
+class _ShardLink:
+    """Conexão do gateway com um worker (reconecta com backoff)."""
+
+    def __init__(self, gateway: "ShardGateway", map_id: str, region: int, path: str) -> None:
+        self.gateway = gateway
+        self.map_id = map_id
+        self.region = region
+        self.path = path
+        self.sessions: Dict[int, _Session] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._replies: Dict[int, asyncio.Future] = {}
+        self._credits: Dict[int, int] = {}
+        self._credit_scheduled = False
+        self.connected = asyncio.Event()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name=f"shard_link:{self.map_id}")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(Exception, asyncio.CancelledError):
+                await self._task
+
+    def send(self, msg: List[Any]) -> bool:
+        if self._writer is None or not self.connected.is_set():
+            return False
+        self._writer.write(pack_frame(msg))
+        return True
+
+    async def request(self, msg: List[Any]) -> Any:
+        req = next(self.gateway._req_ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._replies[req] = fut
+        try:
+            if not self.send([msg[0], req, *msg[1:]]):
+                return None
+            return await asyncio.wait_for(fut, REPLY_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._replies.pop(req, None)
+
+    def credit(self, sid: int, n: int) -> None:
+        # agrega créditos e envia uma vez por volta do event loop
+        self._credits[sid] = self._credits.get(sid, 0) + n
+        if not self._credit_scheduled:
+            self._credit_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush_credits)
+
+    def _flush_credits(self) -> None:
+        self._credit_scheduled = False
+        credits, self._credits = self._credits, {}
+        for sid, n in credits.items():
+            self.send(["credit", sid, n])
+
+    async def _run(self) -> None:
+        backoff = 0.1
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionError, OSError):
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 5.0)
+                continue
+            backoff = 0.1
+            self._writer = writer
+            self.connected.set()
+            try:
+                while True:
+                    self._dispatch(await read_frame(reader))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            finally:
+                self.connected.clear()
+                self._writer = None
+                with contextlib.suppress(Exception):
+                    writer.close()
+                self._on_lost()
+
+    def _dispatch(self, msg: List[Any]) -> None:
+        kind = msg[0]
+        if kind == "out":
+            _, sid, data = msg
+            session = self.sessions.get(sid)
+            if session is None:
+                return
+            outbox = session.outbox
+            if not outbox.push(data):
+                # fila estourada por frames locais: o baseline no worker já avançou e o
+                # gateway não sabe o seq do frame perdido; pede keyframe em vez de reconectar
+                self.gateway.desynced += 1
+                self.credit(sid, 1)
+                self.send(["resync", sid, session.player_id, 0])
+                return
+            session.marks.append(outbox.enqueued)
+        elif kind == "handoff":
+            _, sid, target, state = msg
+            self._hand_off(sid, int(target), state)
+        elif kind == "ghosts":
+            _, target, src, records = msg
+            dst = self.gateway.links.get(self.gateway.regions.shard_key(self.map_id, int(target)))
+            if dst is not None:
+                dst.send(["ghosts", src, records])
+        elif kind == "bounce":
+            _, sid, player_id, body = msg
+            session = self.gateway._sessions_by_player.get(player_id)
+            if session is not None and session.sid == sid:
+                session.shard.send(["input", sid, player_id, body])
+        elif kind == "persist":
+            for char_id, x, y, hp, mp in msg[1]:
+                self.gateway._persist(Player(id="", x=x, y=y, hp=hp, mp=mp, char_id=char_id))
+        elif kind == "reply":
+            _, req, value = msg
+            fut = self._replies.get(req)
+            if fut is not None and not fut.done():
+                fut.set_result(value)
+
+    def _hand_off(self, sid: int, target: int, state: Dict[str, Any]) -> None:
+        """Player atravessou a fronteira: a sessão passa ao worker da região vizinha."""
+        session = self.sessions.pop(sid, None)
+        if session is None:
+            return
+        dst = self.gateway.links.get(self.gateway.regions.shard_key(self.map_id, target))
+        if dst is None or not dst.send(["adopt", sid, session.player_id, state]):
+            self.gateway.desynced += 1
+            self._lose(session)
+            return
+        # frames do worker antigo ainda na fila não contam na janela do novo
+        session.marks.clear()
+        session.shard = dst
+        dst.sessions[sid] = session
+        self.gateway.handoffs += 1
+
+    def _on_lost(self) -> None:
+        # worker caiu: as sessões deste mapa não voltam sozinhas
+        for fut in self._replies.values():
+            if not fut.done():
+                fut.set_result(None)
+        sessions = list(self.sessions.values())
+        self.sessions.clear()
+        for session in sessions:
+            session.outbox.push(session.codec.encode(build_msg("warn", {"code": "shard_unavailable"})))
+            self._lose(session)
+
+    def _lose(self, session: _Session) -> None:
+        if session.on_lost is not None:
+            asyncio.get_running_loop().create_task(_call_quietly(session.on_lost))
+
+
+async def _call_quietly(fn: OnLost) -> None:
+    # o socket pode já ter fechado do outro lado
+    with contextlib.suppress(Exception):
+        await fn()
+
+
+class ShardGateway:
+    """Modo multiprocesso: roteia sessões para o worker dono do mapa."""
+
+    mode = "process"
+
+    def __init__(
+        self,
+        maps: List[str],
+        socket_dir: str,
+        tick_hz: int,
+        pos_quantum: Optional[int],
+        spawn: bool = False,
+        regions: Optional[RegionMap] = None,
+        default_map: Optional[str] = None,
+    ) -> None:
+        self.regions = regions or RegionMap()
+        # mapas com worker; o padrão precisa ser um deles
+        self._served = set(maps)
+        self.default_map = default_map if default_map in self._served else (maps[0] if maps else "")
+        # só metadados (hello/roteamento): grade e navegação ficam nos workers
+        self._maps: Dict[str, Optional[MapInfo]] = {}
+        self.links: Dict[str, _ShardLink] = {}
+        for map_id in maps:
+            for region in range(self.regions.count):
+                key = self.regions.shard_key(map_id, region)
+                path = os.path.join(socket_dir, f"zerion-{key.replace('#', '-')}.sock")
+                self.links[key] = _ShardLink(self, map_id, region, path)
+        self.tick_hz = tick_hz
+        self.pos_quantum = pos_quantum
+        self.spawn = spawn
+        # métricas do gateway (bytes por op dos frames locais; o tick é medido nos workers)
+        self.profiler = TickProfiler()
+        self.on_player_moved: Optional[Callable[[Player], None]] = None
+        self.desynced = 0
+        self.handoffs = 0
+        self._sessions_by_player: Dict[str, _Session] = {}
+        self._sid = itertools.count(1)
+        self._req_ids = itertools.count(1)
+        self._procs: List[asyncio.subprocess.Process] = []
+
+    def _persist(self, player: Player) -> None:
+        if self.on_player_moved is not None:
+            self.on_player_moved(player)
+
+    async def open_map(self, map_id: Optional[str]) -> Optional[MapInfo]:
+        """Mapa do player (só metadados; a simulação fica no worker).
+
+        Sem asset ou sem worker em SHARD_MAPS cai no padrão: o hello e o canal
+        de chat têm de ser os do mapa que o worker do player simula.
+        """
+        if not map_id or map_id not in self._served:
+            map_id = self.default_map
+        if map_id not in self._maps:
+            mp = await asyncio.to_thread(load_map, map_id)
+            self._maps[map_id] = mp.info() if mp is not None else None
+        mp = self._maps[map_id]
+        if mp is None and map_id != self.default_map:
+            return await self.open_map(self.default_map)
+        return mp
+
+    def _link_for(self, map_id: Optional[str], x: int, y: int) -> _ShardLink:
+        region = self.regions.region_of(x, y)
+        if not map_id or map_id not in self._served:
+            # mapa sem worker próprio: mesmo fallback de open_map
+            map_id = self.default_map
+        return self.links[self.regions.shard_key(map_id, region)]
+
+    async def start(self) -> None:
+        if self.spawn:
+            for link in self.links.values():
+                proc = await asyncio.create_subprocess_exec(
+                    sys.executable, "-m", "game.worker",
+                    "--map", link.map_id,
+                    "--socket", link.path,
+                    "--region", str(link.region),
+                    "--regions", str(self.regions.count),
+                    cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                )
+                self._procs.append(proc)
+        for link in self.links.values():
+            link.start()
+
+    async def stop(self) -> None:
+        for link in self.links.values():
+            await link.stop()
+        for proc in self._procs:
+            with contextlib.suppress(ProcessLookupError):
+                proc.terminate()
+            with contextlib.suppress(Exception):
+                await asyncio.wait_for(proc.wait(), 5.0)
+        self._procs.clear()
+
+    async def join(
+        self,
+        player: Player,
+        sink: Outbox,
+        codec: V1Codec | V2Codec,
+        map_id: Optional[str] = None,
+        on_lost: Optional[OnLost] = None,
+    ) -> None:
+        self._drop_previous(player.id)
+        link = self._link_for(map_id, player.x, player.y)
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(link.connected.wait(), REPLY_TIMEOUT)
+        session = _Session(next(self._sid), player.id, sink, codec, link, on_lost)
+        row = [player.x, player.y, player.hp, player.mp, player.char_id]
+        if not link.send(["join", session.sid, player.id, row, codec.subprotocol]):
+            if on_lost is not None:
+                await on_lost()
+            return
+        link.sessions[session.sid] = session
+        self._sessions_by_player[player.id] = session
+
+        def on_sent(sent: int, session: _Session = session) -> None:
+            marks = session.marks
+            n = 0
+            while marks and marks[0] <= sent:
+                marks.popleft()
+                n += 1
+            if n and session.sid in session.shard.sessions:
+                session.shard.credit(session.sid, n)
+
+        sink.on_sent = on_sent
+
+    def _drop_previous(self, player_id: str) -> None:
+        """Mesma conta entrando de novo: tira a sessão antiga do worker e fecha o socket dela."""
+        prev = self._sessions_by_player.pop(player_id, None)
+        if prev is None:
+            return
+        link = prev.shard
+        if link.sessions.pop(prev.sid, None) is not None:
+            # req 0: ninguém espera a resposta; o worker só remove se o sink ainda for o dessa sessão
+            link.send(["leave", 0, prev.sid, player_id])
+        link._lose(prev)
+
+    async def leave(self, player_id: str, sink: Outbox) -> Optional[Player]:
+        session = self._sessions_by_player.get(player_id)
+        if session is None or session.outbox is not sink:
+            return None
+        self._sessions_by_player.pop(player_id, None)
+        link = session.shard
+        if link.sessions.pop(session.sid, None) is None:
+            return None
+        row = await link.request(["leave", session.sid, player_id])
+        if not row:
+            return None
+        x, y, hp, mp, char_id = row
+        return Player(id=player_id, x=x, y=y, hp=hp, mp=mp, char_id=char_id)
+
+    def enqueue_move(self, player_id: str, msg: dict) -> Optional[str]:
+        session = self._sessions_by_player.get(player_id)
+        if session is None or session.sid not in session.shard.sessions:
+            return "not_in_world"
+        if not session.shard.send(["input", session.sid, player_id, msg]):
+            return "not_in_world"
+        return None
+
+    def request_resync(self, player_id: str, last_seq: int) -> Optional[str]:
+        session = self._sessions_by_player.get(player_id)
+        if session is None or session.sid not in session.shard.sessions:
+            return "not_in_world"
+        if not session.shard.send(["resync", session.sid, player_id, int(last_seq)]):
+            return "not_in_world"
+        return None
+
+    async def stats(self) -> Dict[str, Any]:
+        shards: Dict[str, Any] = {}
+        for key, link in self.links.items():
+            shards[key] = await link.request(["stats"]) if link.connected.is_set() else None
+        return {
+            "mode": self.mode,
+            "gateway": {
+                "sessions": len(self._sessions_by_player),
+                "desynced": self.desynced,
+                "handoffs": self.handoffs,
+                "bytes_by_op": dict(self.profiler.bytes_by_op),
+                "msgs_by_op": dict(self.profiler.msgs_by_op),
+            },
+            "shards": shards,
+        }
+
+    async def reset_stats(self) -> Dict[str, Any]:
+        """Zera o profiler do gateway e o de cada worker; shard -> se zerou."""
+        self.profiler.reset()
+        shards: Dict[str, Any] = {}
+        for key, link in self.links.items():
+            shards[key] = bool(await link.request(["reset_stats"])) if link.connected.is_set() else False
+        return shards
+
+
+def make_world() -> LocalWorld | ShardGateway:
+    settings = get_settings()
+    if settings.shard_mode != "process":
+        profiler = new_profiler()
+        registry = MapRegistry(
+            lambda mp: new_game_server(mp, profiler),
+            default_map=settings.map_default,
+            idle_seconds=settings.map_idle_seconds,
+            max_loaded=settings.map_max_loaded,
+        )
+        return LocalWorld(registry, profiler)
+    return ShardGateway(
+        settings.shard_maps,
+        settings.shard_socket_dir,
+        tick_hz=settings.tick_hz,
+        pos_quantum=settings.state_pos_quantum if settings.state_pos_delta else None,
+        spawn=settings.shard_spawn,
+        regions=region_from_settings(settings),
+        default_map=settings.map_default,
+    )
+
+
+# fachada única usada pelo endpoint WS e pelo lifespan
+world = make_world()
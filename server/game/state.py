@@ -1,82 +1,279 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, asdict
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Set, Tuple, Any, Optional
 
 from .aoi import Entity
 
 
-@dataclass
+# bits de campo para dirty masks e patches
+F_X = 1
+F_Y = 2
+F_HP = 4
+F_META = 8
+F_KIND = 16
+F_POS = F_X | F_Y
+F_ALL = F_X | F_Y | F_HP | F_META | F_KIND
+
+_FIELD_BITS = (F_X, F_Y, F_HP, F_META, F_KIND)
+
+# maior delta quantizado enviado como dx/dy (cabe em fixint/int8 do msgpack)
+MAX_POS_DELTA = 127
+
+# baseline por viewer e entidade: [versão enviada, x base, y base]
+Baseline = List[int]
+# entrada de updated: (id, máscara de campos, dx quantizado, dy quantizado)
+PatchKey = Tuple[str, int, int, int]
+
+
+@dataclass(slots=True)
 class Player:
     id: str
     x: int
     y: int
     hp: int = 100
     mp: int = 50
+    char_id: Optional[int] = None
 
 
 class WorldState:
-    def __init__(self) -> None:
+    """Entidades do mundo com versionamento por campo.
+
+    Entidades são objetos com ``__slots__`` indexados por id e por um handle
+    inteiro denso (reaproveitado após remoção), usado como índice nas tabelas
+    por entidade e, no protocolo binário, como id na rede.
+
+    Cada mutação avança um relógio global; ``field_version`` guarda, por
+    handle, o relógio da última mudança de cada campo. O baseline de um viewer
+    é a versão que ele já recebeu, então o patch leva só os campos com versão
+    maior. Com ``pos_delta`` as posições vão como dx/dy quantizados em relação à
+    posição que o viewer já conhece.
+    """
+
+    def __init__(self, pos_delta: bool = False, pos_quantum: int = 1) -> None:
         self.entities: Dict[str, Entity] = {}
-        self.entity_version: Dict[str, int] = {}
+        # tabelas densas indexadas por handle
+        self.by_handle: List[Optional[Entity]] = []
+        self.field_version: List[List[int]] = []
+        self._free_handles: List[int] = []
+        self.clock = 0
+        self.pos_delta = pos_delta
+        self.pos_quantum = max(1, int(pos_quantum))
+        # entidades com dirty mask != 0 no tick corrente
+        self.dirty_ids: Set[str] = set()
 
     def upsert_entity(self, e: Entity) -> None:
-        exists = e.id in self.entities
+        """Insere ou substitui a entidade inteira (todos os campos ficam dirty)."""
+        self.clock += 1
+        old = self.entities.get(e.id)
+        if old is not None:
+            e.handle = old.handle
+        else:
+            e.handle = self._alloc_handle()
         self.entities[e.id] = e
-        self.entity_version[e.id] = self.entity_version.get(e.id, 0) + 1
+        self.by_handle[e.handle] = e
+        self.field_version[e.handle] = [self.clock] * len(_FIELD_BITS)
+        e.version = self.clock
+        e.dirty |= F_ALL
+        self.dirty_ids.add(e.id)
+
+    def _alloc_handle(self) -> int:
+        if self._free_handles:
+            return self._free_handles.pop()
+        self.by_handle.append(None)
+        self.field_version.append([0] * len(_FIELD_BITS))
+        return len(self.by_handle) - 1
+
+    def entity_by_handle(self, handle: int) -> Optional[Entity]:
+        if 0 <= handle < len(self.by_handle):
+            return self.by_handle[handle]
+        return None
+
+    def set_fields(
+        self,
+        entity_id: str,
+        *,
+        x: Optional[int] = None,
+        y: Optional[int] = None,
+        hp: Optional[int] = None,
+        meta: Optional[Dict[str, Any]] = None,
+        kind: Optional[str] = None,
+    ) -> int:
+        """Atualiza campos da entidade e retorna a máscara do que realmente mudou."""
+        ent = self.entities.get(entity_id)
+        if ent is None:
+            return 0
+        mask = 0
+        if x is not None and x != ent.x:
+            ent.x = x
+            mask |= F_X
+        if y is not None and y != ent.y:
+            ent.y = y
+            mask |= F_Y
+        if hp is not None and hp != ent.hp:
+            ent.hp = hp
+            mask |= F_HP
+        if meta is not None and meta != ent.meta:
+            ent.meta = meta
+            mask |= F_META
+        if kind is not None and kind != ent.kind:
+            ent.kind = kind
+            mask |= F_KIND
+        if mask:
+            self.mark_dirty(entity_id, mask)
+        return mask
+
+    def mark_dirty(self, entity_id: str, mask: int) -> None:
+        """Registra campos alterados diretamente na entidade."""
+        ent = self.entities.get(entity_id)
+        if ent is None or not mask:
+            return
+        self.clock += 1
+        ent.version = self.clock
+        fv = self.field_version[ent.handle]
+        for i, bit in enumerate(_FIELD_BITS):
+            if mask & bit:
+                fv[i] = self.clock
+        ent.dirty |= mask
+        self.dirty_ids.add(entity_id)
+
+    def pop_dirty(self) -> Set[str]:
+        """Entidades alteradas desde a última chamada; zera as dirty masks."""
+        ids = self.dirty_ids
+        self.dirty_ids = set()
+        for eid in ids:
+            ent = self.entities.get(eid)
+            if ent is not None:
+                ent.dirty = 0
+        return ids
 
     def remove_entity(self, entity_id: str) -> None:
-        self.entities.pop(entity_id, None)
-        self.entity_version.pop(entity_id, None)
+        ent = self.entities.pop(entity_id, None)
+        self.dirty_ids.discard(entity_id)
+        if ent is None:
+            return
+        self.by_handle[ent.handle] = None
+        self._free_handles.append(ent.handle)
+        ent.handle = -1
 
-    def build_diffs(self, you: Player, visible_ids: List[str], sent_version: Dict[str, int]) -> Dict[str, Any]:
-        added: List[Dict[str, Any]] = []
-        updated: List[Dict[str, Any]] = []
+    def changed_mask(self, ent: Entity, since: int) -> int:
+        """Campos alterados depois da versão ``since``."""
+        mask = 0
+        for i, v in enumerate(self.field_version[ent.handle]):
+            if v > since:
+                mask |= _FIELD_BITS[i]
+        return mask
+
+    def entity_record(self, entity_id: str) -> Dict[str, Any]:
+        """Registro completo usado em ``added``."""
+        ent = self.entities[entity_id]
+        return {
+            "id": ent.id,
+            "kind": ent.kind,
+            "x": ent.x,
+            "y": ent.y,
+            "hp": ent.hp,
+            "meta": ent.meta or {},
+        }
+
+    def entity_patch(self, key: PatchKey) -> Dict[str, Any]:
+        """Entrada de ``updated`` com apenas os campos da máscara."""
+        entity_id, mask, qdx, qdy = key
+        ent = self.entities[entity_id]
+        patch: Dict[str, Any] = {}
+        if self.pos_delta and mask & F_POS and (qdx or qdy):
+            patch["dx"] = qdx
+            patch["dy"] = qdy
+            mask &= ~F_POS
+        if mask & F_X:
+            patch["x"] = ent.x
+        if mask & F_Y:
+            patch["y"] = ent.y
+        if mask & F_HP:
+            patch["hp"] = ent.hp
+        if mask & F_META:
+            patch["meta"] = ent.meta or {}
+        if mask & F_KIND:
+            patch["kind"] = ent.kind
+        return {"id": entity_id, "patch": patch}
+
+    def _pos_patch(self, ent: Entity, mask: int, base: Baseline) -> Tuple[int, int, int]:
+        """Decide entre dx/dy quantizado e posição absoluta; atualiza a base do viewer."""
+        q = self.pos_quantum
+        qdx = round((ent.x - base[1]) / q)
+        qdy = round((ent.y - base[2]) / q)
+        if abs(qdx) > MAX_POS_DELTA or abs(qdy) > MAX_POS_DELTA:
+            base[1], base[2] = ent.x, ent.y
+            return mask | F_POS, 0, 0
+        mask &= ~F_POS
+        if qdx or qdy:
+            # delta vai no patch; base acompanha o que o cliente reconstrói
+            base[1] += qdx * q
+            base[2] += qdy * q
+            mask |= F_POS
+        return mask, qdx, qdy
+
+    def diff_ids(
+        self, entered: Set[str], left: Set[str], updated: Set[str], baselines: Dict[str, Baseline]
+    ) -> Tuple[List[str], List[PatchKey], List[str]]:
+        """Converte os deltas de AoI do viewer em (added, updated, removed) e avança os baselines.
+
+        Só toca nas entidades que entraram, saíram ou mudaram dentro da visão;
+        cada patch leva apenas os campos alterados desde o baseline do viewer.
+        """
+        added: List[str] = []
+        changed: List[PatchKey] = []
         removed: List[str] = []
 
-        visible_set = set(visible_ids)
-        # removidos: tudo que eu enviei antes mas não está mais visível ou foi removido
-        for eid in list(sent_version.keys()):
-            if eid not in visible_set or eid not in self.entities:
+        # removidos: saíram da visão (ou do mundo) depois de terem sido enviados
+        for eid in left:
+            if baselines.pop(eid, None) is not None:
                 removed.append(eid)
-                sent_version.pop(eid, None)
 
-        # added/updated
-        for eid in visible_ids:
+        for eid in entered:
             ent = self.entities.get(eid)
-            if not ent:
+            if ent is None:
                 continue
-            ver = self.entity_version.get(eid, 0)
-            sent_ver = sent_version.get(eid)
-            if sent_ver is None:
-                added.append({
-                    "id": ent.id,
-                    "kind": ent.kind,
-                    "x": ent.x,
-                    "y": ent.y,
-                    "hp": ent.hp,
-                    "meta": ent.meta or {},
-                })
-                sent_version[eid] = ver
-            elif ver > sent_ver:
-                # montar patch com apenas campos alterados
-                patch: Dict[str, Any] = {}
-                # Para simplicidade, consideramos possíveis campos a cada versão
-                patch["x"] = ent.x
-                patch["y"] = ent.y
-                patch["hp"] = ent.hp
-                if ent.meta is not None:
-                    patch["meta"] = ent.meta
-                updated.append({"id": eid, "patch": patch})
-                sent_version[eid] = ver
+            added.append(eid)
+            baselines[eid] = [ent.version, ent.x, ent.y]
 
+        for eid in updated:
+            ent = self.entities.get(eid)
+            if ent is None:
+                continue
+            ver = ent.version
+            base = baselines.get(eid)
+            if base is None:
+                added.append(eid)
+                baselines[eid] = [ver, ent.x, ent.y]
+                continue
+            if ver <= base[0]:
+                continue
+            mask = self.changed_mask(ent, base[0])
+            base[0] = ver
+            qdx = qdy = 0
+            if mask & F_POS:
+                if self.pos_delta:
+                    mask, qdx, qdy = self._pos_patch(ent, mask, base)
+                else:
+                    base[1], base[2] = ent.x, ent.y
+            if mask:
+                changed.append((eid, mask, qdx, qdy))
+
+        return added, changed, removed
+
+    def build_diffs(
+        self,
+        you: Player,
+        entered: Set[str],
+        left: Set[str],
+        updated: Set[str],
+        baselines: Dict[str, Baseline],
+    ) -> Dict[str, Any]:
+        added, changed, removed = self.diff_ids(entered, left, updated, baselines)
         return {
             "you": {"x": you.x, "y": you.y, "hp": you.hp, "mp": you.mp},
-            "added": added,
-            "updated": updated,
+            "added": [self.entity_record(eid) for eid in added],
+            "updated": [self.entity_patch(key) for key in changed],
             "removed": removed,
         }
-
-
-
-
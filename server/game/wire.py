@@ -0,0 +1,297 @@
+"""Codecs de sessão do protocolo WS.
+
+``zerion.v1``: mapas msgpack com chaves string (``build_msg``/``parse_msg``).
+
+``zerion.v2``: arrays msgpack posicionais com op numérico. Entidades são
+identificadas pelo handle inteiro do WorldState (ints msgpack têm tamanho
+variável: 1 byte até 127) e ``kind`` vai como índice numa tabela de strings
+da sessão; entradas novas da tabela seguem no próprio estado.
+
+Cliente -> servidor (v2)::
+
+    [MOVE, seq, dx, dy]
+    [PING, ts]
+    [CHAT, seq, channel, msg]
+    [RESYNC, seq, last_state_seq]
+
+Servidor -> cliente (v2)::
+
+    [STATE, seq, ack, ts, [x, y, hp, mp], new_kinds, removed, added, updated, flags?]
+        new_kinds: [[idx, "kind"], ...]
+        removed:   [handle, ...]                  (aplicar antes de added)
+        added:     [[handle, kind_idx, x, y, hp, meta|nil], ...]
+        updated:   [[handle, mask, *valores na ordem dos bits], ...]
+        flags:     só em frames de resync (STATE_RESYNC | STATE_KEYFRAME)
+    [HELLO|PING|EVENT|WARN, ts, payload?]
+
+Em ``updated`` os bits de ``mask`` são F_X, F_Y, F_HP, F_META, F_KIND de
+game.state; com ``V2_DELTA`` ligado, os dois primeiros valores são dx/dy
+quantizados (ver WorldState.pos_delta) no lugar de x/y.
+
+Frames de resync (resposta a ``resync`` ou a um estado que não chegou ao
+socket, ver game.resync) levam ``flags``: com STATE_RESYNC os patches são
+absolutos e, no v2, ``new_kinds`` traz a tabela inteira; com STATE_KEYFRAME o
+cliente descarta as entidades (e a tabela de kinds) antes de aplicar ``added``.
+No v1 ``flags`` vai como chave do payload.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import umsgpack
+
+from .codec import TickEncoder, pack_array_raw, pack_state
+from .state import WorldState, PatchKey, F_X, F_Y, F_HP, F_META, F_KIND, F_POS
+from .types import Msg, parse_msg
+
+
+SUBPROTOCOL_V1 = "zerion.v1"
+SUBPROTOCOL_V2 = "zerion.v2"
+
+OP_CODES: Dict[str, int] = {
+    "hello": 0,
+    "ping": 1,
+    "move": 2,
+    "chat": 3,
+    "state": 4,
+    "event": 5,
+    "warn": 6,
+    "resync": 7,
+}
+OP_NAMES: Dict[int, str] = {v: k for k, v in OP_CODES.items()}
+
+# bit extra de máscara em updated: posição como dx/dy
+V2_DELTA = 32
+
+# flags de frames de estado de resync
+STATE_RESYNC = 1
+STATE_KEYFRAME = 2
+
+
+class V1Codec:
+    """Protocolo original: mapas msgpack com chaves string."""
+
+    subprotocol = SUBPROTOCOL_V1
+    # sem handles: nenhuma entidade muda de id na rede
+    rehandled: Tuple[Tuple[str, Optional[int]], ...] = ()
+
+    def decode(self, raw: bytes) -> Optional[Msg]:
+        return parse_msg(umsgpack.unpackb(raw))
+
+    def encode(self, msg: Msg) -> bytes:
+        return umsgpack.packb(msg)
+
+    def session_state(self) -> None:
+        return None
+
+    def restore_session_state(self, state: Any) -> None:
+        pass
+
+    def wire_ids(self, ids: List[str]) -> List[str]:
+        """Ids como o cliente os conhece (para reenviar remoções num resync)."""
+        return list(ids)
+
+    def encode_state(
+        self,
+        tick: TickEncoder,
+        world: WorldState,
+        *,
+        seq: int,
+        ack: int,
+        ts: int,
+        you: Dict[str, Any],
+        added: List[str],
+        updated: List[PatchKey],
+        removed: List[str],
+        flags: int = 0,
+        extra_removed: Sequence[Any] = (),
+    ) -> bytes:
+        added_cache = tick.cache("v1.added", world.entity_record)
+        if extra_removed:
+            removed = list(dict.fromkeys([*removed, *extra_removed]))
+        updated_cache = tick.cache("v1.updated", world.entity_patch)
+        return pack_state(
+            seq=seq,
+            ack=ack,
+            ts=ts,
+            you=you,
+            added=[added_cache.get(eid) for eid in added],
+            updated=[updated_cache.get(key) for key in updated],
+            removed=removed,
+            flags=flags,
+        )
+
+
+class V2Codec:
+    """Protocolo binário posicional (uma instância por sessão: guarda a tabela de kinds)."""
+
+    subprotocol = SUBPROTOCOL_V2
+
+    def __init__(self) -> None:
+        self.kinds: Dict[str, int] = {}
+        # handle enviado por entidade (o handle pode ser reciclado após a remoção)
+        self.handles: Dict[str, int] = {}
+        # (id, handle antigo) das entidades reenviadas com handle novo no último estado
+        self.rehandled: List[Tuple[str, Optional[int]]] = []
+
+    def decode(self, raw: bytes) -> Optional[Msg]:
+        data = umsgpack.unpackb(raw)
+        if not isinstance(data, list) or not data or not isinstance(data[0], int):
+            return None
+        op = OP_NAMES.get(data[0])
+        try:
+            if op == "move":
+                _, seq, dx, dy = data
+                return {"v": 2, "op": "move", "seq": int(seq), "payload": {"dx": int(dx), "dy": int(dy)}}
+            if op == "ping":
+                return {"v": 2, "op": "ping", "ts": int(data[1]) if len(data) > 1 else 0}
+            if op == "chat":
+                _, seq, channel, text = data
+                return {"v": 2, "op": "chat", "seq": int(seq), "payload": {"channel": str(channel), "msg": str(text)}}
+            if op == "resync":
+                _, seq, last_state_seq = data
+                return {"v": 2, "op": "resync", "seq": int(seq), "payload": {"last_seq": int(last_state_seq)}}
+        except (TypeError, ValueError):
+            return None
+        return None
+
+    def encode(self, msg: Msg) -> bytes:
+        frame: List[Any] = [OP_CODES[msg["op"]], msg.get("ts", 0)]
+        if msg.get("payload") is not None:
+            frame.append(msg["payload"])
+        return umsgpack.packb(frame)
+
+    def session_state(self) -> Dict[str, Any]:
+        """Tabelas da sessão (handoff entre workers sem reconectar)."""
+        return {"kinds": dict(self.kinds), "handles": dict(self.handles)}
+
+    def restore_session_state(self, state: Any) -> None:
+        if isinstance(state, dict):
+            self.kinds = dict(state.get("kinds") or {})
+            self.handles = dict(state.get("handles") or {})
+
+    def wire_ids(self, ids: List[str]) -> List[int]:
+        """Handles enviados dessas entidades (antes de ``encode_state`` descartá-los)."""
+        handles = self.handles
+        return [handles[eid] for eid in ids if eid in handles]
+
+    def _kind_index(self, kind: str, new_kinds: List[Tuple[int, str]]) -> int:
+        idx = self.kinds.get(kind)
+        if idx is None:
+            idx = len(self.kinds)
+            self.kinds[kind] = idx
+            new_kinds.append((idx, kind))
+        return idx
+
+    def encode_state(
+        self,
+        tick: TickEncoder,
+        world: WorldState,
+        *,
+        seq: int,
+        ack: int,
+        ts: int,
+        you: Dict[str, Any],
+        added: List[str],
+        updated: List[PatchKey],
+        removed: List[str],
+        flags: int = 0,
+        extra_removed: Sequence[Any] = (),
+    ) -> bytes:
+        if flags & STATE_KEYFRAME:
+            # o cliente recomeça do zero: tabela de kinds e handles também
+            self.kinds.clear()
+            self.handles.clear()
+        new_kinds: List[Tuple[int, str]] = []
+        added_cache = tick.cache("v2.added", lambda key: _v2_record(world, key))
+        updated_cache = tick.cache("v2.updated", lambda key: _v2_patch(world, key))
+
+        removed_h: List[int] = []
+        for eid in removed:
+            h = self.handles.pop(eid, None)
+            if h is not None:
+                removed_h.append(h)
+        if extra_removed:
+            removed_h = list(dict.fromkeys([*removed_h, *extra_removed]))
+        added_b: List[bytes] = []
+        for eid in added:
+            ent = world.entities[eid]
+            self.handles[eid] = ent.handle
+            added_b.append(added_cache.get((eid, self._kind_index(ent.kind, new_kinds))))
+        updated_b: List[bytes] = []
+        self.rehandled = []
+        for key in updated:
+            ent = world.entities[key[0]]
+            old = self.handles.get(key[0])
+            if old != ent.handle:
+                # saiu e voltou no mesmo tick num handle reciclado: o cliente só
+                # conhece o handle antigo, então remove esse e recebe o registro completo
+                if old is not None:
+                    removed_h.append(old)
+                self.handles[key[0]] = ent.handle
+                added_b.append(added_cache.get((key[0], self._kind_index(ent.kind, new_kinds))))
+                self.rehandled.append((key[0], old))
+                continue
+            kidx = -1
+            if key[1] & F_KIND:
+                kidx = self._kind_index(ent.kind, new_kinds)
+            updated_b.append(updated_cache.get((key, kidx)))
+        if flags & STATE_RESYNC:
+            # kinds novos de frames perdidos: reenvia a tabela inteira
+            new_kinds = [(idx, kind) for kind, idx in self.kinds.items()]
+
+        return b"".join((
+            b"\x9a" if flags else b"\x99",  # fixarray(10) com flags, fixarray(9) sem
+            umsgpack.packb(OP_CODES["state"]),
+            umsgpack.packb(int(seq)),
+            umsgpack.packb(int(ack)),
+            umsgpack.packb(int(ts)),
+            umsgpack.packb([you["x"], you["y"], you["hp"], you["mp"]]),
+            umsgpack.packb([list(k) for k in new_kinds]),
+            umsgpack.packb(removed_h),
+            pack_array_raw(added_b),
+            pack_array_raw(updated_b),
+            umsgpack.packb(int(flags)) if flags else b"",
+        ))
+
+
+def _v2_record(world: WorldState, key: Tuple[str, int]) -> List[Any]:
+    eid, kidx = key
+    ent = world.entities[eid]
+    return [ent.handle, kidx, ent.x, ent.y, ent.hp, ent.meta or None]
+
+
+def _v2_patch(world: WorldState, key: Tuple[PatchKey, int]) -> List[Any]:
+    (eid, mask, qdx, qdy), kidx = key
+    ent = world.entities[eid]
+    out: List[Any] = [ent.handle, 0]
+    if world.pos_delta and mask & F_POS and (qdx or qdy):
+        mask = (mask & ~F_POS) | V2_DELTA
+        out += [qdx, qdy]
+    if mask & F_X:
+        out.append(ent.x)
+    if mask & F_Y:
+        out.append(ent.y)
+    if mask & F_HP:
+        out.append(ent.hp)
+    if mask & F_META:
+        out.append(ent.meta or {})
+    if mask & F_KIND:
+        out.append(kidx)
+    out[1] = mask
+    return out
+
+
+def codec_for(subprotocol: str) -> V1Codec | V2Codec:
+    """Codec novo para um subprotocolo já negociado (ex.: sessão recebida via IPC)."""
+    return V2Codec() if subprotocol == SUBPROTOCOL_V2 else V1Codec()
+
+
+def negotiate(subprotocols: List[str]) -> Optional[V1Codec | V2Codec]:
+    """Escolhe o codec pelo subprotocolo oferecido (v2 tem preferência)."""
+    if SUBPROTOCOL_V2 in subprotocols:
+        return V2Codec()
+    if SUBPROTOCOL_V1 in subprotocols:
+        return V1Codec()
+    return None
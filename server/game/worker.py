@@ -0,0 +1,278 @@
+"""Processo worker de simulação: um GameServer dono de um mapa, servido por Unix socket.
+
+Uso::
+
+    python -m game.worker --map zerion_start --socket /tmp/zerion-zerion_start.sock
+    python -m game.worker --map zerion_start --region 1 --regions 2 --socket /tmp/zerion-zerion_start-1.sock
+
+O gateway WS (game.shards.ShardGateway) conecta no socket, registra sessões
+com ``join`` e repassa inputs; o worker roda o tick e devolve os frames de
+estado já codificados no protocolo de cada sessão (ver game.ipc).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import os
+import signal
+from typing import Any, Dict, List, Optional
+
+from .ipc import pack_frame, read_frame
+from .loop import GameServer, new_game_server
+from .map_loader import load_map
+from .regions import RegionMap, export_ghosts, region_from_settings
+from .state import Player
+from .wire import codec_for
+from app.config import get_settings
+from ws.outbound import DEFAULT_OUTBOX_SIZE
+
+
+# frames de estado em voo por sessão (metade da fila do gateway: o resto fica
+# para hello/warn/chat, que o gateway enfileira direto)
+SESSION_WINDOW = DEFAULT_OUTBOX_SIZE // 2
+# intervalo de envio dos lotes de persistência ao gateway
+PERSIST_FLUSH_SECONDS = 0.2
+# sids entregues a outra região lembrados para repassar inputs atrasados
+MAX_HANDED_OFF = 1024
+
+
+class IpcSink:
+    """Sink do GameServer que encaminha o frame ao gateway, com janela de crédito.
+
+    ``full`` fica verdadeiro com ``SESSION_WINDOW`` frames ainda não enviados
+    ao WebSocket; o GameServer então pula o snapshot sem avançar o baseline,
+    igual ao Outbox local.
+    """
+
+    __slots__ = ("conn", "sid", "inflight", "dropped")
+
+    def __init__(self, conn: "GatewayConnection", sid: int) -> None:
+        self.conn = conn
+        self.sid = sid
+        self.inflight = 0
+        self.dropped = 0
+
+    def full(self) -> bool:
+        return self.conn.closed or self.inflight >= SESSION_WINDOW
+
+    def push(self, data: bytes) -> bool:
+        if self.full():
+            self.dropped += 1
+            return False
+        self.inflight += 1
+        self.conn.send(["out", self.sid, data])
+        return True
+
+
+class GatewayConnection:
+    """Uma conexão de gateway: sessões por sid e lote de persistência pendente."""
+
+    def __init__(self, server: GameServer, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+        self.sessions: Dict[int, str] = {}
+        self.sinks: Dict[int, IpcSink] = {}
+        self.persist: Dict[int, List[int]] = {}
+        # sid -> player_id das sessões que migraram para a região vizinha
+        self.handed_off: Dict[int, str] = {}
+
+    def send(self, msg: List[Any]) -> None:
+        if not self.closed:
+            # transport bufferiza; o tick nunca espera o socket
+            self.writer.write(pack_frame(msg))
+
+    async def run(self) -> None:
+        flusher = asyncio.create_task(self._persist_loop(), name="worker_persist")
+        try:
+            while True:
+                self._handle(await read_frame(self.reader))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.closed = True
+            flusher.cancel()
+            self._flush_persist()
+            # gateway caiu: os players desta conexão saem do mundo
+            for sid, player_id in list(self.sessions.items()):
+                self.server.leave(player_id, self.sinks.get(sid))
+            self.sessions.clear()
+            self.sinks.clear()
+            with contextlib.suppress(Exception):
+                self.writer.close()
+
+    def _handle(self, msg: List[Any]) -> None:
+        kind = msg[0]
+        if kind == "input":
+            _, sid, player_id, body = msg
+            if self.sessions.get(sid) == player_id and self.server.sinks.get(player_id) is self.sinks.get(sid):
+                self.server.enqueue_move(player_id, body)
+            elif self.handed_off.get(sid) == player_id:
+                # saiu no handoff com esse input em voo: o gateway reenvia à região nova
+                self.send(["bounce", sid, player_id, body])
+        elif kind == "resync":
+            _, sid, player_id, last_seq = msg
+            if self.sessions.get(sid) == player_id:
+                self.server.request_resync(player_id, int(last_seq))
+        elif kind == "credit":
+            _, sid, n = msg
+            sink = self.sinks.get(sid)
+            if sink is not None:
+                sink.inflight = max(0, sink.inflight - int(n))
+        elif kind == "join":
+            _, sid, player_id, (x, y, hp, mp, char_id), subprotocol = msg
+            sink = IpcSink(self, sid)
+            self.sessions[sid] = player_id
+            self.sinks[sid] = sink
+            player = Player(id=player_id, x=int(x), y=int(y), hp=int(hp), mp=int(mp), char_id=char_id)
+            self.server.join(player, sink, codec_for(subprotocol))
+        elif kind == "adopt":
+            _, sid, player_id, state = msg
+            x, y, hp, mp, char_id = state["player"]
+            sink = IpcSink(self, sid)
+            self.sessions[sid] = player_id
+            self.sinks[sid] = sink
+            player = Player(id=player_id, x=int(x), y=int(y), hp=int(hp), mp=int(mp), char_id=char_id)
+            self.server.adopt(player, sink, codec_for(state["subprotocol"]), state)
+        elif kind == "ghosts":
+            _, src, records = msg
+            self.server.apply_ghosts(int(src), records)
+        elif kind == "leave":
+            _, req, sid, player_id = msg
+            self.sessions.pop(sid, None)
+            left = self.server.leave(player_id, self.sinks.pop(sid, None))
+            self.send(["reply", req, _player_row(left)])
+        elif kind == "stats":
+            _, req = msg
+            self.send(["reply", req, self.server.stats()])
+        elif kind == "reset_stats":
+            _, req = msg
+            self.server.profiler.reset()
+            self.send(["reply", req, True])
+
+    def hand_off(self, sid: int, player_id: str, target: int, state: Dict[str, Any]) -> None:
+        self.sessions.pop(sid, None)
+        self.sinks.pop(sid, None)
+        self.handed_off[sid] = player_id
+        if len(self.handed_off) > MAX_HANDED_OFF:
+            self.handed_off.pop(next(iter(self.handed_off)))
+        self.send(["handoff", sid, target, state])
+
+    def on_player_moved(self, player: Player) -> None:
+        if player.char_id is not None:
+            self.persist[player.char_id] = [player.char_id, player.x, player.y, player.hp, player.mp]
+
+    def _flush_persist(self) -> None:
+        if self.persist:
+            rows, self.persist = list(self.persist.values()), {}
+            self.send(["persist", rows])
+
+    async def _persist_loop(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(PERSIST_FLUSH_SECONDS)
+                self._flush_persist()
+        except asyncio.CancelledError:
+            pass
+
+
+def _player_row(player: Optional[Player]) -> Optional[List[Any]]:
+    if player is None:
+        return None
+    return [player.x, player.y, player.hp, player.mp, player.char_id]
+
+
+class WorkerServer:
+    """Serve um GameServer para um ou mais gateways via Unix socket."""
+
+    def __init__(self, server: GameServer, path: str, regions: Optional[RegionMap] = None, region: int = 0) -> None:
+        self.server = server
+        self.path = path
+        self.connections: List[GatewayConnection] = []
+        self._srv: Optional[asyncio.AbstractServer] = None
+        server.on_player_moved = self._on_player_moved
+        if regions is not None and regions.enabled:
+            server.set_region(regions, region)
+            server.on_handoff = self._on_handoff
+            server.add_system("ghost_export", self._export_ghosts)
+
+    def _on_handoff(self, player_id: str, target: int) -> None:
+        sink = self.server.sinks.get(player_id)
+        if not isinstance(sink, IpcSink) or sink.conn.closed:
+            return
+        state = self.server.handoff_state(player_id, target)
+        if state is not None:
+            sink.conn.hand_off(sink.sid, player_id, target, state)
+
+    def _export_ghosts(self, dt: float) -> None:
+        # um lote por vizinha a cada tick (vazio inclusive: a vizinha remove os ghosts que sumiram);
+        # qualquer gateway serve de relay
+        conn = next((c for c in self.connections if not c.closed), None)
+        if conn is None:
+            return
+        server = self.server
+        assert server.regions is not None
+        batches = export_ghosts(server.regions, server.region, server.aoi.chunk_to_entities, server.world.entities, server.ghosts)
+        for target, records in batches.items():
+            conn.send(["ghosts", target, server.region, records])
+
+    def _on_player_moved(self, player: Player) -> None:
+        # persistência fica com o gateway dono da sessão
+        sink = self.server.sinks.get(player.id)
+        if isinstance(sink, IpcSink):
+            sink.conn.on_player_moved(player)
+
+    async def _on_connect(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        conn = GatewayConnection(self.server, reader, writer)
+        self.connections.append(conn)
+        try:
+            await conn.run()
+        finally:
+            self.connections.remove(conn)
+
+    async def start(self) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+        self._srv = await asyncio.start_unix_server(self._on_connect, path=self.path)
+        self.server.start()
+
+    async def stop(self) -> None:
+        if self._srv is not None:
+            self._srv.close()
+            for conn in list(self.connections):
+                conn.writer.close()
+            await self._srv.wait_closed()
+        await self.server.stop()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+
+
+async def run_worker(map_id: str, path: str, region: int = 0, regions: int = 1) -> None:
+    worker = WorkerServer(new_game_server(load_map(map_id)), path, region_from_settings(get_settings(), regions), region)
+    await worker.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await worker.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Worker de simulação Zerion (um mapa por processo)")
+    parser.add_argument("--map", required=True, help="id do mapa (assets/maps/<id>.json)")
+    parser.add_argument("--socket", required=True, help="caminho do Unix socket")
+    parser.add_argument("--region", type=int, default=0, help="região do mapa simulada por este worker")
+    parser.add_argument("--regions", type=int, default=1, help="total de regiões do mapa")
+    args = parser.parse_args(argv)
+    asyncio.run(run_worker(args.map, args.socket, args.region, args.regions))
+
+
+if __name__ == "__main__":
+    main()
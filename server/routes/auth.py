@@ -10,6 +10,7 @@ from utils.ratelimit import allow
 from services.db import get_db
 from sqlalchemy.ext.asyncio import AsyncSession
 from services.repositories.user_repository import create_user, get_user_by_email, verify_credentials
+from services.passwords import PasswordBusy
 from schemas.auth import RegisterRequest, LoginRequest as RealLoginRequest, TokenResponse
 
 
@@ -27,7 +28,10 @@ async def register(body: RegisterRequest, request: Request):
         existing = await get_user_by_email(session, body.email)
         if existing:
             raise HTTPException(status_code=409, detail="Email já registrado")
-        await create_user(session, body.email, body.password)
+        try:
+            await create_user(session, body.email, body.password)
+        except PasswordBusy:
+            raise _busy() from None
         await session.commit()
     return {"status": "created"}
 
@@ -40,13 +44,24 @@ async def login(body: RealLoginRequest, request: Request):
         raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Muitas tentativas")
     # Auth via DB (com fallback opcional em dev se desejado futuramente)
     async with get_db() as session:
-        user = await verify_credentials(session, body.email, body.password)
+        try:
+            user = await verify_credentials(session, body.email, body.password)
+        except PasswordBusy:
+            raise _busy() from None
+        if user and session.dirty:
+            # hash regravado com o custo atual
+            await session.commit()
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciais inválidas")
     token = create_access_token(subject=str(user.id))
     return TokenResponse(access_token=token)  # type: ignore[call-arg]
 
 
+def _busy() -> HTTPException:
+    # pool de bcrypt saturado (ex.: rajada de logins após restart): cliente tenta de novo
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Servidor ocupado", headers={"Retry-After": "1"})
+
+
 class TicketResponse(BaseModel):
     ticket: str
     expires_at: int
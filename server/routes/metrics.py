@@ -0,0 +1,29 @@
+from fastapi import APIRouter
+
+from game.shards import world
+from services.chat import chat_hub
+from services.passwords import password_hasher
+
+router = APIRouter()
+
+
+@router.get("/metrics/tick")
+async def tick_metrics():
+    # histogramas do loop, custo por fase, bytes por op e backlog de input por player
+    # (no modo process, o gateway consulta cada worker via IPC)
+    return {
+        **(await world.stats()),
+        "chat": {
+            "messages_in": chat_hub.messages_in,
+            "frames_encoded": chat_hub.frames_encoded,
+            "deliveries": chat_hub.deliveries,
+        },
+        "passwords": password_hasher.stats(),
+    }
+
+
+@router.post("/metrics/tick/reset")
+async def tick_metrics_reset():
+    # no modo process também zera o profiler de cada worker (False: worker fora do ar)
+    shards = await world.reset_stats()
+    return {"status": "ok", "shards": shards} if shards else {"status": "ok"}
@@ -0,0 +1,447 @@
+"""Microbenchmarks dos caminhos quentes do jogo, com resultado em JSON.
+
+Cada caso roda numa escala (``--scales``: entidades, ou tiles nos casos de
+mapa) e numa densidade (``--densities``): entidades por chunk de AoI nos casos
+de entidade, fração de tiles sólidos nos casos de mapa. O tempo é por operação
+(ns/op), mediana de várias rodadas depois de um aquecimento. Uso, a partir de
+``server/``::
+
+    python -m scripts.bench                                  # tudo, grava var/bench/<data>-<commit>.json
+    python -m scripts.bench --only aoi. --scales 1000,10000 --quick
+    python -m scripts.bench --compare var/bench/base.json --threshold 0.10   # sai com 1 se piorou
+
+Casos: ``aoi.add_or_move``, ``aoi.visible_ids``, ``state.build_diffs``,
+``movement.aabb_blocked`` (e ``_many``), ``map.load_tiled_json`` e
+``msgpack.build_msg`` (e ``codec.pack_state``, o caminho usado no tick).
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import umsgpack
+
+from game.aoi import CELL_SIZE, Entity, GridAoI
+from game.codec import pack_state
+from game.map_loader import MapData, load_tiled_json, parse_tiled_json
+from game.movement import MOVE_SPEED, aabb_blocked, aabb_blocked_many
+from game.state import Baseline, Player, WorldState
+from game.types import build_msg
+
+
+SCALES: Tuple[int, ...] = (1_000, 10_000, 100_000)
+# entidades por chunk de AoI / fração de tiles sólidos
+ENTITY_DENSITY: Dict[str, float] = {"sparse": 0.5, "medium": 4.0, "dense": 32.0}
+WALL_DENSITY: Dict[str, float] = {"sparse": 0.02, "medium": 0.10, "dense": 0.30}
+DENSITIES: Tuple[str, ...] = tuple(ENTITY_DENSITY)
+
+# um viewer (player) a cada tantas entidades, no máximo MAX_VIEWERS
+VIEWER_EVERY = 10
+MAX_VIEWERS = 2_000
+# consultas de visible_ids por rodada (no máximo)
+MAX_QUERIES = 20_000
+TILE_PX = 32
+
+
+@dataclass
+class Case:
+    """Um cenário pronto: ``run`` é cronometrado, ``reset`` (fora do tempo) prepara a próxima rodada."""
+
+    run: Callable[[], Any]
+    ops: int
+    reset: Optional[Callable[[], None]] = None
+    info: Dict[str, Any] = field(default_factory=dict)
+
+
+# --- cenários sintéticos -------------------------------------------------------------
+
+
+def _world_side_px(n: int, per_chunk: float) -> int:
+    chunks = max(1, math.ceil(math.sqrt(n / per_chunk)))
+    return chunks * CELL_SIZE
+
+
+def _entities(n: int, side: int, rng: random.Random) -> List[Entity]:
+    return [Entity(id=f"e{i}", kind="npc", x=rng.randrange(side), y=rng.randrange(side)) for i in range(n)]
+
+
+def _viewers(n: int) -> int:
+    return max(1, min(MAX_VIEWERS, n // VIEWER_EVERY))
+
+
+def _tiled_json(w: int, h: int, walls: float, rng: random.Random) -> str:
+    cells = [1 if rng.random() < walls else 0 for _ in range(w * h)]
+    return json.dumps({
+        "width": w,
+        "height": h,
+        "tilewidth": TILE_PX,
+        "tileheight": TILE_PX,
+        "layers": [
+            {"type": "tilelayer", "name": "ground", "data": [1] * (w * h)},
+            {
+                "type": "tilelayer",
+                "name": "collision",
+                "data": cells,
+                "properties": [{"name": "collision", "type": "bool", "value": True}],
+            },
+            {"type": "objectgroup", "name": "spawns", "objects": [{"name": "player_spawn", "x": TILE_PX, "y": TILE_PX}]},
+        ],
+        "tilesets": [{"firstgid": 1, "tiles": []}],
+    })
+
+
+def _map_side(tiles: int) -> int:
+    return max(8, int(math.sqrt(tiles)))
+
+
+def case_aoi_add_or_move(n: int, density: str, rng: random.Random) -> Case:
+    side = _world_side_px(n, ENTITY_DENSITY[density])
+    aoi = GridAoI(CELL_SIZE)
+    ents = _entities(n, side, rng)
+    for e in ents:
+        aoi.add_or_move(e)
+    viewers = ents[: _viewers(n)]
+    for v in viewers:
+        aoi.add_observer(v.id, v.x, v.y)
+    # um passo de MOVE_SPEED por entidade e tick, como o input de um player
+    steps = [(rng.choice((-MOVE_SPEED, 0, MOVE_SPEED)), rng.choice((-MOVE_SPEED, 0, MOVE_SPEED))) for _ in ents]
+
+    def run() -> None:
+        for e, (dx, dy) in zip(ents, steps):
+            e.x = min(side - 1, max(0, e.x + dx))
+            e.y = min(side - 1, max(0, e.y + dy))
+            aoi.add_or_move(e)
+
+    def reset() -> None:
+        # consome os deltas de enter/leave como o tick faria
+        for oid in aoi.visible:
+            aoi.entered[oid].clear()
+            aoi.left[oid].clear()
+            aoi.updated[oid].clear()
+
+    return Case(run, n, reset, {"world_px": side, "observers": len(viewers)})
+
+
+def case_aoi_visible_ids(n: int, density: str, rng: random.Random) -> Case:
+    side = _world_side_px(n, ENTITY_DENSITY[density])
+    aoi = GridAoI(CELL_SIZE)
+    for e in _entities(n, side, rng):
+        aoi.add_or_move(e)
+    queries = [(rng.randrange(side), rng.randrange(side)) for _ in range(min(n, MAX_QUERIES))]
+    visible = aoi.visible_ids
+
+    def run() -> int:
+        total = 0
+        for x, y in queries:
+            total += len(visible(x, y))
+        return total
+
+    return Case(run, len(queries), info={"world_px": side, "avg_visible": run() / len(queries)})
+
+
+def case_state_build_diffs(n: int, density: str, rng: random.Random) -> Case:
+    side = _world_side_px(n, ENTITY_DENSITY[density])
+    aoi = GridAoI(CELL_SIZE)
+    world = WorldState()
+    ents = _entities(n, side, rng)
+    for e in ents:
+        world.upsert_entity(e)
+        aoi.add_or_move(e)
+    viewers = [Player(id=e.id, x=e.x, y=e.y) for e in ents[: _viewers(n)]]
+    visible = {p.id: aoi.visible_ids(p.x, p.y) - {p.id} for p in viewers}
+    baselines: Dict[str, Dict[str, Baseline]] = {p.id: {} for p in viewers}
+    for p in viewers:
+        world.build_diffs(p, visible[p.id], set(), set(), baselines[p.id])
+    world.pop_dirty()
+    # metade das entidades anda a cada tick (sem trocar de chunk: só patches)
+    movers = ents[::2]
+    updated: Dict[str, set] = {}
+    flip = [1]
+
+    def reset() -> None:
+        flip[0] = -flip[0]
+        for e in movers:
+            world.set_fields(e.id, x=min(side - 1, max(0, e.x + flip[0])))
+        dirty = world.pop_dirty()
+        for p in viewers:
+            updated[p.id] = visible[p.id] & dirty
+
+    def run() -> None:
+        for p in viewers:
+            world.build_diffs(p, set(), set(), updated[p.id], baselines[p.id])
+
+    reset()
+    avg = sum(len(v) for v in visible.values()) / len(viewers)
+    return Case(run, len(viewers), reset, {"world_px": side, "viewers": len(viewers), "avg_visible": round(avg, 1)})
+
+
+def _bench_map(n: int, density: str, rng: random.Random) -> MapData:
+    side = _map_side(max(n // 4, 4096))
+    mp = parse_tiled_json(_tiled_json(side, side, WALL_DENSITY[density], rng), "bench")
+    # campo de distância fora do tempo: é pré-calculado no load_map/.zmap
+    mp.distance_field
+    return mp
+
+
+def case_aabb_blocked(n: int, density: str, rng: random.Random) -> Case:
+    mp = _bench_map(n, density, rng)
+    w_px, h_px = mp.width * mp.tile_w, mp.height * mp.tile_h
+    points = [(rng.randrange(w_px), rng.randrange(h_px)) for _ in range(n)]
+
+    def run() -> int:
+        return sum(1 for x, y in points if aabb_blocked(mp, x, y))
+
+    return Case(run, n, info={"map_tiles": mp.width * mp.height, "blocked": run() / n})
+
+
+def case_aabb_blocked_many(n: int, density: str, rng: random.Random) -> Case:
+    mp = _bench_map(n, density, rng)
+    w_px, h_px = mp.width * mp.tile_w, mp.height * mp.tile_h
+    np_rng = np.random.default_rng(rng.randrange(1 << 30))
+    px = np_rng.integers(0, w_px, n)
+    py = np_rng.integers(0, h_px, n)
+    return Case(lambda: aabb_blocked_many(mp, px, py), n, info={"map_tiles": mp.width * mp.height})
+
+
+def case_load_tiled_json(n: int, density: str, rng: random.Random) -> Case:
+    side = _map_side(n)
+    tmp = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8")
+    with tmp:
+        tmp.write(_tiled_json(side, side, WALL_DENSITY[density], rng))
+    path = tmp.name
+    # um mapa por rodada; ops = tiles para comparar escalas
+    return Case(lambda: load_tiled_json(path, "bench"), side * side, info={"tiles": side * side, "bytes": os.path.getsize(path), "path": path})
+
+
+def _state_payloads(n: int, density: str, rng: random.Random) -> Tuple[WorldState, List[Tuple[List[str], List[Tuple[str, int, int, int]]]]]:
+    side = _world_side_px(n, ENTITY_DENSITY[density])
+    aoi = GridAoI(CELL_SIZE)
+    world = WorldState()
+    ents = _entities(n, side, rng)
+    for e in ents:
+        world.upsert_entity(e)
+        aoi.add_or_move(e)
+    frames = []
+    for e in ents[: _viewers(n)]:
+        vis = sorted(aoi.visible_ids(e.x, e.y) - {e.id})
+        # tick típico: poucas entradas, o resto patch de posição
+        added = vis[: max(1, len(vis) // 10)]
+        updated = [(eid, 3, 0, 0) for eid in vis[len(added):]]
+        frames.append((added, updated))
+    return world, frames
+
+
+def case_msgpack_build_msg(n: int, density: str, rng: random.Random) -> Case:
+    world, frames = _state_payloads(n, density, rng)
+    you = {"x": 0, "y": 0, "hp": 100, "mp": 50}
+
+    def run() -> int:
+        total = 0
+        for added, updated in frames:
+            payload = {
+                "you": you,
+                "added": [world.entity_record(eid) for eid in added],
+                "updated": [world.entity_patch(key) for key in updated],
+                "removed": [],
+            }
+            total += len(umsgpack.packb(build_msg("state", payload, seq=1, ack=1)))
+        return total
+
+    return Case(run, len(frames), info={"frames": len(frames), "avg_bytes": run() // len(frames)})
+
+
+def case_codec_pack_state(n: int, density: str, rng: random.Random) -> Case:
+    world, frames = _state_payloads(n, density, rng)
+    you = {"x": 0, "y": 0, "hp": 100, "mp": 50}
+
+    def run() -> None:
+        # cache por tick como o TickEncoder: cada registro é codificado uma vez
+        records: Dict[Any, bytes] = {}
+        for added, updated in frames:
+            a = [records.get(eid) or records.setdefault(eid, umsgpack.packb(world.entity_record(eid))) for eid in added]
+            u = [records.get(key) or records.setdefault(key, umsgpack.packb(world.entity_patch(key))) for key in updated]
+            pack_state(seq=1, ack=1, ts=0, you=you, added=a, updated=u, removed=[])
+
+    return Case(run, len(frames), info={"frames": len(frames)})
+
+
+CASES: Dict[str, Callable[[int, str, random.Random], Case]] = {
+    "aoi.add_or_move": case_aoi_add_or_move,
+    "aoi.visible_ids": case_aoi_visible_ids,
+    "state.build_diffs": case_state_build_diffs,
+    "movement.aabb_blocked": case_aabb_blocked,
+    "movement.aabb_blocked_many": case_aabb_blocked_many,
+    "map.load_tiled_json": case_load_tiled_json,
+    "msgpack.build_msg": case_msgpack_build_msg,
+    "codec.pack_state": case_codec_pack_state,
+}
+
+
+# --- execução --------------------------------------------------------------------------
+
+
+def measure(case: Case, min_time: float, min_rounds: int, max_rounds: int) -> Dict[str, Any]:
+    """Aquecimento + rodadas até ``min_time`` s (ou ``max_rounds``); GC desligado no trecho medido."""
+    if case.reset:
+        case.reset()
+    case.run()
+    samples: List[float] = []
+    spent = 0.0
+    gc_was = gc.isenabled()
+    try:
+        while len(samples) < max_rounds and (len(samples) < min_rounds or spent < min_time):
+            if case.reset:
+                case.reset()
+            gc.collect()
+            gc.disable()
+            t0 = time.perf_counter_ns()
+            case.run()
+            dt = time.perf_counter_ns() - t0
+            if gc_was:
+                gc.enable()
+            samples.append(dt / case.ops)
+            spent += dt / 1e9
+    finally:
+        if gc_was:
+            gc.enable()
+    return {
+        "rounds": len(samples),
+        "ns_per_op": {
+            "min": round(min(samples), 1),
+            "median": round(statistics.median(samples), 1),
+            "mean": round(statistics.fmean(samples), 1),
+            "stdev": round(statistics.pstdev(samples), 1),
+        },
+        "ops_per_s": round(1e9 / statistics.median(samples), 1),
+    }
+
+
+def run_suite(
+    names: List[str], scales: List[int], densities: List[str], seed: int, min_time: float, min_rounds: int, max_rounds: int
+) -> List[Dict[str, Any]]:
+    results = []
+    for name in names:
+        for scale in scales:
+            for density in densities:
+                t0 = time.perf_counter()
+                case = CASES[name](scale, density, random.Random(seed))
+                setup_s = time.perf_counter() - t0
+                row = {"name": name, "scale": scale, "density": density, "ops": case.ops, "setup_s": round(setup_s, 3)}
+                row.update(measure(case, min_time, min_rounds, max_rounds))
+                row["info"] = {k: v for k, v in case.info.items() if k != "path"}
+                if "path" in case.info:
+                    os.unlink(case.info["path"])
+                results.append(row)
+                print(f"{name:28s} {scale:>7d} {density:7s} {row['ns_per_op']['median']:>12.1f} ns/op  ({row['rounds']} rodadas)", flush=True)
+                del case
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _meta(seed: int) -> Dict[str, Any]:
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+    }
+
+
+def compare(base: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Razão atual/base da mediana por (caso, escala, densidade); ``regressed`` acima de 1 + threshold."""
+    index = {(r["name"], r["scale"], r["density"]): r for r in base.get("results", [])}
+    rows = []
+    for r in current["results"]:
+        old = index.get((r["name"], r["scale"], r["density"]))
+        if old is None:
+            continue
+        ratio = r["ns_per_op"]["median"] / max(old["ns_per_op"]["median"], 1e-9)
+        rows.append({
+            "name": r["name"],
+            "scale": r["scale"],
+            "density": r["density"],
+            "base_ns": old["ns_per_op"]["median"],
+            "ns": r["ns_per_op"]["median"],
+            "ratio": round(ratio, 3),
+            "regressed": ratio > 1 + threshold,
+        })
+    return rows
+
+
+def _csv(kind: Callable[[str], Any]) -> Callable[[str], List[Any]]:
+    return lambda text: [kind(part.strip()) for part in text.split(",") if part.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Microbenchmarks dos caminhos quentes")
+    parser.add_argument("--only", type=_csv(str), default=None, help="prefixos de caso (ex.: aoi.,state.)")
+    parser.add_argument("--scales", type=_csv(int), default=list(SCALES))
+    parser.add_argument("--densities", type=_csv(str), default=list(DENSITIES))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--min-time", type=float, default=1.0, help="segundos medidos por caso (no mínimo)")
+    parser.add_argument("--min-rounds", type=int, default=5)
+    parser.add_argument("--max-rounds", type=int, default=200)
+    parser.add_argument("--quick", action="store_true", help="0.2 s e 3 rodadas por caso")
+    parser.add_argument("--out", default=None, help="padrão: var/bench/<data>-<commit>.json")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior")
+    parser.add_argument("--threshold", type=float, default=0.10, help="piora tolerada na comparação (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    names = [n for n in CASES if not args.only or any(n.startswith(p) for p in args.only)]
+    unknown = [d for d in args.densities if d not in ENTITY_DENSITY]
+    if not names or unknown:
+        parser.error(f"nenhum caso selecionado ou densidade desconhecida: {unknown or args.only}")
+    if args.quick:
+        args.min_time, args.min_rounds = 0.2, 3
+
+    report = {
+        "meta": _meta(args.seed),
+        "results": run_suite(names, args.scales, args.densities, args.seed, args.min_time, args.min_rounds, args.max_rounds),
+    }
+    out = args.out
+    if out is None:
+        os.makedirs(os.path.join("var", "bench"), exist_ok=True)
+        out = os.path.join("var", "bench", f"{time.strftime('%Y%m%d-%H%M%S')}-{report['meta']['commit'] or 'nogit'}.json")
+    with open(out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"resultado: {out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fh:
+            base = json.load(fh)
+        rows = compare(base, report, args.threshold)
+        for row in rows:
+            flag = "  PIOROU" if row["regressed"] else ""
+            print(f"{row['name']:28s} {row['scale']:>7d} {row['density']:7s} {row['base_ns']:>12.1f} -> {row['ns']:>12.1f} ns/op  x{row['ratio']:.3f}{flag}")
+        if any(row["regressed"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,621 @@
+"""Gerador de carga: bots headless falando ``zerion.v1`` contra a API real.
+
+Cada bot faz o caminho de um cliente: ``/auth/login`` (registra na primeira
+vez), ``/auth/ticket``, WebSocket com os subprotocolos ``zerion.v1`` e
+``auth.<ticket>`` e então manda ``move``/``chat``/``ping`` segundo o perfil.
+Os bots rodam em ``--procs`` processos (asyncio em cada um) e sobem em rampa
+ao longo de ``--ramp`` segundos, então dá para ver em que ponto a latência
+degrada. Uso, a partir de ``server/``::
+
+    python -m scripts.loadtest --bots 2000 --procs 4 --duration 120 --mix walker=70,chatty=20,idle=10
+    python -m scripts.loadtest --local --bots 200      # sobe scripts.local_server (SQLite + Redis em memória)
+
+Métricas (percentis aproximados pelo limite do balde):
+
+- ``input_ms``: envio do ``move`` até o ``state`` cujo ``ack`` é aquele seq;
+- ``snapshot_age_ms``: chegada do ``state`` menos o seu ``ts`` (relógios
+  sincronizados: mesmo host ou NTP);
+- ``snapshot_gap_ms``: intervalo entre ``state`` consecutivos do mesmo bot;
+- ``ping_ms``: ida e volta do ``ping``; ``login_ms``: login + ticket;
+- bytes/s e mensagens por op nos dois sentidos, desconexões por close code.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing as mp
+import os
+import random
+import ssl
+import subprocess
+import sys
+import time
+from collections import Counter, deque
+from dataclasses import asdict, dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import umsgpack
+import websockets
+from websockets.exceptions import ConnectionClosed, InvalidHandshake, InvalidURI
+
+from game.profiler import Histogram
+
+
+# limites (ms) dos baldes de latência
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (
+    1, 2, 3, 4, 5, 6, 8, 10, 12, 15, 20, 25, 30, 40, 50, 60, 80, 100, 125, 150,
+    200, 250, 300, 400, 500, 600, 800, 1000, 1500, 2000, 3000, 5000, 10000,
+)
+HISTOGRAMS: Tuple[str, ...] = ("input_ms", "snapshot_age_ms", "snapshot_gap_ms", "ping_ms", "login_ms")
+PERCENTILES: Tuple[float, ...] = (0.50, 0.95, 0.99)
+
+PASSWORD = "loadtest-pass"
+HTTP_RETRIES = 8
+
+
+@dataclass(frozen=True)
+class Profile:
+    # frequências por bot; 0 desliga
+    move_hz: float = 0.0
+    chat_per_min: float = 0.0
+    ping_every_s: float = 5.0
+    # reconecta depois de tantos segundos (0 = fica até o fim)
+    session_s: float = 0.0
+    # passos seguidos na mesma direção (passeio aleatório)
+    stride: int = 8
+    chat_channel: str = "map"
+
+
+PROFILES: Dict[str, Profile] = {
+    "idle": Profile(),
+    "walker": Profile(move_hz=10.0),
+    "chatty": Profile(move_hz=2.0, chat_per_min=6.0),
+    # no limite de move do servidor (RATE_MOVE_MAX) e chat global
+    "raider": Profile(move_hz=20.0, chat_per_min=10.0, ping_every_s=2.0, stride=3, chat_channel="global"),
+    "churn": Profile(move_hz=5.0, session_s=30.0),
+}
+
+
+@dataclass
+class Config:
+    base_url: str
+    ws_url: str
+    origin: str
+    bots: int
+    procs: int
+    duration: float
+    ramp: float
+    mix: Dict[str, float]
+    prefix: str
+    reconnect: bool
+    report_every: float
+    seed: int
+
+
+class BotError(Exception):
+    pass
+
+
+# --- HTTP mínimo (só stdlib: o harness não depende do ambiente da API) ---------------
+
+
+async def _http_json(
+    base_url: str, method: str, path: str, body: Any = None, token: Optional[str] = None, timeout: float = 15.0
+) -> Tuple[int, Dict[str, str], Any]:
+    u = urlsplit(base_url)
+    tls = u.scheme == "https"
+    port = u.port or (443 if tls else 80)
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(u.hostname, port, ssl=ssl.create_default_context() if tls else None), timeout
+    )
+    try:
+        data = json.dumps(body).encode() if body is not None else b""
+        head = [
+            f"{method} {u.path.rstrip('/')}{path} HTTP/1.1",
+            f"Host: {u.netloc}",
+            "Connection: close",
+            "Accept: application/json",
+            f"Content-Length: {len(data)}",
+        ]
+        if body is not None:
+            head.append("Content-Type: application/json")
+        if token:
+            head.append(f"Authorization: Bearer {token}")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+        raw = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+        with contextlib.suppress(Exception):
+            await writer.wait_closed()
+    head_raw, _, payload = raw.partition(b"\r\n\r\n")
+    lines = head_raw.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(":") for line in lines[1:])}
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        payload = _dechunk(payload)
+    try:
+        parsed = json.loads(payload) if payload else None
+    except ValueError:
+        parsed = None
+    return status, headers, parsed
+
+
+def _dechunk(data: bytes) -> bytes:
+    out = bytearray()
+    while data:
+        size_line, _, data = data.partition(b"\r\n")
+        size = int(size_line.split(b";")[0] or b"0", 16)
+        if size == 0:
+            break
+        out += data[:size]
+        data = data[size + 2:]
+    return bytes(out)
+
+
+# --- métricas ----------------------------------------------------------------------
+
+
+class Stats:
+    """Contadores de um processo de bots (exportados crus para somar no principal)."""
+
+    def __init__(self) -> None:
+        self.hist = {name: Histogram(LATENCY_BUCKETS_MS) for name in HISTOGRAMS}
+        self.counters: Counter = Counter()
+        self.msgs_in: Counter = Counter()
+        self.bytes_in: Counter = Counter()
+        self.msgs_out: Counter = Counter()
+        self.bytes_out: Counter = Counter()
+        self.close_codes: Counter = Counter()
+        self.warns: Counter = Counter()
+        self.connected = 0
+
+    def export(self) -> Dict[str, Any]:
+        return {
+            "hist": {n: [h.counts, h.count, h.total, h.max] for n, h in self.hist.items()},
+            "counters": dict(self.counters),
+            "msgs_in": dict(self.msgs_in),
+            "bytes_in": dict(self.bytes_in),
+            "msgs_out": dict(self.msgs_out),
+            "bytes_out": dict(self.bytes_out),
+            "close_codes": {str(k): v for k, v in self.close_codes.items()},
+            "warns": dict(self.warns),
+            "connected": self.connected,
+        }
+
+
+def merge_exports(exports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    hist = {n: Histogram(LATENCY_BUCKETS_MS) for n in HISTOGRAMS}
+    out: Dict[str, Any] = {"hist": hist, "connected": 0}
+    for key in ("counters", "msgs_in", "bytes_in", "msgs_out", "bytes_out", "close_codes", "warns"):
+        out[key] = Counter()
+    for ex in exports:
+        for name, (counts, count, total, mx) in ex["hist"].items():
+            h = hist[name]
+            h.counts = [a + b for a, b in zip(h.counts, counts)]
+            h.count += count
+            h.total += total
+            h.max = max(h.max, mx)
+        for key in ("counters", "msgs_in", "bytes_in", "msgs_out", "bytes_out", "close_codes", "warns"):
+            out[key].update(ex[key])
+        out["connected"] += ex["connected"]
+    return out
+
+
+def _hist_summary(h: Histogram) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {"count": h.count, "avg": round(h.total / h.count, 2) if h.count else 0.0, "max": round(h.max, 2)}
+    for q in PERCENTILES:
+        summary[f"p{int(q * 100)}"] = h.quantile(q)
+    return summary
+
+
+# --- bot -----------------------------------------------------------------------------
+
+
+class Bot:
+    def __init__(self, index: int, profile_name: str, cfg: Config, stats: Stats, rng: random.Random) -> None:
+        self.index = index
+        self.profile_name = profile_name
+        self.profile = PROFILES[profile_name]
+        self.cfg = cfg
+        self.stats = stats
+        self.rng = rng
+        self.email = f"{cfg.prefix}-{index}@loadtest.zerion.io"
+        self.token: Optional[str] = None
+        self.seq = 0
+        # (seq, perf_counter do envio) dos moves ainda sem ack
+        self.pending_moves: Deque[Tuple[int, float]] = deque()
+        self.pending_pings: Deque[float] = deque()
+        self.last_state: Optional[float] = None
+        self.direction = (0, 0)
+        self.steps_left = 0
+
+    async def run(self, start_at: float, deadline: float) -> None:
+        await asyncio.sleep(max(0.0, start_at - time.monotonic()))
+        backoff = 1.0
+        while time.monotonic() < deadline:
+            try:
+                ticket = await self._ticket()
+                closed_by_server = await self._session(ticket, deadline)
+            except BotError:
+                self.stats.counters["auth_failed"] += 1
+                closed_by_server = True
+            except (OSError, asyncio.TimeoutError, InvalidHandshake, InvalidURI):
+                self.stats.counters["connect_failed"] += 1
+                closed_by_server = True
+            if closed_by_server:
+                if not self.cfg.reconnect:
+                    return
+                await asyncio.sleep(backoff * (0.5 + self.rng.random()))
+                backoff = min(backoff * 2, 15.0)
+            else:
+                backoff = 1.0
+
+    # --- HTTP ---
+
+    async def _call(self, method: str, path: str, body: Any = None, token: Optional[str] = None) -> Tuple[int, Any]:
+        delay = 0.5
+        for _ in range(HTTP_RETRIES):
+            try:
+                status, headers, data = await _http_json(self.cfg.base_url, method, path, body, token)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                self.stats.counters["http_errors"] += 1
+            else:
+                if status not in (429, 503):
+                    return status, data
+                # rate-limit de login / pool de bcrypt cheio: espera o que o servidor pediu
+                self.stats.counters[f"http_{status}"] += 1
+                with contextlib.suppress(ValueError):
+                    delay = max(delay, float(headers.get("retry-after", delay)))
+            await asyncio.sleep(delay * (0.5 + self.rng.random()))
+            delay = min(delay * 2, 10.0)
+        raise BotError(f"{method} {path}: sem resposta útil")
+
+    async def _login(self) -> str:
+        creds = {"email": self.email, "password": PASSWORD}
+        status, data = await self._call("POST", "/auth/login", creds)
+        if status == 401:
+            status, _ = await self._call("POST", "/auth/register", creds)
+            if status not in (201, 409):
+                raise BotError(f"register: HTTP {status}")
+            self.stats.counters["registered"] += 1
+            status, data = await self._call("POST", "/auth/login", creds)
+        if status != 200 or not isinstance(data, dict) or "access_token" not in data:
+            raise BotError(f"login: HTTP {status}")
+        return str(data["access_token"])
+
+    async def _ticket(self) -> str:
+        t0 = time.perf_counter()
+        if self.token is None:
+            self.token = await self._login()
+        status, data = await self._call("POST", "/auth/ticket", token=self.token)
+        if status == 401:
+            # JWT expirou durante um teste longo
+            self.token = await self._login()
+            status, data = await self._call("POST", "/auth/ticket", token=self.token)
+        if status != 201 or not isinstance(data, dict):
+            raise BotError(f"ticket: HTTP {status}")
+        self.stats.hist["login_ms"].observe((time.perf_counter() - t0) * 1000.0)
+        return str(data["ticket"])
+
+    # --- WebSocket ---
+
+    async def _session(self, ticket: str, deadline: float) -> bool:
+        """Uma conexão; True se caiu antes da hora (conta como desconexão)."""
+        p = self.profile
+        until = deadline if not p.session_s else min(deadline, time.monotonic() + p.session_s * (0.75 + 0.5 * self.rng.random()))
+        stats = self.stats
+        async with websockets.connect(
+            self.cfg.ws_url,
+            subprotocols=["zerion.v1", f"auth.{ticket}"],  # type: ignore[list-item]
+            origin=self.cfg.origin,  # type: ignore[arg-type]
+            compression=None,
+            max_size=None,
+            open_timeout=15,
+            ping_interval=None,
+        ) as ws:
+            stats.counters["connects"] += 1
+            stats.connected += 1
+            self.seq = 0
+            self.pending_moves.clear()
+            self.pending_pings.clear()
+            self.last_state = None
+            recv = asyncio.create_task(self._recv(ws))
+            drive = asyncio.create_task(self._drive(ws, until))
+            try:
+                done, _ = await asyncio.wait({recv, drive}, return_when=asyncio.FIRST_COMPLETED)
+                if recv in done:
+                    stats.counters["disconnects"] += 1
+                    stats.close_codes[ws.close_code if ws.close_code is not None else "none"] += 1
+                    return True
+                await ws.close()
+                return False
+            finally:
+                stats.connected -= 1
+                for task in (recv, drive):
+                    task.cancel()
+                    with contextlib.suppress(asyncio.CancelledError, ConnectionClosed):
+                        await task
+
+    async def _send(self, ws: Any, op: str, payload: Any = None) -> int:
+        self.seq += 1
+        msg: Dict[str, Any] = {"v": 1, "op": op, "seq": self.seq, "ts": int(time.time() * 1000)}
+        if payload is not None:
+            msg["payload"] = payload
+        frame = umsgpack.packb(msg)
+        await ws.send(frame)
+        self.stats.msgs_out[op] += 1
+        self.stats.bytes_out[op] += len(frame)
+        return self.seq
+
+    def _next_step(self) -> Tuple[int, int]:
+        if self.steps_left <= 0:
+            self.direction = self.rng.choice(((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1), (1, -1), (-1, 1)))
+            self.steps_left = self.rng.randint(1, max(1, self.profile.stride))
+        self.steps_left -= 1
+        return self.direction
+
+    async def _drive(self, ws: Any, until: float) -> None:
+        p = self.profile
+        now = time.monotonic()
+        # fases aleatórias para os bots não baterem todos no mesmo instante
+        next_move = now + self.rng.random() / p.move_hz if p.move_hz else None
+        next_chat = now + self.rng.expovariate(p.chat_per_min / 60.0) if p.chat_per_min else None
+        next_ping = now + self.rng.random() * p.ping_every_s if p.ping_every_s else None
+        while True:
+            now = time.monotonic()
+            if now >= until:
+                return
+            if next_move is not None and now >= next_move:
+                dx, dy = self._next_step()
+                seq = await self._send(ws, "move", {"dx": dx, "dy": dy})
+                self.pending_moves.append((seq, time.perf_counter()))
+                next_move += 1.0 / p.move_hz
+                if next_move < now:
+                    # atrasou (processo de bots saturado): não compensa em rajada
+                    next_move = now + 1.0 / p.move_hz
+                    self.stats.counters["send_lag"] += 1
+            if next_chat is not None and now >= next_chat:
+                await self._send(ws, "chat", {"channel": p.chat_channel, "msg": f"bot {self.index} {self.seq}"})
+                next_chat = now + self.rng.expovariate(p.chat_per_min / 60.0)
+            if next_ping is not None and now >= next_ping:
+                self.pending_pings.append(time.perf_counter())
+                await self._send(ws, "ping")
+                next_ping = now + p.ping_every_s
+            wake = min(t for t in (next_move, next_chat, next_ping, until) if t is not None)
+            await asyncio.sleep(max(0.0, wake - time.monotonic()))
+
+    async def _recv(self, ws: Any) -> None:
+        stats = self.stats
+        with contextlib.suppress(ConnectionClosed):
+            async for frame in ws:
+                t = time.perf_counter()
+                try:
+                    msg = umsgpack.unpackb(frame)
+                    op = str(msg.get("op"))
+                except Exception:
+                    stats.counters["bad_frames"] += 1
+                    continue
+                stats.msgs_in[op] += 1
+                stats.bytes_in[op] += len(frame)
+                if op == "state":
+                    self._on_state(msg, t)
+                elif op == "ping" and self.pending_pings:
+                    stats.hist["ping_ms"].observe((t - self.pending_pings.popleft()) * 1000.0)
+                elif op == "warn":
+                    stats.warns[str((msg.get("payload") or {}).get("code"))] += 1
+
+    def _on_state(self, msg: Dict[str, Any], t: float) -> None:
+        hist = self.stats.hist
+        ts = msg.get("ts")
+        if isinstance(ts, int):
+            hist["snapshot_age_ms"].observe(max(0.0, time.time() * 1000 - ts))
+        if self.last_state is not None:
+            hist["snapshot_gap_ms"].observe((t - self.last_state) * 1000.0)
+        self.last_state = t
+        ack = msg.get("ack")
+        pending = self.pending_moves
+        if not isinstance(ack, int):
+            return
+        # seqs abaixo do ack foram descartados (rate-limit): só o próprio ack mede latência
+        while pending and pending[0][0] < ack:
+            pending.popleft()
+        if pending and pending[0][0] == ack:
+            hist["input_ms"].observe((t - pending.popleft()[1]) * 1000.0)
+
+
+# --- processos -------------------------------------------------------------------------
+
+
+def _pick_profiles(cfg: Config) -> List[str]:
+    rng = random.Random(cfg.seed)
+    names = list(cfg.mix)
+    weights = [cfg.mix[n] for n in names]
+    return [rng.choices(names, weights)[0] for _ in range(cfg.bots)]
+
+
+async def _worker_main(worker: int, cfg: Config, queue: Any) -> None:
+    stats = Stats()
+    profiles = _pick_profiles(cfg)
+    mine = [i for i in range(cfg.bots) if i % cfg.procs == worker]
+    t0 = time.monotonic()
+    deadline = t0 + cfg.duration
+    bots = [Bot(i, profiles[i], cfg, stats, random.Random(cfg.seed * 1_000_003 + i)) for i in mine]
+    tasks = [asyncio.create_task(b.run(t0 + cfg.ramp * b.index / max(1, cfg.bots), deadline)) for b in bots]
+
+    async def report() -> None:
+        while True:
+            await asyncio.sleep(cfg.report_every)
+            queue.put(("tick", worker, stats.export()))
+
+    reporter = asyncio.create_task(report())
+    await asyncio.gather(*tasks, return_exceptions=True)
+    reporter.cancel()
+    queue.put(("done", worker, stats.export()))
+
+
+def _worker(worker: int, cfg: Config, queue: Any) -> None:
+    asyncio.run(_worker_main(worker, cfg, queue))
+
+
+def _progress_line(elapsed: float, merged: Dict[str, Any], prev: Optional[Dict[str, Any]], dt: float) -> str:
+    def rate(key: str) -> float:
+        cur = sum(merged[key].values())
+        old = sum(prev[key].values()) if prev else 0
+        return (cur - old) / dt if dt > 0 else 0.0
+
+    inp = merged["hist"]["input_ms"]
+    return (
+        f"[{elapsed:6.1f}s] conectados={merged['connected']:6d} "
+        f"in={rate('bytes_in') / 1024:9.1f}KB/s ({rate('msgs_in'):8.0f} msg/s) "
+        f"out={rate('bytes_out') / 1024:8.1f}KB/s "
+        f"input p50={inp.quantile(0.5):g} p99={inp.quantile(0.99):g}ms "
+        f"desconexões={merged['counters'].get('disconnects', 0)} falhas={merged['counters'].get('connect_failed', 0)}"
+    )
+
+
+def run(cfg: Config) -> Dict[str, Any]:
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(w, cfg, queue), daemon=True) for w in range(cfg.procs)]
+    t0 = time.monotonic()
+    for p in procs:
+        p.start()
+    latest: Dict[int, Dict[str, Any]] = {}
+    done: set = set()
+    prev: Optional[Dict[str, Any]] = None
+    prev_t = t0
+    while len(done) < len(procs):
+        try:
+            kind, worker, export = queue.get(timeout=1.0)
+        except Exception:
+            if not any(p.is_alive() for w, p in enumerate(procs) if w not in done):
+                break
+            continue
+        latest[worker] = export
+        if kind == "done":
+            done.add(worker)
+        now = time.monotonic()
+        if now - prev_t >= cfg.report_every and kind == "tick":
+            merged = merge_exports(list(latest.values()))
+            print(_progress_line(now - t0, merged, prev, now - prev_t), flush=True)
+            prev, prev_t = merged, now
+    for p in procs:
+        p.join(timeout=5)
+    return summarize(merge_exports(list(latest.values())), time.monotonic() - t0, cfg)
+
+
+def summarize(merged: Dict[str, Any], elapsed: float, cfg: Config) -> Dict[str, Any]:
+    secs = max(elapsed, 1e-9)
+    return {
+        "config": asdict(cfg),
+        "elapsed_s": round(elapsed, 2),
+        "latency": {name: _hist_summary(h) for name, h in merged["hist"].items()},
+        "bytes_per_s": {
+            "in": round(sum(merged["bytes_in"].values()) / secs, 1),
+            "out": round(sum(merged["bytes_out"].values()) / secs, 1),
+            "in_by_op": {op: round(n / secs, 1) for op, n in merged["bytes_in"].items()},
+            "out_by_op": {op: round(n / secs, 1) for op, n in merged["bytes_out"].items()},
+        },
+        "msgs": {"in": dict(merged["msgs_in"]), "out": dict(merged["msgs_out"])},
+        "disconnects": merged["counters"].get("disconnects", 0),
+        "close_codes": dict(merged["close_codes"]),
+        "warns": dict(merged["warns"]),
+        "counters": dict(merged["counters"]),
+    }
+
+
+# --- servidor local ----------------------------------------------------------------------
+
+
+def _start_local(port: int) -> subprocess.Popen:
+    server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen([sys.executable, "-m", "scripts.local_server", "--port", str(port)], cwd=server_dir)
+    base = f"http://127.0.0.1:{port}"
+    limit = time.monotonic() + 60
+    while time.monotonic() < limit:
+        if proc.poll() is not None:
+            raise SystemExit(f"scripts.local_server saiu com código {proc.returncode}")
+        with contextlib.suppress(Exception):
+            status, _, _ = asyncio.run(_http_json(base, "GET", "/health", timeout=2.0))
+            if status == 200:
+                return proc
+        time.sleep(0.5)
+    proc.terminate()
+    raise SystemExit("scripts.local_server não respondeu em /health")
+
+
+def _server_metrics(base_url: str) -> Any:
+    with contextlib.suppress(Exception):
+        status, _, data = asyncio.run(_http_json(base_url, "GET", "/metrics/tick", timeout=5.0))
+        if status == 200:
+            return data
+    return None
+
+
+def _parse_mix(text: str) -> Dict[str, float]:
+    mix: Dict[str, float] = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in PROFILES:
+            raise argparse.ArgumentTypeError(f"perfil desconhecido: {name} (há: {', '.join(PROFILES)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bots de carga zerion.v1")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="base HTTP da API")
+    parser.add_argument("--ws-url", default=None, help="padrão: <url>/ws com ws(s)://")
+    parser.add_argument("--origin", default="http://localhost:3000", help="tem de estar em ALLOWED_WS_ORIGINS")
+    parser.add_argument("--bots", type=int, default=100)
+    parser.add_argument("--procs", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--duration", type=float, default=60.0, help="segundos, contando a rampa")
+    parser.add_argument("--ramp", type=float, default=10.0, help="segundos até todos os bots entrarem")
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix("walker=70,chatty=20,idle=10"))
+    parser.add_argument("--prefix", default="bot", help="contas <prefix>-<n>@loadtest.zerion.io (reusadas entre execuções)")
+    parser.add_argument("--no-reconnect", action="store_true", help="bot que cai não volta")
+    parser.add_argument("--report-every", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default=None, help="grava o relatório final neste arquivo")
+    parser.add_argument("--local", action="store_true", help="sobe scripts.local_server (SQLite + Redis em memória)")
+    parser.add_argument("--port", type=int, default=8765, help="porta do --local")
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}" if args.local else args.url.rstrip("/")
+    ws_url = args.ws_url or base_url.replace("http", "ws", 1) + "/ws"
+    cfg = Config(
+        base_url=base_url,
+        ws_url=ws_url,
+        origin=args.origin,
+        bots=args.bots,
+        procs=max(1, min(args.procs, args.bots)),
+        duration=args.duration,
+        ramp=min(args.ramp, args.duration),
+        mix=args.mix,
+        prefix=args.prefix,
+        reconnect=not args.no_reconnect,
+        report_every=args.report_every,
+        seed=args.seed,
+    )
+    server = _start_local(args.port) if args.local else None
+    try:
+        report = run(cfg)
+        report["server"] = _server_metrics(base_url)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+    text = json.dumps(report, indent=2, default=str)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            fh.write(text)
+    print(json.dumps({k: report[k] for k in ("latency", "bytes_per_s", "disconnects", "close_codes", "warns", "counters")}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Sobe a API com dependências locais, sem MySQL nem Redis (teste de carga/dev).
+
+- banco: SQLite (``sqlite+aiosqlite``, tabelas criadas a partir dos models);
+- Redis: ``MemoryRedis``, só o subconjunto que o servidor usa (tickets,
+  token bucket do rate-limit, pub/sub do chat), no próprio processo.
+
+Também baixa o custo do bcrypt e solta o rate-limit de login (todos os bots
+vêm do mesmo IP). Tudo via ``os.environ.setdefault``: variáveis já exportadas
+vencem. Uso, a partir de ``server/``::
+
+    python -m scripts.local_server --port 8000
+
+Precisa de ``aiosqlite`` instalado (não está no requirements de produção).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import fnmatch
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+
+LOCAL_ENV: Dict[str, str] = {
+    "DATABASE_URL": "sqlite+aiosqlite:///var/loadtest.db",
+    "PERSIST_JOURNAL": "off",
+    "PASSWORD_BCRYPT_ROUNDS": "4",
+    "RATE_LOGIN_MAX": "1000000",
+    "TICKET_TTL_SECONDS": "300",
+}
+
+
+class _MemoryPubSub:
+    def __init__(self, hub: "MemoryRedis") -> None:
+        self._hub = hub
+        self.patterns: List[str] = []
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+
+    async def psubscribe(self, *patterns: str) -> None:
+        self.patterns.extend(patterns)
+        self._hub._pubsubs.append(self)
+
+    async def listen(self) -> AsyncIterator[Dict[str, Any]]:
+        while True:
+            yield await self.queue.get()
+
+    async def aclose(self) -> None:
+        if self in self._hub._pubsubs:
+            self._hub._pubsubs.remove(self)
+
+
+class _MemoryScript:
+    def __init__(self, hub: "MemoryRedis", fn: Any) -> None:
+        self._hub = hub
+        self._fn = fn
+
+    async def __call__(self, keys: Sequence[Any] = (), args: Sequence[Any] = ()) -> Any:
+        return self._fn(self._hub, list(keys), list(args))
+
+
+def _token_bucket(hub: "MemoryRedis", keys: List[Any], args: List[Any]) -> int:
+    """Mesma conta do Lua de ``utils.ratelimit`` (estado em ``hub._data``)."""
+    rate, capacity, cost = (float(a) for a in args)
+    # TIME do Redis: relógio de parede do servidor em ms
+    now = time.time() * 1000
+    state = hub._get(keys[0])
+    if state is None:
+        tokens, ts = capacity, now
+    else:
+        tokens, ts = state
+    tokens = min(capacity, tokens + max(0.0, now - ts) * rate / 1000)
+    allowed = 0
+    if tokens >= cost:
+        tokens -= cost
+        allowed = 1
+    hub._put(keys[0], (tokens, now), ttl=(capacity * 1000 / rate + 1000) / 1000)
+    return allowed
+
+
+class MemoryRedis:
+    """Stand-in em memória de ``redis.asyncio.Redis`` para um único processo."""
+
+    def __init__(self) -> None:
+        # chave -> (valor, expira em monotonic ou None)
+        self._data: Dict[Any, Tuple[Any, Optional[float]]] = {}
+        self._pubsubs: List[_MemoryPubSub] = []
+        self._scripts: Dict[str, Any] = {}
+        from utils.ratelimit import _TOKEN_BUCKET_LUA
+
+        self._scripts[_TOKEN_BUCKET_LUA] = _token_bucket
+
+    def _get(self, key: Any) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _put(self, key: Any, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    async def ping(self) -> bool:
+        return True
+
+    async def set(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
+        self._put(key, value.encode() if isinstance(value, str) else value, ttl=ex)
+        return True
+
+    async def get(self, key: str) -> Any:
+        return self._get(key)
+
+    async def delete(self, *keys: str) -> int:
+        return sum(1 for k in keys if self._data.pop(k, None) is not None)
+
+    async def execute_command(self, *args: Any) -> Any:
+        if args[0].upper() == "GETDEL":
+            value = self._get(args[1])
+            self._data.pop(args[1], None)
+            return value
+        raise NotImplementedError(f"MemoryRedis: {args[0]}")
+
+    def register_script(self, script: str) -> _MemoryScript:
+        fn = self._scripts.get(script)
+        if fn is None:
+            raise NotImplementedError("MemoryRedis: script Lua desconhecido")
+        return _MemoryScript(self, fn)
+
+    async def publish(self, channel: str, data: bytes) -> int:
+        sent = 0
+        for ps in self._pubsubs:
+            for pattern in ps.patterns:
+                if fnmatch.fnmatchcase(channel, pattern):
+                    ps.queue.put_nowait({"type": "pmessage", "pattern": pattern, "channel": channel.encode(), "data": data})
+                    sent += 1
+                    break
+        return sent
+
+    def pubsub(self) -> _MemoryPubSub:
+        return _MemoryPubSub(self)
+
+    async def aclose(self) -> None:
+        self._pubsubs.clear()
+
+
+def _sqlite_bigint_pk() -> None:
+    # no SQLite só "INTEGER PRIMARY KEY" é autoincremento; BIGINT viraria NULL no id
+    from sqlalchemy import BigInteger
+    from sqlalchemy.ext.compiler import compiles
+
+    @compiles(BigInteger, "sqlite")
+    def _bigint(type_: Any, compiler: Any, **kw: Any) -> str:
+        return "INTEGER"
+
+
+async def _create_tables() -> None:
+    import models.character  # noqa: F401  (registra as tabelas no metadata)
+    import models.user  # noqa: F401
+    from models.base import Base
+    from services.db import engine
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def serve(host: str, port: int) -> None:
+    import uvicorn
+
+    from app.main import app
+    from services.redis import redis_manager
+
+    await _create_tables()
+    redis_manager._client = MemoryRedis()  # type: ignore[assignment]
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning", ws_max_size=1 << 20)
+    await uvicorn.Server(config).serve()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="API com SQLite e Redis em memória")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    for key, value in LOCAL_ENV.items():
+        os.environ.setdefault(key, value)
+    os.makedirs("var", exist_ok=True)
+    _sqlite_bigint_pk()
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
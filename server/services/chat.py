@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from typing import Any, Callable, Dict, Optional, Protocol, Set
+
+import umsgpack
+
+from game.types import build_msg
+from services.redis import redis_manager
+
+
+# canais Redis: chat:<canal>, com canal em global | map:<id> | whisper:<user_id>
+REDIS_PREFIX = "chat:"
+
+
+class ChatSink(Protocol):
+    def push(self, data: bytes) -> bool: ...
+
+
+class ChatCodec(Protocol):
+    def encode(self, msg: Any) -> bytes: ...
+
+
+class ChatHub:
+    """Fan-out de chat do processo: um único assinante Redis para todos os sockets.
+
+    Cada mensagem publicada é decodificada uma vez, o frame do cliente é
+    codificado uma vez por protocolo (v1/v2) e os mesmos bytes vão para a fila
+    de saída de todos os sockets locais inscritos no canal. Sem Redis, o
+    ``publish`` entrega direto aos sockets locais.
+    """
+
+    def __init__(self) -> None:
+        self._subs: Dict[str, Dict[ChatSink, ChatCodec]] = {}
+        self._channels_by_sink: Dict[ChatSink, Set[str]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._running = asyncio.Event()
+        self._redis_ok = False
+        # métricas simples
+        self.messages_in = 0
+        self.frames_encoded = 0
+        self.deliveries = 0
+        # callback opcional (op, bytes, mensagens) para métricas de saída
+        self.on_sent: Optional[Callable[[str, int, int], None]] = None
+
+    # --- inscrições -------------------------------------------------------------
+
+    def subscribe(self, channel: str, sink: ChatSink, codec: ChatCodec) -> None:
+        self._subs.setdefault(channel, {})[sink] = codec
+        self._channels_by_sink.setdefault(sink, set()).add(channel)
+
+    def unsubscribe(self, channel: str, sink: ChatSink) -> None:
+        subs = self._subs.get(channel)
+        if subs is not None:
+            subs.pop(sink, None)
+            if not subs:
+                self._subs.pop(channel, None)
+        chans = self._channels_by_sink.get(sink)
+        if chans is not None:
+            chans.discard(channel)
+
+    def unsubscribe_all(self, sink: ChatSink) -> None:
+        for channel in list(self._channels_by_sink.pop(sink, ())):
+            subs = self._subs.get(channel)
+            if subs is not None:
+                subs.pop(sink, None)
+                if not subs:
+                    self._subs.pop(channel, None)
+
+    # --- publicação / entrega ---------------------------------------------------
+
+    async def publish(self, channel: str, payload: Dict[str, Any]) -> None:
+        if self._redis_ok:
+            try:
+                client = await redis_manager.get_client()
+                await client.publish(REDIS_PREFIX + channel, umsgpack.packb(payload))
+                return
+            except Exception:
+                pass
+        self.deliver(channel, payload)
+
+    def deliver(self, channel: str, payload: Dict[str, Any]) -> int:
+        """Entrega local: um frame por protocolo, mesmos bytes para todos os sockets."""
+        subs = self._subs.get(channel)
+        if not subs:
+            return 0
+        msg = build_msg("event", {"channel": channel, **payload})
+        frames: Dict[type, bytes] = {}
+        sent = 0
+        sent_bytes = 0
+        for sink, codec in list(subs.items()):
+            frame = frames.get(type(codec))
+            if frame is None:
+                frame = frames[type(codec)] = codec.encode(msg)
+                self.frames_encoded += 1
+            if sink.push(frame):
+                sent += 1
+                sent_bytes += len(frame)
+        self.deliveries += sent
+        if sent and self.on_sent is not None:
+            self.on_sent("event", sent_bytes, sent)
+        return sent
+
+    # --- assinante Redis ----------------------------------------------------------
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._running.set()
+        self._task = asyncio.create_task(self._run(), name="chat_hub")
+
+    async def stop(self) -> None:
+        self._running.clear()
+        self._redis_ok = False
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(Exception, asyncio.CancelledError):
+                await self._task
+
+    async def _run(self) -> None:
+        backoff = 1.0
+        while self._running.is_set():
+            pubsub = None
+            try:
+                client = await redis_manager.get_client()
+                pubsub = client.pubsub()
+                await pubsub.psubscribe(REDIS_PREFIX + "*")
+                self._redis_ok = True
+                backoff = 1.0
+                async for message in pubsub.listen():
+                    if message.get("type") != "pmessage":
+                        continue
+                    self._on_redis_message(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                break
+            except Exception:
+                # Redis indisponível: entrega local até reconectar
+                self._redis_ok = False
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 15.0)
+            finally:
+                if pubsub is not None:
+                    with contextlib.suppress(Exception):
+                        await pubsub.aclose()
+
+    def _on_redis_message(self, raw_channel: Any, data: bytes) -> None:
+        name = raw_channel.decode() if isinstance(raw_channel, (bytes, bytearray)) else str(raw_channel)
+        channel = name[len(REDIS_PREFIX):]
+        if channel not in self._subs:
+            return
+        try:
+            payload = umsgpack.unpackb(data)  # publish como msgpack
+        except Exception:
+            return
+        if not isinstance(payload, dict):
+            return
+        self.messages_in += 1
+        self.deliver(channel, payload)
+
+
+chat_hub = ChatHub()
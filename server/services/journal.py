@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import os
+from typing import Dict, List, Optional, Protocol, Tuple
+
+import umsgpack
+
+from services.redis import redis_manager
+
+
+# registro de mudança: (char_id, x, y, hp, mp)
+Record = Tuple[int, int, int, int, int]
+
+
+class Journal(Protocol):
+    """Log append-only de mudanças de personagem ainda não gravadas no DB.
+
+    ``append`` é síncrono e só bufferiza; ``flush`` torna o buffer durável.
+    ``replay`` devolve os registros na ordem (o último por personagem vence) e
+    ``compact`` reescreve o log só com o que ainda está pendente após um flush
+    bem-sucedido no DB.
+    """
+
+    def append(self, record: Record) -> None: ...
+
+    async def flush(self) -> None: ...
+
+    async def replay(self) -> List[Record]: ...
+
+    async def compact(self, pending: Dict[int, dict]) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+def _pending_records(pending: Dict[int, dict]) -> List[Record]:
+    return [(cid, d["x"], d["y"], d["hp"], d["mp"]) for cid, d in pending.items()]
+
+
+class FileJournal:
+    """Journal em arquivo local: sequência de arrays msgpack ``[cid, x, y, hp, mp]``."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._buf: List[Record] = []
+        self._fp: Optional[io.BufferedWriter] = None
+        self._lock = asyncio.Lock()
+
+    def _file(self) -> io.BufferedWriter:
+        if self._fp is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._fp = open(self.path, "ab")
+        return self._fp
+
+    def append(self, record: Record) -> None:
+        self._buf.append(record)
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._buf:
+                return
+            buf, self._buf = self._buf, []
+            fp = self._file()
+            fp.write(b"".join(umsgpack.packb(list(r)) for r in buf))
+            # sobrevive a crash do processo (fsync ficaria caro a cada poucos ms)
+            fp.flush()
+
+    async def replay(self) -> List[Record]:
+        if not os.path.exists(self.path):
+            return []
+        out: List[Record] = []
+        with open(self.path, "rb") as fp:
+            while True:
+                try:
+                    rec = umsgpack.unpack(fp)
+                except Exception:
+                    # fim do arquivo ou último registro truncado por crash
+                    break
+                if isinstance(rec, list) and len(rec) == 5:
+                    out.append(tuple(int(v) for v in rec))  # type: ignore[arg-type]
+        return out
+
+    async def compact(self, pending: Dict[int, dict]) -> None:
+        async with self._lock:
+            # registros ainda no buffer são mais novos que o snapshot: continuam no buffer
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+            tmp = self.path + ".tmp"
+            with open(tmp, "wb") as fp:
+                fp.write(b"".join(umsgpack.packb(list(r)) for r in _pending_records(pending)))
+            os.replace(tmp, self.path)
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+
+class RedisStreamJournal:
+    """Journal em Redis Stream: uma entrada por flush, campo ``r`` com os registros em msgpack."""
+
+    def __init__(self, key: str = "persist:journal") -> None:
+        self.key = key
+        self._buf: List[Record] = []
+        self._lock = asyncio.Lock()
+
+    def append(self, record: Record) -> None:
+        self._buf.append(record)
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._buf:
+                return
+            buf, self._buf = self._buf, []
+            try:
+                client = await redis_manager.get_client()
+                await client.xadd(self.key, {"r": umsgpack.packb([list(r) for r in buf])})
+            except Exception:
+                # Redis fora: devolve ao buffer para a próxima tentativa
+                self._buf[:0] = buf
+                raise
+
+    async def replay(self) -> List[Record]:
+        client = await redis_manager.get_client()
+        out: List[Record] = []
+        for _id, fields in await client.xrange(self.key):
+            raw = fields.get(b"r") or fields.get("r")
+            if raw is None:
+                continue
+            for rec in umsgpack.unpackb(raw):
+                out.append(tuple(int(v) for v in rec))  # type: ignore[arg-type]
+        return out
+
+    async def compact(self, pending: Dict[int, dict]) -> None:
+        async with self._lock:
+            client = await redis_manager.get_client()
+            pipe = client.pipeline(transaction=True)
+            pipe.delete(self.key)
+            records = _pending_records(pending)
+            if records:
+                pipe.xadd(self.key, {"r": umsgpack.packb([list(r) for r in records])})
+            await pipe.execute()
+
+    async def close(self) -> None:
+        await self.flush()
+
+
+def make_journal(kind: str, path: str, processes: int = 1) -> Optional[Journal]:
+    """``file`` | ``redis`` | ``off`` (qualquer outro valor desliga o journal).
+
+    O journal em arquivo é de um processo só: o ``compact`` de um processo
+    truncaria registros que outro ainda não gravou no DB.
+    """
+    if kind == "file":
+        if processes > 1:
+            raise RuntimeError(
+                f"PERSIST_JOURNAL=file não suporta WEB_CONCURRENCY={processes}; use PERSIST_JOURNAL=redis ou off"
+            )
+        return FileJournal(path)
+    if kind == "redis":
+        return RedisStreamJournal()
+    return None
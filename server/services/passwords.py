@@ -0,0 +1,130 @@
+"""Hash/verificação de senha (bcrypt) fora do event loop.
+
+Cada bcrypt leva dezenas a centenas de ms de CPU; rodando inline, trava o tick
+e todos os WebSockets. Aqui o trabalho vai para um pool de threads de tamanho
+fixo (o bcrypt libera o GIL), com no máximo ``workers`` execuções simultâneas
+e ``max_queue`` pedidos esperando; além disso ``PasswordBusy`` (a rota
+responde 503 e o cliente tenta de novo) em vez de crescer a fila sem limite.
+
+``verify_and_update`` devolve o hash novo quando o custo configurado
+(``PASSWORD_BCRYPT_ROUNDS``) mudou: o login regrava a senha sem o usuário notar.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from passlib.hash import bcrypt
+
+from app.config import get_settings
+from game.profiler import DURATION_BUCKETS_MS, Histogram
+
+
+T = TypeVar("T")
+
+
+class PasswordBusy(Exception):
+    """Fila de hashing cheia."""
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = 2, max_queue: int = 64, rounds: int = 12) -> None:
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.scheme = bcrypt.using(rounds=rounds)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.calls: Dict[str, int] = {"hash": 0, "verify": 0}
+        self.wait_ms = Histogram(DURATION_BUCKETS_MS)
+        self.run_ms = Histogram(DURATION_BUCKETS_MS)
+
+    async def _run(self, op: str, fn: Callable[..., T], *args: Any) -> T:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise PasswordBusy()
+        t0 = time.perf_counter()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            t1 = time.perf_counter()
+            self.wait_ms.observe((t1 - t0) * 1000.0)
+            self.in_flight += 1
+            self.calls[op] += 1
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+            self.run_ms.observe((time.perf_counter() - t1) * 1000.0)
+            return result
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.scheme.hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._run("verify", _safe_verify, self.scheme, password, password_hash)
+
+    async def verify_and_update(self, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        """(senha confere, hash novo se o custo mudou) — um único trabalho no pool."""
+        ok, new_hash = await self._run("verify", _verify_and_update, self.scheme, password, password_hash)
+        if new_hash is not None:
+            self.rehashed += 1
+        return ok, new_hash
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._slots = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "calls": dict(self.calls),
+            "wait_ms": self.wait_ms.to_dict(),
+            "run_ms": self.run_ms.to_dict(),
+        }
+
+
+def _safe_verify(scheme: Any, password: str, password_hash: str) -> bool:
+    try:
+        return bool(scheme.verify(password, password_hash))
+    except (ValueError, TypeError):
+        # hash malformado no banco: trata como senha errada
+        return False
+
+
+def _verify_and_update(scheme: Any, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    if not _safe_verify(scheme, password, password_hash):
+        return False, None
+    if scheme.needs_update(password_hash):
+        return True, scheme.hash(password)
+    return True, None
+
+
+_settings = get_settings()
+password_hasher = PasswordHasher(
+    workers=_settings.password_workers,
+    max_queue=_settings.password_max_queue,
+    rounds=_settings.password_bcrypt_rounds,
+)
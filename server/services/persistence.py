@@ -1,57 +1,172 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Dict, Optional
+import contextlib
+from typing import Dict, List, Optional
 
+from app.config import get_settings
 from services.db import AsyncSessionLocal
-from services.repositories.character_repository import update_state_by_id
+from services.journal import Journal, make_journal
+from services.repositories.character_repository import update_states_bulk
 
 
 class PersistenceManager:
-    def __init__(self, interval_seconds: int = 5) -> None:
+    """Write-behind dos personagens: dirty em memória, journal durável e UPDATE em lotes.
+
+    Cada mudança real (diferente do último valor gravado/pendente) vai para o
+    journal em poucos milissegundos; o DB recebe o estado mais recente a cada
+    ``interval_seconds``. No start, o journal é reaplicado, então o intervalo
+    do DB pode ser longo sem perder progresso num crash do processo.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float = 5,
+        batch_size: int = 500,
+        journal: Optional[Journal] = None,
+        journal_flush_ms: int = 200,
+    ) -> None:
         self.interval_seconds = interval_seconds
+        self.batch_size = max(1, batch_size)
+        self.journal = journal
+        self.journal_flush_ms = journal_flush_ms
         self._task: Optional[asyncio.Task] = None
+        self._journal_task: Optional[asyncio.Task] = None
         self._running = asyncio.Event()
         self._dirty: Dict[int, dict] = {}
+        # último estado gravado no DB por personagem (detecção de mudança)
+        self._persisted: Dict[int, dict] = {}
+        # um flush por vez: o periódico pula a rodada se o anterior ainda está rodando
+        self._flush_lock = asyncio.Lock()
+        self.skipped_flushes = 0
+        self.skipped_unchanged = 0
+        self.replayed = 0
+
+    def remember(self, char_id: int, *, x: int, y: int, hp: int, mp: int) -> None:
+        """Registra o estado já presente no DB (ex.: recém-carregado), sem marcar dirty."""
+        self._persisted[char_id] = {"x": x, "y": y, "hp": hp, "mp": mp}
+
+    def forget(self, char_id: int) -> None:
+        """Descarta o snapshot de quem saiu (se não houver nada pendente)."""
+        if char_id not in self._dirty:
+            self._persisted.pop(char_id, None)
 
     def mark_dirty(self, char_id: int, *, x: int, y: int, hp: int, mp: int) -> None:
-        self._dirty[char_id] = {"x": x, "y": y, "hp": hp, "mp": mp}
+        data = {"x": x, "y": y, "hp": hp, "mp": mp}
+        pending = self._dirty.get(char_id)
+        if pending == data or (pending is None and self._persisted.get(char_id) == data):
+            self.skipped_unchanged += 1
+            return
+        self._dirty[char_id] = data
+        if self.journal is not None:
+            self.journal.append((char_id, x, y, hp, mp))
 
     async def start(self) -> None:
         if self._task and not self._task.done():
             return
         self._running.set()
+        if self.journal is not None:
+            await self._replay_journal()
+            self._journal_task = asyncio.create_task(self._journal_loop(), name="persistence_journal")
         self._task = asyncio.create_task(self._run_loop(), name="persistence_loop")
 
     async def stop(self) -> None:
         self._running.clear()
-        if self._task:
-            await self._task
+        for task in (self._task, self._journal_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        # flush final com o que ficou pendente
+        with contextlib.suppress(Exception):
+            await self.flush_now()
+        if self.journal is not None:
+            with contextlib.suppress(Exception):
+                await self.journal.close()
+
+    async def _replay_journal(self) -> None:
+        assert self.journal is not None
+        try:
+            records = await self.journal.replay()
+        except Exception:
+            return
+        # o último registro de cada personagem vence; o que já estiver dirty é mais novo
+        latest = {cid: {"x": x, "y": y, "hp": hp, "mp": mp} for cid, x, y, hp, mp in records}
+        for char_id, data in latest.items():
+            self._dirty.setdefault(char_id, data)
+        self.replayed += len(records)
+        if records:
+            # grava já no DB; se falhar, continuam dirty (e no journal)
+            with contextlib.suppress(Exception):
+                await self.flush_now()
 
     async def flush_now(self, only_char_id: Optional[int] = None) -> None:
+        async with self._flush_lock:
+            await self._flush(only_char_id)
+
+    async def _flush(self, only_char_id: Optional[int] = None) -> None:
         payloads = self._dirty.copy()
         if only_char_id is not None:
             payloads = {k: v for k, v in payloads.items() if k == only_char_id}
         if not payloads:
             return
-        async with AsyncSessionLocal() as session:
-            for char_id, data in payloads.items():
-                await update_state_by_id(session, char_id, **data)
-            await session.commit()
-        # limpar somente os que foram flushados
-        for k in list(payloads.keys()):
-            self._dirty.pop(k, None)
+        # iguais ao que já está no DB não viram UPDATE
+        rows: List[dict] = [
+            {"id": char_id, **data}
+            for char_id, data in payloads.items()
+            if self._persisted.get(char_id) != data
+        ]
+        self.skipped_unchanged += len(payloads) - len(rows)
+        if rows:
+            async with AsyncSessionLocal() as session:
+                for i in range(0, len(rows), self.batch_size):
+                    await update_states_bulk(session, rows[i : i + self.batch_size])
+                await session.commit()
+        # limpar somente os que foram flushados (e não foram remarcados durante o flush)
+        for k, v in payloads.items():
+            self._persisted[k] = v
+            if self._dirty.get(k) is v:
+                self._dirty.pop(k, None)
+        if self.journal is not None and only_char_id is None:
+            # o DB já tem tudo até aqui: o journal fica só com o que ainda está pendente
+            await self.journal.compact(self._dirty)
 
     async def _run_loop(self) -> None:
         try:
             while self._running.is_set():
                 await asyncio.sleep(self.interval_seconds)
-                await self.flush_now()
+                if self._flush_lock.locked():
+                    # flush anterior atrasado: não sobrepõe, o próximo pega tudo
+                    self.skipped_flushes += 1
+                    continue
+                try:
+                    await self.flush_now()
+                except Exception:
+                    # falha de DB não derruba o loop; os dirty continuam pendentes
+                    pass
         except asyncio.CancelledError:
             pass
 
-
-persistence_manager = PersistenceManager(interval_seconds=5)
-
+    async def _journal_loop(self) -> None:
+        assert self.journal is not None
+        try:
+            while self._running.is_set():
+                await asyncio.sleep(self.journal_flush_ms / 1000.0)
+                try:
+                    await self.journal.flush()
+                except Exception:
+                    # registros voltam ao buffer (redis) ou seguem no arquivo
+                    pass
+        except asyncio.CancelledError:
+            pass
 
 
+_settings = get_settings()
+persistence_manager = PersistenceManager(
+    interval_seconds=_settings.persist_interval_seconds,
+    batch_size=_settings.persist_batch_size,
+    journal=make_journal(_settings.persist_journal, _settings.persist_journal_path, _settings.web_concurrency),
+    journal_flush_ms=_settings.persist_journal_flush_ms,
+)
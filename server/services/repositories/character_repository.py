@@ -1,12 +1,12 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import Mapping, Optional, Sequence
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.character import Character
-from sqlalchemy import update
+from sqlalchemy import case, update
 
 
 async def get_by_user(session: AsyncSession, user_id: int) -> Optional[Character]:
@@ -38,3 +38,25 @@ async def update_state_by_id(session: AsyncSession, char_id: int, *, x: int, y:
     await session.flush()
 
 
+async def update_states_bulk(session: AsyncSession, rows: Sequence[Mapping[str, int]]) -> None:
+    """Atualiza x/y/hp/mp de vários personagens num único UPDATE multi-linha.
+
+    ``rows``: dicts com ``id``, ``x``, ``y``, ``hp``, ``mp``. Gera
+    ``UPDATE characters SET x = CASE id WHEN ... END, ... WHERE id IN (...)``,
+    uma ida ao banco por lote em vez de uma por personagem.
+    """
+    if not rows:
+        return
+    ids = [int(r["id"]) for r in rows]
+    values = {
+        col: case({int(r["id"]): int(r[col]) for r in rows}, value=Character.id)
+        for col in ("x", "y", "hp", "mp")
+    }
+    # sem sincronizar a sessão: o "evaluate" padrão não avalia CASE em Python
+    # e varrer a identity map a cada lote não serve para nada aqui
+    await session.execute(
+        update(Character)
+        .where(Character.id.in_(ids))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
@@ -2,11 +2,11 @@ from __future__ import annotations
 
 from typing import Optional
 
-from passlib.hash import bcrypt
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.user import User
+from services.passwords import password_hasher
 
 
 async def get_user_by_email(session: AsyncSession, email: str) -> Optional[User]:
@@ -15,17 +15,20 @@ async def get_user_by_email(session: AsyncSession, email: str) -> Optional[User]
 
 
 async def create_user(session: AsyncSession, email: str, password: str) -> User:
-    user = User(email=email, password_hash=bcrypt.hash(password))
+    user = User(email=email, password_hash=await password_hasher.hash(password))
     session.add(user)
     await session.flush()
     return user
 
 
 async def verify_credentials(session: AsyncSession, email: str, password: str) -> Optional[User]:
+    """Confere a senha; se o custo do bcrypt mudou, regrava o hash (o chamador faz commit)."""
     user = await get_user_by_email(session, email)
-    if user and bcrypt.verify(password, user.password_hash):
-        return user
-    return None
-
-
-
+    if not user:
+        return None
+    ok, new_hash = await password_hasher.verify_and_update(password, user.password_hash)
+    if not ok:
+        return None
+    if new_hash is not None:
+        user.password_hash = new_hash
+    return user
@@ -1,33 +1,94 @@
 from __future__ import annotations
 
 import time
-from typing import Optional
+import weakref
+from typing import Any
+
+from redis.commands.core import AsyncScript
 
 from services.redis import redis_manager
 
 
-async def allow(key: str, max_per_minute: int) -> bool:
-    """Token bucket simples em Redis com janela deslizante de 60s.
+# Token bucket atômico: um único EVALSHA por decisão (sem INCR + EXPIRE separados).
+# KEYS[1] = chave do bucket; ARGV = taxa (tokens/s), capacidade, custo.
+# O relógio é o TIME do Redis: o relógio das instâncias do app pode divergir
+# (Redis >= 5 replica os efeitos do script, então TIME é permitido aqui).
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 't', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+  tokens = capacity
+  ts = now
+end
+local elapsed = math.max(0, now - ts)
+tokens = math.min(capacity, tokens + elapsed * rate / 1000)
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 't', tokens, 'ts', now)
+-- expira quando o bucket estaria cheio de novo
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return allowed
+"""
 
-    Implementação MVP: usa INCR e EXPIRE com TTL 60s.
-    """
+# script registrado por cliente (o AsyncScript fica preso ao cliente que o registrou)
+_scripts: "weakref.WeakKeyDictionary[Any, AsyncScript]" = weakref.WeakKeyDictionary()
+
+
+async def _token_bucket_script() -> AsyncScript:
     client = await redis_manager.get_client()
-    now = int(time.time())
-    window_key = f"{key}:{now // 60}"
-    current = await client.incr(window_key)
-    if current == 1:
-        await client.expire(window_key, 60)
-    return current <= max_per_minute
+    script = _scripts.get(client)
+    if script is None:
+        # register_script usa EVALSHA e recarrega sozinho em NOSCRIPT
+        script = _scripts[client] = client.register_script(_TOKEN_BUCKET_LUA)
+    return script
+
+
+async def take_token(key: str, rate_per_second: float, capacity: int, cost: int = 1) -> bool:
+    """Consome ``cost`` tokens do bucket compartilhado em Redis (uma ida e volta)."""
+    script = await _token_bucket_script()
+    allowed = await script(keys=[key], args=[rate_per_second, capacity, cost])
+    return int(allowed) == 1
+
+
+async def allow(key: str, max_per_minute: int) -> bool:
+    """Token bucket em Redis: até ``max_per_minute`` de rajada, repondo max/60 por segundo."""
+    return await take_token(key, max_per_minute / 60.0, max_per_minute)
 
 
 async def allow_per_second(key: str, max_per_second: int) -> bool:
-    """Janela de 1 segundo usando INCR + EXPIRE(2s)."""
-    client = await redis_manager.get_client()
-    now = int(time.time())
-    k = f"{key}:{now}"
-    current = await client.incr(k)
-    if current == 1:
-        await client.expire(k, 2)
-    return current <= max_per_second
+    """Token bucket em Redis com capacidade e reposição de ``max_per_second``."""
+    return await take_token(key, float(max_per_second), max_per_second)
+
+
+class LocalTokenBucket:
+    """Token bucket em memória para limites por conexão (sem ida ao Redis).
+
+    Usado no caminho quente do WS (ex.: ``move``), onde o limite é do próprio
+    socket e não precisa ser compartilhado entre processos.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "_ts")
 
+    def __init__(self, rate_per_second: float, capacity: int | None = None) -> None:
+        self.rate = float(rate_per_second)
+        self.capacity = float(capacity if capacity is not None else rate_per_second)
+        self.tokens = self.capacity
+        self._ts = time.monotonic()
 
+    def allow(self, cost: float = 1.0) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._ts) * self.rate)
+        self._ts = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
@@ -1,26 +1,25 @@
 from typing import Optional, Any
 
-import asyncio
 import contextlib
 import time
-import umsgpack
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
-from services.redis import redis_manager, pop_ws_ticket
+from services.redis import pop_ws_ticket
+from services.chat import chat_hub
 from services.db import get_db
 from services.repositories.character_repository import get_by_user, create_default
 from services.persistence import persistence_manager
 from game.state import Player
-from game.loop import GameServer
-from game.types import parse_msg, build_msg, now_ms
-from game import map_loader as map_module
+from game.shards import world
+from game.types import build_msg, now_ms
+from game.wire import negotiate
 from app.config import get_settings
 from utils.security import is_origin_allowed, extract_subprotocols
-from utils.ratelimit import allow, allow_per_second
+from utils.ratelimit import allow, LocalTokenBucket
+from ws.outbound import Outbox
 
 
 router = APIRouter()
-active_sockets: set[WebSocket] = set()
 
 
 @router.websocket("/ws")
@@ -32,7 +31,9 @@ async def ws_endpoint(websocket: WebSocket):
         return
 
     subprotocols = extract_subprotocols(dict(websocket.headers))
-    if "zerion.v1" not in subprotocols:
+    # zerion.v2 (binário posicional) tem preferência; zerion.v1 continua aceito
+    codec = negotiate(subprotocols)
+    if codec is None:
         await websocket.close(code=1008)
         return
     ticket_proto = next((p for p in subprotocols if p.startswith("auth.")), None)
@@ -46,56 +47,65 @@ async def ws_endpoint(websocket: WebSocket):
         return
     user_id = str(user_id_int)
 
-    await websocket.accept(subprotocol="zerion.v1")
-    active_sockets.add(websocket)
-
-    # Redis pub/sub para chat global
-    redis = None
-    pubsub = None
+    await websocket.accept(subprotocol=codec.subprotocol)
+    # todo envio para este socket passa pela fila de saída (ordem preservada, sem bloquear o tick)
+    outbox = Outbox(websocket.send_bytes)
+    char_id: int | None = None
+    # daqui em diante tudo que for registrado (fila, inscrições, snapshot de persistência,
+    # sessão no mundo) é desfeito no finally, inclusive se o setup falhar no meio
     try:
-        redis = await redis_manager.get_client()
-        pubsub = redis.pubsub()
-        await pubsub.subscribe("chat:global")
-    except Exception:
-        redis = None
-        pubsub = None
-
-    async def forward_pubsub():
-        async for message in pubsub.listen():
-            if message.get("type") != "message":
-                continue
-            payload = umsgpack.unpackb(message["data"])  # publish como msgpack
-            data = umsgpack.packb({"t": "event", "type": "msg", "payload": {"channel": "global", **payload}})
-            await websocket.send_bytes(data)
+        outbox.start()
 
-    forward_task = asyncio.create_task(forward_pubsub()) if pubsub else None
-    # Carregar/crear personagem real do DB
-    char_id: int | None = None
-    async with get_db() as session:
-        char = await get_by_user(session, int(user_id))
-        if not char:
-            char = await create_default(session, int(user_id))
-        char_id = int(char.id)
-        await session.commit()
-        you = Player(id=user_id, x=int(char.x), y=int(char.y))
-    # iniciar loop de persistência se ainda não
-    await persistence_manager.start()
-    last_client_seq = 0
-    move_rate_key = f"rl:move:{user_id}"
-    server = GameServer(tick_hz=settings and getattr(settings, 'tick_hz', 10) or 10)
+        # chat: o hub do processo faz o fan-out para a fila de saída deste socket
+        chat_hub.subscribe("global", outbox, codec)
+        chat_hub.subscribe(f"whisper:{user_id}", outbox, codec)
+        # Carregar/crear personagem real do DB
+        async with get_db() as session:
+            char = await get_by_user(session, int(user_id))
+            if not char:
+                char = await create_default(session, int(user_id))
+            char_id = int(char.id)
+            await session.commit()
+            you = Player(id=user_id, x=int(char.x), y=int(char.y), hp=int(char.hp), mp=int(char.mp), char_id=char_id)
+            char_map = char.map
+            # estado recém-lido do DB: evita UPDATE de linha que não mudou
+            persistence_manager.remember(char_id, x=you.x, y=you.y, hp=you.hp, mp=you.mp)
+        # iniciar loop de persistência se ainda não
+        await persistence_manager.start()
+        # mapa do personagem (Character.map; sem asset cai no mapa padrão)
+        game_map = await world.open_map(char_map)
+        map_id = game_map.id if game_map else settings.map_default
+        map_channel = f"map:{map_id}"
+        chat_hub.subscribe(map_channel, outbox, codec)
+        last_client_seq = 0
+        # limite de move é por conexão: bucket em memória, sem ida ao Redis por pacote
+        move_limiter = LocalTokenBucket(settings.rate_move_max)
+        resync_limiter = LocalTokenBucket(settings.rate_resync_max)
 
-    # hello inicial
-    map_info = None
-    if map_module.MAP:
-        map_info = {"id": map_module.MAP.id, "version": map_module.MAP.version, "tile_w": map_module.MAP.tile_w, "tile_h": map_module.MAP.tile_h}
-    hello = build_msg("hello", {"tick_hz": server.tick_hz, "server_time_ms": now_ms(), "map": map_info})
-    await websocket.send_bytes(umsgpack.packb(hello))
+        # hello inicial
+        map_info = None
+        if game_map:
+            map_info = {"id": game_map.id, "version": game_map.version, "tile_w": game_map.tile_w, "tile_h": game_map.tile_h}
+        hello = build_msg("hello", {
+            "tick_hz": world.tick_hz,
+            "server_time_ms": now_ms(),
+            "map": map_info,
+            # patches de posição podem vir como dx/dy * pos_quantum
+            "pos_quantum": world.pos_quantum,
+        })
+        _send(outbox, codec, hello)
+        # entra no mundo compartilhado (local ou worker do mapa); os snapshots passam a vir do tick
+        await world.join(
+            you,
+            outbox,
+            codec,
+            map_id=map_id,
+            on_lost=lambda: websocket.close(code=1013),
+        )
 
-    try:
         while True:
             raw = await websocket.receive_bytes()
-            decoded = umsgpack.unpackb(raw)
-            msg = parse_msg(decoded)
+            msg = codec.decode(raw)
             if not msg:
                 continue
             op = msg.get("op")
@@ -107,57 +117,80 @@ async def ws_endpoint(websocket: WebSocket):
                 last_client_seq = seq
             if op == "ping":
                 out = build_msg("ping")
-                await websocket.send_bytes(umsgpack.packb(out))
+                _send(outbox, codec, out)
             elif op == "chat":
                 payload_in = (msg.get("payload") or {})  # type: ignore[assignment]
-                channel = payload_in.get("channel", "global")
+                channel = _resolve_chat_channel(payload_in, map_channel)
                 msg_text = str(payload_in.get("msg", ""))[:200]
-                # publica no canal (apenas global por enquanto)
-                if channel != "global":
+                if channel is None:
                     continue
                 # rate-limit por usuário
                 if not await allow(f"rl:chat:{user_id}", settings.rate_chat_max):
-                    warn = umsgpack.packb({"t": "event", "type": "warn", "payload": {"code": "chat_rate_limited"}})
-                    await websocket.send_bytes(warn)
+                    warn = build_msg("warn", {"code": "chat_rate_limited"})
+                    _send(outbox, codec, warn)
                     continue
                 payload = {"from": user_id, "msg": msg_text, "ts": int(time.time() * 1000)}
-                if redis:
-                    await redis.publish("chat:global", umsgpack.packb(payload))
-                else:
-                    event = umsgpack.packb({"t": "event", "type": "msg", "payload": {"channel": "global", **payload}})
-                    # broadcast local
-                    for ws in list(active_sockets):
-                        try:
-                            await ws.send_bytes(event)
-                        except Exception:
-                            pass
+                await chat_hub.publish(channel, payload)
+                if channel.startswith("whisper:") and channel != f"whisper:{user_id}":
+                    # eco para o remetente
+                    _send(outbox, codec, build_msg("event", {"channel": channel, **payload}))
             elif op == "move":
                 # rate-limit por segundo no server também
-                if not await allow_per_second(move_rate_key, 20):
+                if not move_limiter.allow():
                     warn = build_msg("warn", {"code": "rate_move"})
-                    await websocket.send_bytes(umsgpack.packb(warn))
+                    _send(outbox, codec, warn)
                     continue
-                server.enqueue_move(user_id, msg)
-                snap = server.apply_inputs_and_build_state(user_id, you)
-                # marca dirty para flush periódico
-                if char_id is not None:
-                    persistence_manager.mark_dirty(char_id, x=you.x, y=you.y, hp=100, mp=50)
-                await websocket.send_bytes(umsgpack.packb(snap))
+                # apenas enfileira; o tick aplica e envia o estado
+                warn_code = world.enqueue_move(user_id, msg)
+                if warn_code:
+                    warn = build_msg("warn", {"code": warn_code})
+                    _send(outbox, codec, warn)
+            elif op == "resync":
+                # perdeu estados: catch-up a partir do último state_seq recebido, sem recarregar do DB
+                if not resync_limiter.allow():
+                    warn = build_msg("warn", {"code": "rate_resync"})
+                    _send(outbox, codec, warn)
+                    continue
+                payload_in = msg.get("payload")
+                last_seq = payload_in.get("last_seq", 0) if isinstance(payload_in, dict) else 0
+                warn_code = world.request_resync(user_id, last_seq if isinstance(last_seq, int) else 0)
+                if warn_code:
+                    warn = build_msg("warn", {"code": warn_code})
+                    _send(outbox, codec, warn)
             # outros tipos (move, cast, etc.) serão tratados no loop do jogo
     except WebSocketDisconnect:
         pass
     finally:
-        if forward_task:
-            forward_task.cancel()
-        with contextlib.suppress(Exception):
-            if pubsub:
-                await pubsub.unsubscribe("chat:global")
-                await pubsub.close()
-        with contextlib.suppress(Exception):
-            active_sockets.discard(websocket)
+        chat_hub.unsubscribe_all(outbox)
+        await outbox.close()
+        left = await world.leave(user_id, outbox)
+        if left is not None and char_id is not None:
+            persistence_manager.mark_dirty(char_id, x=left.x, y=left.y, hp=left.hp, mp=left.mp)
         # flush final do personagem
         with contextlib.suppress(Exception):
             if char_id is not None:
                 await persistence_manager.flush_now(only_char_id=char_id)
+        if char_id is not None:
+            persistence_manager.forget(char_id)
+
+
+def _send(outbox: Outbox, codec: Any, msg: dict) -> bool:
+    """Codifica no protocolo da sessão, enfileira e conta os bytes por op."""
+    data = codec.encode(msg)
+    ok = outbox.push(data)
+    if ok:
+        world.profiler.count_bytes(msg["op"], len(data))
+    return ok
 
 
+def _resolve_chat_channel(payload: dict, map_channel: str | None) -> str | None:
+    """Canal de chat pedido pelo cliente: global, map ou whisper (com ``to``)."""
+    channel = str(payload.get("channel", "global"))
+    if channel == "global":
+        return "global"
+    if channel == "map":
+        return map_channel
+    if channel == "whisper":
+        to = payload.get("to")
+        return f"whisper:{to}" if to else None
+    return None
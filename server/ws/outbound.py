@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from typing import Awaitable, Callable, Optional
+
+
+# tamanho padrão da fila de saída por socket (mensagens, não bytes)
+DEFAULT_OUTBOX_SIZE = 32
+
+
+class Outbox:
+    """Fila de saída limitada por socket, drenada por uma task própria.
+
+    O tick apenas enfileira (``push``) e nunca espera o envio, então um cliente
+    lento não segura o loop; quando a fila enche, ``push`` devolve False e o
+    chamador decide o que fazer (o GameServer pula o snapshot e mantém o baseline).
+    """
+
+    def __init__(self, send: Callable[[bytes], Awaitable[None]], maxsize: int = DEFAULT_OUTBOX_SIZE) -> None:
+        self._send = send
+        self._queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=maxsize)
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.dropped = 0
+        # contadores de frames aceitos/enviados e callback opcional após cada envio
+        # (o gateway de shards usa para devolver crédito de janela ao worker)
+        self.enqueued = 0
+        self.sent = 0
+        self.on_sent: Optional[Callable[[int], None]] = None
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run(), name="ws_outbox")
+
+    def full(self) -> bool:
+        return self.closed or self._queue.full()
+
+    def push(self, data: bytes) -> bool:
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                data = await self._queue.get()
+                await self._send(data)
+                self.sent += 1
+                if self.on_sent is not None:
+                    self.on_sent(self.sent)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # socket caiu: o endpoint trata a desconexão
+            pass
+        finally:
+            self.closed = True
+
+    async def close(self) -> None:
+        self.closed = True
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(Exception, asyncio.CancelledError):
+                await self._task